@@ -0,0 +1,258 @@
+"""
+Provides a resumable, parallel Amazon S3 download component
+"""
+from typing import Dict, Optional
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import logging
+import os
+import threading
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+
+MB = 1024 * 1024
+
+TRANSFER_CONFIG = TransferConfig(multipart_threshold=16 * MB,
+                                 multipart_chunksize=16 * MB,
+                                 max_concurrency=16)
+
+# `part_size` is the size of the uploaded parts of a multipart object, None if unknown. `md5_etag` is False if the ETag
+# is not derived from the MD5 digest of the content, e.g. for objects encrypted with SSE-KMS or SSE-C.
+RemoteObject = namedtuple('RemoteObject', ['size', 'etag', 'part_size', 'md5_etag'], defaults=(None, True))
+
+ENCRYPTION_KMS = ('aws:kms', 'aws:kms:dsse')
+
+
+class AwsS3Downloader:
+    """
+    AWS S3 file downloader
+
+    Files are downloaded in parts using concurrent ranged requests into a temporary file, which is renamed to the
+    target path once the download has been completed and verified. Completed parts of an interrupted download are
+    reused by subsequent downloads of the same object version. The size and ETag of a downloaded file are stored
+    next to the file, hence a file is only downloaded again if the remote object has changed.
+
+    The ETag of a multipart object is only verified if the part size used for the upload is known, in which case the
+    object is downloaded using the same part size. Otherwise consistency is ensured by the `IfMatch` condition of each
+    ranged request.
+    """
+    KEY_CONTENT_LENGTH = 'ContentLength'
+    KEY_ETAG = 'ETag'
+
+    def __init__(self, s3_client, transfer_config: TransferConfig = TRANSFER_CONFIG) -> None:
+        """
+        :param s3_client: Boto3 S3 client.
+        :param transfer_config: Transfer configuration. `multipart_chunksize` defines the part size,
+                                `max_concurrency` the number of concurrent requests and `multipart_threshold` the
+                                size above which files are downloaded in parts.
+        """
+        self.client = s3_client
+        self.config = transfer_config
+
+    def head(self, bucket: str, key: str) -> RemoteObject:
+        """
+        Returns size and ETag of a remote object. The upload part size of multipart objects is requested as well.
+
+        :param bucket: Name of the S3 bucket.
+        :param key: Key of the object.
+        :return: RemoteObject.
+        """
+        response = self.client.head_object(Bucket=bucket, Key=key)
+        etag = response[AwsS3Downloader.KEY_ETAG]
+        md5_etag = response.get('ServerSideEncryption') not in ENCRYPTION_KMS and 'SSECustomerAlgorithm' not in response
+
+        part_size = None
+        if md5_etag and '-' in etag:
+            part_size = self._upload_part_size(bucket, key, etag)
+
+        return RemoteObject(size=response[AwsS3Downloader.KEY_CONTENT_LENGTH],
+                            etag=etag,
+                            part_size=part_size,
+                            md5_etag=md5_etag)
+
+    def _upload_part_size(self, bucket: str, key: str, etag: str) -> Optional[int]:
+        try:
+            response = self.client.head_object(Bucket=bucket, Key=key, PartNumber=1)
+        except ClientError as err:
+            logging.debug('Part size of [s3://%s/%s] could not be requested: %s', bucket, key, err)
+            return None
+
+        nr_upload_parts = response.get('PartsCount')
+        if nr_upload_parts is not None and str(nr_upload_parts) != _etag_parts(etag):
+            return None
+        return response[AwsS3Downloader.KEY_CONTENT_LENGTH] or None
+
+    def download(self, bucket: str, key: str, path: str, remote: Optional[RemoteObject] = None) -> bool:
+        """
+        Downloads an object unless an up-to-date copy is already present on the given path.
+
+        :param bucket: Name of the S3 bucket.
+        :param key: Key of the object.
+        :param path: Local target path.
+        :param remote: Optional size and ETag of the object, as returned by `head`. Requested if absent.
+        :return: True if the object has been downloaded, False if the local copy is up-to-date.
+        """
+        if remote is None:
+            remote = self.head(bucket, key)
+
+        if is_up_to_date(path, remote):
+            return False
+
+        part_path = path + '.part'
+        state = _load_state(part_path, remote, remote.part_size or self.config.multipart_chunksize)
+        part_size = state['part_size']
+        nr_parts = max((remote.size + part_size - 1) // part_size, 1)
+        pending = [part for part in range(nr_parts) if str(part) not in state['parts']]
+
+        if len(pending) < nr_parts:
+            logging.info('Resuming download of [s3://%s/%s]. %d of %d parts already completed.',
+                         bucket, key, nr_parts - len(pending), nr_parts)
+
+        mode = 'r+b' if os.path.isfile(part_path) else 'w+b'
+        with open(part_path, mode) as file:
+            file.truncate(remote.size)
+
+        state_lock = threading.Lock()
+
+        def download_part(part: int) -> None:
+            start = part * part_size
+            end = min(start + part_size, remote.size) - 1
+            response = self.client.get_object(Bucket=bucket,
+                                              Key=key,
+                                              Range='bytes={}-{}'.format(start, end),
+                                              IfMatch=remote.etag)
+            content = response['Body'].read()
+            if len(content) != end - start + 1:
+                raise IOError('Part [{}] of [s3://{}/{}] is incomplete.'.format(part, bucket, key))
+
+            with open(part_path, 'r+b') as part_file:
+                part_file.seek(start)
+                part_file.write(content)
+                part_file.flush()
+                os.fsync(part_file.fileno())
+
+            with state_lock:
+                state['parts'][str(part)] = hashlib.md5(content).hexdigest()
+                _write_json(_state_path(part_path), state)
+
+        if remote.size > 0 and pending:
+            concurrency = self.config.max_concurrency if remote.size > self.config.multipart_threshold else 1
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                for result in [executor.submit(download_part, part) for part in pending]:
+                    result.result()
+
+        if not _verify(part_path, remote, state):
+            _discard(part_path)
+            raise IOError('Downloaded file [s3://{}/{}] does not match size [{}] and ETag [{}] of the remote object.'
+                          .format(bucket, key, remote.size, remote.etag))
+
+        os.replace(part_path, path)
+        _write_json(_meta_path(path), {'size': remote.size, 'etag': remote.etag})
+        os.remove(_state_path(part_path))
+        return True
+
+
+def is_up_to_date(path: str, remote: RemoteObject) -> bool:
+    """
+    Returns whether a local file is a complete copy of the given remote object.
+
+    :param path: Local path.
+    :param remote: Size and ETag of the remote object.
+    :return: True if the local file matches the remote object, else False.
+    """
+    if not os.path.isfile(path) or os.path.getsize(path) != remote.size:
+        return False
+
+    meta = _read_json(_meta_path(path))
+    return meta is not None and meta.get('etag') == remote.etag
+
+
+def read_local_meta(path: str) -> Optional[RemoteObject]:
+    """
+    Returns size and ETag of the remote object a local file has been downloaded from.
+
+    :param path: Local path.
+    :return: RemoteObject or None if the file has not been downloaded by `AwsS3Downloader`.
+    """
+    meta = _read_json(_meta_path(path))
+    if meta is None:
+        return None
+    return RemoteObject(size=meta['size'], etag=meta['etag'])
+
+
+def _verify(part_path: str, remote: RemoteObject, state: dict) -> bool:
+    if os.path.getsize(part_path) != remote.size:
+        return False
+
+    if not remote.md5_etag:
+        return True
+
+    etag = remote.etag.strip('"')
+    part_digests = [state['parts'][str(part)] for part in range(len(state['parts']))]
+
+    if '-' not in etag:
+        if len(part_digests) == 1:
+            return part_digests[0] == etag
+        return _file_md5(part_path) == etag
+
+    # ETags of multipart uploads are computed over the MD5 digests of the uploaded parts. They can only be verified
+    # if the object has been downloaded using the part size of the upload.
+    nr_upload_parts = _etag_parts(etag)
+    if remote.part_size is None or state['part_size'] != remote.part_size or \
+            nr_upload_parts != str(len(part_digests)):
+        return True
+    digest = hashlib.md5(b''.join(bytes.fromhex(part) for part in part_digests)).hexdigest()
+    return '{}-{}'.format(digest, nr_upload_parts) == etag
+
+
+def _etag_parts(etag: str) -> str:
+    return etag.strip('"').split('-')[-1]
+
+
+def _file_md5(path: str) -> str:
+    md5 = hashlib.md5()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(MB), b''):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def _load_state(part_path: str, remote: RemoteObject, part_size: int) -> dict:
+    state = _read_json(_state_path(part_path))
+    if state is not None and state.get('etag') == remote.etag and state.get('size') == remote.size \
+            and os.path.isfile(part_path):
+        return state
+
+    _discard(part_path)
+    return {'etag': remote.etag, 'size': remote.size, 'part_size': part_size, 'parts': {}}
+
+
+def _discard(part_path: str) -> None:
+    for path in [part_path, _state_path(part_path)]:
+        if os.path.isfile(path):
+            os.remove(path)
+
+
+def _meta_path(path: str) -> str:
+    return path + '.meta.json'
+
+
+def _state_path(part_path: str) -> str:
+    return part_path + '.json'
+
+
+def _read_json(path: str) -> Optional[Dict]:
+    try:
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path: str, content: dict) -> None:
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(content, file)
+    os.replace(tmp_path, path)
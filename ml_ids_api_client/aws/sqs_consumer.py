@@ -1,18 +1,27 @@
 """
 Provides a Amazon SQS Consumer component
 """
-from typing import List
+from typing import Callable, List, Optional
 import logging
+import time
 import boto3
 from botocore.exceptions import ClientError
 
+from ml_ids_api_client.queue_backend import QueueBackend
 
-class AwsSQSConsumer:
+# Maximum number of entries per `DeleteMessageBatch` and `ChangeMessageVisibilityBatch` request.
+MAX_BATCH_SIZE = 10
+RETRY_BACKOFF = 0.1
+
+
+class AwsSQSConsumer(QueueBackend):
     """
     AWS SQS Message consumer
     """
     KEY_MESSAGES = 'Messages'
     KEY_RECEIPT_HANDLE = 'ReceiptHandle'
+    KEY_FAILED = 'Failed'
+    KEY_QUEUE_DEPTH = 'ApproximateNumberOfMessages'
 
     def __init__(self, access_key: str, secret_key: str, region: str) -> None:
         self.client = boto3.client('sqs',
@@ -46,21 +55,107 @@ class AwsSQSConsumer:
             logging.error('AWS Client error occurred while receiving messages: %s', err)
             return []
 
-    def delete_messages(self, queue_url: str, messages: List[dict]) -> None:
+    def delete_messages(self, queue_url: str, messages: List[dict], max_retries: int = 3) -> List[dict]:
         """
-        Deletes the given message from the message queue.
+        Deletes the given messages from the message queue. Messages are deleted in batches of up to 10 messages per
+        request. Entries failing due to a server error are retried with exponential backoff.
 
         :param queue_url: URL of the message queue.
         :param messages: Messages to delete.
-        :return: None
+        :param max_retries: Maximum number of retries of failed entries.
+        :return: List of messages which could not be deleted.
+        """
+        return self._send_batches(self.client.delete_message_batch, 'deleted', queue_url, messages, {}, max_retries)
+
+    def change_visibility(self,
+                          queue_url: str,
+                          messages: List[dict],
+                          visibility_timeout: int,
+                          max_retries: int = 3) -> List[dict]:
+        """
+        Changes the visibility timeout of received messages in batches of up to 10 messages per request. Entries
+        failing due to a server error are retried with exponential backoff.
+
+        :param queue_url: URL of the message queue.
+        :param messages: Received messages.
+        :param visibility_timeout: New visibility timeout in seconds, counted from now.
+        :param max_retries: Maximum number of retries of failed entries.
+        :return: List of messages whose visibility timeout could not be changed.
+        """
+        return self._send_batches(self.client.change_message_visibility_batch, 'extended', queue_url, messages,
+                                  {'VisibilityTimeout': visibility_timeout}, max_retries)
+
+    def queue_depth(self, queue_url: str) -> Optional[int]:
+        """
+        Returns the approximate number of visible messages in the message queue.
+
+        :param queue_url: URL of the message queue.
+        :return: Number of messages or None if the queue attributes could not be retrieved.
         """
+        try:
+            response = self.client.get_queue_attributes(QueueUrl=queue_url,
+                                                        AttributeNames=[AwsSQSConsumer.KEY_QUEUE_DEPTH])
+            return int(response['Attributes'][AwsSQSConsumer.KEY_QUEUE_DEPTH])
+        except (ClientError, KeyError, ValueError) as err:
+            logging.error('Size of queue [%s] could not be retrieved: %s', queue_url, err)
+            return None
+
+    def _send_batches(self,
+                      operation: Callable[..., dict],
+                      action: str,
+                      queue_url: str,
+                      messages: List[dict],
+                      entry_args: dict,
+                      max_retries: int) -> List[dict]:
+        failed = []
+        pending = []
         for msg in messages:
             if AwsSQSConsumer.KEY_RECEIPT_HANDLE not in msg:
-                logging.warning('Message [%s] could not be deleted as it contains no receipt-handle', msg)
-                continue
+                logging.warning('Message [%s] could not be %s as it contains no receipt-handle', msg, action)
+                failed.append(msg)
+            else:
+                pending.append(msg)
+
+        for start in range(0, len(pending), MAX_BATCH_SIZE):
+            failed.extend(self._send_batch(operation, action, queue_url, pending[start:start + MAX_BATCH_SIZE],
+                                           entry_args, max_retries))
+        return failed
+
+    @staticmethod
+    def _send_batch(operation: Callable[..., dict],
+                    action: str,
+                    queue_url: str,
+                    messages: List[dict],
+                    entry_args: dict,
+                    max_retries: int) -> List[dict]:
+        pending = {str(idx): msg for idx, msg in enumerate(messages)}
+        failed = []
 
+        for attempt in range(max_retries + 1):
+            if attempt > 0:
+                time.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+
+            entries = [dict(entry_args, Id=entry_id, ReceiptHandle=msg[AwsSQSConsumer.KEY_RECEIPT_HANDLE])
+                       for entry_id, msg in pending.items()]
             try:
-                self.client.delete_message(QueueUrl=queue_url,
-                                           ReceiptHandle=msg[AwsSQSConsumer.KEY_RECEIPT_HANDLE])
+                response = operation(QueueUrl=queue_url, Entries=entries)
             except ClientError as err:
-                logging.error('AWS Client error occurred while deleting message [%s]: %s', msg, err)
+                logging.error('AWS Client error occurred while [%d] messages were %s: %s', len(entries), action, err)
+                continue
+
+            retry = {}
+            for entry in response.get(AwsSQSConsumer.KEY_FAILED, []):
+                msg = pending[entry['Id']]
+                if entry.get('SenderFault', False):
+                    logging.error('Message [%s] could not be %s: %s', msg, action, entry.get('Message', entry['Code']))
+                    failed.append(msg)
+                else:
+                    retry[entry['Id']] = msg
+            pending = retry
+
+            if not pending:
+                return failed
+
+        for msg in pending.values():
+            logging.error('Message [%s] could not be %s after [%d] retries.', msg, action, max_retries)
+        return failed + list(pending.values())
@@ -0,0 +1,151 @@
+"""
+Columnar on-disk cache of datasets. Each column is stored as a `.npy` file which is memory-mapped upon load.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+META_FILE = 'meta.json'
+INDEX_FILE = 'index.npy'
+CACHE_VERSION = 1
+
+
+def load_cached_dataset(source_path: str, cache_dir: str, downcast: bool = False) -> pd.DataFrame:
+    """
+    Loads a dataset in `h5` format via a columnar cache. Upon first load the dataset is converted and stored in the
+    cache directory. Subsequent loads memory-map the cached columns without copying them into memory.
+
+    Cache entries are keyed by the path, modification time and size of the source file. Outdated entries of the same
+    source file are removed once a new entry has been created.
+
+    :param source_path: Path to the local `h5` file.
+    :param cache_dir: Directory containing the cache entries.
+    :param downcast: Whether floating point columns should be converted to `float32` and integer columns to the
+                     smallest integer type capable of holding their values.
+    :return: Dataset as a Pandas DataFrame.
+    """
+    entry_prefix = _entry_prefix(source_path)
+    entry_dir = os.path.join(cache_dir, '{}-{}'.format(entry_prefix, _entry_key(source_path, downcast)))
+
+    if not os.path.isfile(os.path.join(entry_dir, META_FILE)):
+        print('Creating columnar cache of dataset ["{}"] in ["{}"].'.format(source_path, entry_dir))
+        write_columnar(pd.read_hdf(source_path), entry_dir, downcast)
+        _remove_outdated_entries(cache_dir, entry_prefix, entry_dir)
+
+    return read_columnar(entry_dir)
+
+
+def write_columnar(df: pd.DataFrame, path: str, downcast: bool = False) -> None:
+    """
+    Stores a DataFrame as a directory of `.npy` files, one file per column. Columns which are not of a numeric, boolean
+    or datetime NumPy type, e.g. `object`, `category`, `string` or nullable integer columns, are stored as categorical
+    codes, their categories are stored in the meta data file.
+    The directory is created atomically, hence concurrent readers either see the complete directory or none.
+
+    :param df: Pandas DataFrame.
+    :param path: Target directory. Must not exist.
+    :param downcast: Whether numeric columns should be downcast.
+    :return: None
+    """
+    parent_dir = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=parent_dir, prefix='.tmp-')
+
+    try:
+        columns = []
+        for position, (name, series) in enumerate(df.items()):
+            file_name = 'col_{}.npy'.format(position)
+            column = {'name': name, 'file': file_name}
+
+            if not _is_memory_mappable(series.dtype):
+                categorical = pd.Categorical(series)
+                column['categories'] = _categories(name, categorical)
+                values = categorical.codes
+            else:
+                values = _downcast(series) if downcast else series.to_numpy()
+
+            np.save(os.path.join(tmp_dir, file_name), np.ascontiguousarray(values))
+            columns.append(column)
+
+        np.save(os.path.join(tmp_dir, INDEX_FILE), df.index.to_numpy())
+
+        with open(os.path.join(tmp_dir, META_FILE), 'w', encoding='utf-8') as file:
+            json.dump({'version': CACHE_VERSION, 'index_name': df.index.name, 'columns': columns}, file)
+
+        try:
+            os.rename(tmp_dir, path)
+        except OSError:
+            # The directory has been created concurrently by another process.
+            if not os.path.isfile(os.path.join(path, META_FILE)):
+                raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def read_columnar(path: str) -> pd.DataFrame:
+    """
+    Loads a DataFrame stored by `write_columnar`. Numeric columns are memory-mapped read-only.
+
+    :param path: Directory containing the stored DataFrame.
+    :return: Pandas DataFrame.
+    """
+    with open(os.path.join(path, META_FILE), encoding='utf-8') as file:
+        meta = json.load(file)
+
+    columns = {}
+    for column in meta['columns']:
+        values = np.load(os.path.join(path, column['file']), mmap_mode='r')
+        if 'categories' in column:
+            values = pd.Categorical.from_codes(values, categories=column['categories'])
+        columns[column['name']] = values
+
+    index = pd.Index(np.load(os.path.join(path, INDEX_FILE), allow_pickle=True), name=meta['index_name'])
+    return pd.DataFrame(columns, index=index, copy=False)
+
+
+def _is_memory_mappable(dtype) -> bool:
+    return isinstance(dtype, np.dtype) and dtype.kind in 'biufcmM'
+
+
+def _categories(name: str, categorical: pd.Categorical) -> list:
+    categories = categorical.categories.to_list()
+    try:
+        json.dumps(categories)
+    except TypeError:
+        raise ValueError('Column [{}] of type [{}] cannot be stored in columnar format. Its values are not JSON '
+                         'serializable.'.format(name, categorical.categories.dtype))
+    return categories
+
+
+def _downcast(series: pd.Series) -> np.ndarray:
+    if series.dtype.kind == 'f':
+        return series.to_numpy(dtype=np.float32)
+    if series.dtype.kind in 'iu':
+        return pd.to_numeric(series, downcast='unsigned' if series.min() >= 0 else 'integer').to_numpy()
+    return series.to_numpy()
+
+
+def _entry_prefix(source_path: str) -> str:
+    name = os.path.splitext(os.path.basename(source_path))[0]
+    return '{}-{}'.format(name, _hash(os.path.abspath(source_path))[:8])
+
+
+def _entry_key(source_path: str, downcast: bool) -> str:
+    stat = os.stat(source_path)
+    return _hash('{}|{}|{}|{}'.format(stat.st_mtime_ns, stat.st_size, downcast, CACHE_VERSION))[:16]
+
+
+def _hash(value: str) -> str:
+    return hashlib.sha1(value.encode('utf-8')).hexdigest()
+
+
+def _remove_outdated_entries(cache_dir: str, entry_prefix: str, current_entry: str) -> None:
+    for name in os.listdir(cache_dir):
+        entry = os.path.join(cache_dir, name)
+        if name.startswith(entry_prefix + '-') and entry != current_entry and os.path.isdir(entry):
+            print('Removing outdated columnar cache ["{}"].'.format(entry))
+            shutil.rmtree(entry, ignore_errors=True)
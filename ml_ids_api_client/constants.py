@@ -0,0 +1,15 @@
+"""
+Constants shared by the CLIs and the modules implementing them.
+
+The module is imported upon start of the CLIs, hence it must not import any third-party packages.
+"""
+
+DEFAULT_THRESHOLD = 0.5
+
+DISPLAY_MODES = ['FULL', 'PAGED', 'TRUNCATED', 'SUMMARY']
+
+WIRE_FORMATS = {
+    'PANDAS_SPLIT': 'application/json; format=pandas-split',
+    'MSGPACK': 'application/msgpack; format=columns',
+    'ARROW': 'application/vnd.apache.arrow.stream'
+}
@@ -0,0 +1,314 @@
+"""
+Incremental windowed aggregates over the network flows of attack notifications.
+"""
+from typing import Dict, Hashable, List, Optional, Tuple
+from collections import namedtuple
+import time
+import pandas as pd
+from tabulate import tabulate
+
+from ml_ids_api_client.consumer.notification_decoder import AttackNotification
+
+# Columns aggregated by default. Column names are matched case-insensitively, ignoring spaces and underscores.
+DIMENSIONS = ['dst_port', 'protocol']
+
+WindowSummary = namedtuple('WindowSummary', ['start', 'end', 'flows', 'flows_per_minute', 'top'])
+
+
+class SpaceSaving:
+    """
+    Space-Saving sketch estimating the most frequent keys of a stream using a fixed number of counters.
+
+    Counters are grouped by count, hence each update takes constant time. Once all counters are in use, the key with
+    the smallest count is replaced. Estimated counts overestimate the true count by at most the count of the replaced
+    key, which is stored as error.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        """
+        :param capacity: Number of counters.
+        """
+        if capacity < 1:
+            raise ValueError('capacity must be greater 0.')
+
+        self.capacity = capacity
+        self.total = 0
+        self._counts: Dict[Hashable, int] = {}
+        self._errors: Dict[Hashable, int] = {}
+        self._buckets: Dict[int, Dict[Hashable, None]] = {}
+        self._min_count = 0
+
+    def update(self, key: Hashable) -> None:
+        """
+        Counts an occurrence of a key.
+
+        :param key: Key.
+        :return: None
+        """
+        self.total += 1
+        count = self._counts.get(key)
+
+        if count is None:
+            if len(self._counts) < self.capacity:
+                count = 0
+                self._errors[key] = 0
+            else:
+                count = self._min_count
+                evicted = next(iter(self._buckets[count]))
+                self._remove(evicted, count)
+                del self._counts[evicted]
+                del self._errors[evicted]
+                self._errors[key] = count
+        else:
+            self._remove(key, count)
+
+        self._counts[key] = count + 1
+        self._buckets.setdefault(count + 1, {})[key] = None
+        if count == 0 or (count == self._min_count and count not in self._buckets):
+            self._min_count = count + 1
+
+    def top(self, nr_keys: int) -> List[Tuple[Hashable, int]]:
+        """
+        Returns the most frequent keys.
+
+        :param nr_keys: Number of keys.
+        :return: List of (key, estimated count) sorted by count in descending order.
+        """
+        return sorted(self._counts.items(), key=lambda item: item[1], reverse=True)[:nr_keys]
+
+    def error(self, key: Hashable) -> int:
+        """
+        Returns the maximum overestimation of the count of a key.
+
+        :param key: Key.
+        :return: Maximum error.
+        """
+        return self._errors.get(key, 0)
+
+    def items(self) -> Dict[Hashable, int]:
+        """
+        Returns the estimated counts of all tracked keys.
+
+        :return: Dict of key to estimated count.
+        """
+        return dict(self._counts)
+
+    def _remove(self, key: Hashable, count: int) -> None:
+        bucket = self._buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[count]
+
+
+class SlidingWindowCounter:
+    """
+    Counts keys over a sliding time window.
+
+    The window is divided into `nr_slots` consecutive slots, each holding a `SpaceSaving` sketch. Expired slots are
+    reused, hence memory usage is fixed. With a single slot the counter represents a tumbling window.
+    """
+
+    def __init__(self, window: float, nr_slots: int, capacity: int) -> None:
+        """
+        :param window: Window length in seconds.
+        :param nr_slots: Number of slots the window is divided into.
+        :param capacity: Number of counters per slot.
+        """
+        if window <= 0 or nr_slots < 1:
+            raise ValueError('window and nr_slots must be greater 0.')
+
+        self.window = window
+        self.nr_slots = nr_slots
+        self.capacity = capacity
+        self.slot_length = window / nr_slots
+        self._slots: List[Optional[Tuple[int, SpaceSaving]]] = [None] * nr_slots
+
+    def update(self, key: Hashable, now: float) -> None:
+        """
+        Counts an occurrence of a key at the given time.
+
+        :param key: Key.
+        :param now: Time in seconds.
+        :return: None
+        """
+        self._slot(now).update(key)
+
+    def total(self, now: float) -> int:
+        """
+        Returns the number of occurrences within the window ending at the given time.
+
+        :param now: Time in seconds.
+        :return: Number of occurrences.
+        """
+        return sum(sketch.total for sketch in self._active(now))
+
+    def top(self, nr_keys: int, now: float) -> List[Tuple[Hashable, int]]:
+        """
+        Returns the most frequent keys within the window ending at the given time.
+
+        :param nr_keys: Number of keys.
+        :param now: Time in seconds.
+        :return: List of (key, estimated count) sorted by count in descending order.
+        """
+        counts: Dict[Hashable, int] = {}
+        for sketch in self._active(now):
+            for key, count in sketch.items().items():
+                counts[key] = counts.get(key, 0) + count
+        return sorted(counts.items(), key=lambda item: item[1], reverse=True)[:nr_keys]
+
+    def _slot(self, now: float) -> SpaceSaving:
+        slot_id = int(now // self.slot_length)
+        position = slot_id % self.nr_slots
+        slot = self._slots[position]
+        if slot is None or slot[0] != slot_id:
+            slot = (slot_id, SpaceSaving(self.capacity))
+            self._slots[position] = slot
+        return slot[1]
+
+    def _active(self, now: float) -> List[SpaceSaving]:
+        current = int(now // self.slot_length)
+        return [slot[1] for slot in self._slots if slot is not None and current - self.nr_slots < slot[0] <= current]
+
+
+class AttackAnalytics:
+    """
+    Aggregates the network flows of attack notifications per dimension (e.g. destination port and protocol) over a
+    sliding window and consecutive tumbling windows. Each network flow is processed in constant time.
+    """
+
+    def __init__(self,
+                 dimensions: Optional[List[str]] = None,
+                 sliding_window: float = 5 * 60,
+                 tumbling_window: float = 60,
+                 nr_slots: int = 30,
+                 capacity: int = 100) -> None:
+        """
+        :param dimensions: Columns of the network flows to aggregate.
+        :param sliding_window: Length of the sliding window in seconds.
+        :param tumbling_window: Length of the tumbling windows in seconds.
+        :param nr_slots: Number of slots the sliding window is divided into.
+        :param capacity: Number of counters per dimension and slot. Bounds the memory usage and the accuracy of the
+                         top-K estimates.
+        """
+        self.dimensions = dimensions or DIMENSIONS
+        self.sliding_window = sliding_window
+        self.tumbling_window = tumbling_window
+        self.capacity = capacity
+        self.flows = 0
+        self._sliding = {dim: SlidingWindowCounter(sliding_window, nr_slots, capacity) for dim in self.dimensions}
+        self._tumbling = {dim: SlidingWindowCounter(tumbling_window, 1, capacity) for dim in self.dimensions}
+        self._completed: Optional[Dict[str, WindowSummary]] = None
+        self._current_window: Optional[int] = None
+        self._columns: Dict[Tuple[str, ...], Dict[str, Optional[str]]] = {}
+
+    def update(self, notifications: List[AttackNotification], now: Optional[float] = None) -> None:
+        """
+        Adds the network flows of attack notifications.
+
+        :param notifications: Attack notifications.
+        :param now: Time of receipt in seconds. Defaults to the current time.
+        :return: None
+        """
+        now = time.time() if now is None else now
+        self._roll_tumbling_window(now)
+
+        for notification in notifications:
+            flow = notification.network_flow
+            columns = self._resolve_columns(flow)
+            for dim in self.dimensions:
+                column = columns[dim]
+                values = flow[column].tolist() if column is not None else [None] * len(flow)
+                for value in values:
+                    self._sliding[dim].update(value, now)
+                    self._tumbling[dim].update(value, now)
+            self.flows += len(flow)
+
+    def sliding_summary(self, nr_keys: int = 10, now: Optional[float] = None) -> Dict[str, WindowSummary]:
+        """
+        Returns the aggregates of the sliding window ending now.
+
+        :param nr_keys: Number of most frequent values per dimension.
+        :param now: Current time in seconds. Defaults to the current time.
+        :return: Dict of dimension to WindowSummary.
+        """
+        now = time.time() if now is None else now
+        summaries = {}
+        for dim, counter in self._sliding.items():
+            flows = counter.total(now)
+            summaries[dim] = WindowSummary(start=now - self.sliding_window,
+                                           end=now,
+                                           flows=flows,
+                                           flows_per_minute=flows * 60 / self.sliding_window,
+                                           top=counter.top(nr_keys, now))
+        return summaries
+
+    def tumbling_summary(self, now: Optional[float] = None) -> Optional[Dict[str, WindowSummary]]:
+        """
+        Returns the aggregates of the last completed tumbling window.
+
+        :param now: Current time in seconds. Defaults to the current time.
+        :return: Dict of dimension to WindowSummary or None if no tumbling window has been completed.
+        """
+        self._roll_tumbling_window(time.time() if now is None else now)
+        return self._completed
+
+    def _roll_tumbling_window(self, now: float) -> None:
+        window = int(now // self.tumbling_window)
+        if self._current_window is not None and window != self._current_window:
+            start = self._current_window * self.tumbling_window
+            end = start + self.tumbling_window
+            completed = {}
+            for dim, counter in self._tumbling.items():
+                flows = counter.total(start)
+                completed[dim] = WindowSummary(start=start,
+                                               end=end,
+                                               flows=flows,
+                                               flows_per_minute=flows * 60 / self.tumbling_window,
+                                               top=counter.top(self.capacity, start))
+            self._completed = completed
+        self._current_window = window
+
+    def _resolve_columns(self, flow: pd.DataFrame) -> Dict[str, Optional[str]]:
+        key = tuple(flow.columns)
+        columns = self._columns.get(key)
+        if columns is None:
+            normalized = {_normalize(col): col for col in flow.columns}
+            columns = {dim: normalized.get(_normalize(dim)) for dim in self.dimensions}
+            self._columns[key] = columns
+        return columns
+
+
+def print_analytics_summary(analytics: AttackAnalytics, nr_keys: int = 10) -> None:
+    """
+    Displays the aggregates of the sliding window and the last completed tumbling window.
+
+    :param analytics: AttackAnalytics.
+    :param nr_keys: Number of most frequent values displayed per dimension.
+    :return: None
+    """
+    now = time.time()
+    sliding = analytics.sliding_summary(nr_keys, now)
+    tumbling = analytics.tumbling_summary(now)
+
+    print('Attack summary [{}] - total flows: {}'.format(time.strftime('%Y-%m-%d %H:%M:%S'), analytics.flows))
+    windows = [('last {:.0f}s'.format(analytics.sliding_window), sliding)]
+    if tumbling is not None:
+        window = tumbling[analytics.dimensions[0]]
+        windows.append(('{} - {}'.format(_format_time(window.start), _format_time(window.end)), tumbling))
+
+    for title, summary in windows:
+        first = summary[analytics.dimensions[0]]
+        print('\nWindow [{}]: {} flows, {:.1f} flows/min'.format(title, first.flows, first.flows_per_minute))
+        for dim in analytics.dimensions:
+            top = summary[dim].top[:nr_keys]
+            print(tabulate({dim: [key for key, _ in top], 'flows': [count for _, count in top]},
+                           headers='keys', tablefmt='psql'))
+    print('\n')
+
+
+def _format_time(timestamp: float) -> str:
+    return time.strftime('%H:%M:%S', time.localtime(timestamp))
+
+
+def _normalize(name: str) -> str:
+    return str(name).lower().replace(' ', '').replace('_', '')
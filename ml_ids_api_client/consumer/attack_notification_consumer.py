@@ -1,69 +1,36 @@
 """
 CLI to consume attack notifications published by the the ML-IDS API (https://github.com/cstub/ml-ids-api)
 """
-from typing import Optional
-from collections import namedtuple
+from typing import List
+import functools
 import logging
-import json
+import signal
+import threading
 
-import pandas as pd
 import click
 
-from ml_ids_api_client.aws.sqs_consumer import AwsSQSConsumer
-from ml_ids_api_client.user_interaction import print_dataframe
+from ml_ids_api_client.consumer.backends import create_backend
+from ml_ids_api_client.consumer.dedup import DedupCache
+from ml_ids_api_client.consumer.pipeline import ConsumerPipeline
+from ml_ids_api_client.consumer.polling import AdaptivePolling
 
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(asctime)s: %(message)s')
 
-AttackNotification = namedtuple('AttackNotification', ['msg_id', 'network_flow'])
-
-
-def deserialize_message(message: dict) -> Optional[AttackNotification]:
-    """
-    Deserializes a SQS message into an instance of `AttackNotification`.
-
-    :param message: SQS message.
-    :return: `AttackNotification` if the message could be deserialized successfully, else None.
-    """
-    try:
-        msg_id = message['MessageId']
-        msg_body = json.loads(message['Body'])
-        msg_content = msg_body['Message']
-
-        network_flow = pd.read_json(msg_content, orient='split')
-        return AttackNotification(msg_id, network_flow)
-    except KeyError as err:
-        logging.warning("Message [%s] could not be parsed. Cause: %s", message, err)
-    except ValueError as err:
-        logging.warning('Message content [%s] could not be parsed. Message does not adhere to Pandas-split format. '
-                        'Cause %s', msg_content, err)
-    return None
-
-
-def print_attack_notification(attack_notification: AttackNotification, display_overflow: str) -> None:
-    """
-    Displays the details of an attack notification to the user.
-
-    :param attack_notification: AttackNotification.
-    :param display_overflow: Overflow behaviour if the output exceeds the window width.
-    :return: None.
-    """
-    print('Attack detected [{}]'.format(attack_notification.msg_id))
-    print('Network Flow:\n')
-    print_dataframe(attack_notification.network_flow, display_overflow)
-    print('\n')
-
 
 @click.command()
-@click.option('--access-key', type=str, required=True,
-              help='Access key of the AWS account connecting to the SQS queue.')
-@click.option('--secret-key', type=str, required=True,
-              help='Secret key of the AWS account connecting to the SQS queue.')
-@click.option('--region', type=str, required=True,
-              help='AWS region.')
-@click.option('--queue-url', type=str, required=True,
-              help='AWS SQS queue URL.')
+@click.option('--backend', type=str, default='sqs',
+              help='Queue backend. Either [sqs] or a JSON lines file of recorded messages to replay [file://]. '
+                   'A replay ends once all recorded messages have been processed.')
+@click.option('--access-key', type=str, default=None,
+              help='Access key of the AWS account connecting to the SQS queue. Required by the sqs backend.')
+@click.option('--secret-key', type=str, default=None,
+              help='Secret key of the AWS account connecting to the SQS queue. Required by the sqs backend.')
+@click.option('--region', type=str, default=None,
+              help='AWS region. Required by the sqs backend.')
+@click.option('--queue-url', type=str, default=None,
+              help='AWS SQS queue URL. Required by the sqs backend.')
 @click.option('--delete-messages', type=bool, default=False,
-              help='Whether received messages should be deleted or preserved.')
+              help='Whether successfully processed messages should be deleted or preserved.')
 @click.option('--num-messages', type=click.IntRange(1, 10), default=10,
               help='Number of messages requested per polling request.')
 @click.option('--wait-time', type=click.IntRange(0, (60 * 60)), default=10,
@@ -73,7 +40,57 @@ def print_attack_notification(attack_notification: AttackNotification, display_o
               help='Visibility timeout for a delivered message.')
 @click.option('--display-overflow', type=click.Choice(['WRAP', 'NOWRAP'], case_sensitive=False),
               default='WRAP', help='Defines the overflow behaviour if the output exceeds the window width.')
-def run_cli(access_key,
+@click.option('--pollers', type=click.IntRange(1, None), default=1,
+              help='Number of threads receiving messages from the queue.')
+@click.option('--workers', type=click.IntRange(1, None), default=1,
+              help='Number of threads processing received messages.')
+@click.option('--queue-size', type=click.IntRange(1, None), default=100,
+              help='Maximum number of received messages waiting to be processed. Polling pauses while the limit '
+                   'is reached.')
+@click.option('--sink', type=click.Choice(['CONSOLE', 'JSONL', 'PARQUET', 'SUMMARY'], case_sensitive=False),
+              default='CONSOLE',
+              help='Output of received attack notifications. PARQUET requires the `pyarrow` package and only '
+                   'acknowledges messages once a file has been rotated, see --rotate-interval. SUMMARY '
+                   'periodically displays the most frequent destination ports and protocols instead of each '
+                   'notification.')
+@click.option('--sink-dir', type=click.Path(file_okay=False), default='./output/notifications',
+              help='Directory the JSONL and PARQUET sinks write to.')
+@click.option('--rotate-size', type=click.FloatRange(0, None, min_open=True), default=64.0,
+              help='Size in MB after which the JSONL and PARQUET sinks start a new file.')
+@click.option('--rotate-interval', type=click.FloatRange(0, None, min_open=True), default=None,
+              help='Time in seconds after which the JSONL and PARQUET sinks start a new file. Defaults to 3600 for '
+                   'JSONL and 60 for PARQUET, whose messages stay unacknowledged until the file is closed.')
+@click.option('--summary-interval', type=click.FloatRange(0, None, min_open=True), default=10.0,
+              help='Interval in seconds in which the SUMMARY sink displays the summary.')
+@click.option('--summary-window', type=click.FloatRange(0, None, min_open=True), default=300.0,
+              help='Length in seconds of the sliding window summarized by the SUMMARY sink.')
+@click.option('--summary-tumbling-window', type=click.FloatRange(0, None, min_open=True), default=60.0,
+              help='Length in seconds of the consecutive windows summarized by the SUMMARY sink.')
+@click.option('--top-k', type=click.IntRange(1, None), default=10,
+              help='Number of most frequent destination ports and protocols displayed by the SUMMARY sink.')
+@click.option('--flush-size', type=click.IntRange(1, None), default=1000,
+              help='Number of buffered notifications after which they are written to the sink.')
+@click.option('--buffer-size', type=click.IntRange(1, None), default=10000,
+              help='Maximum number of notifications waiting to be written to the sink. Processing pauses while the '
+                   'limit is reached.')
+@click.option('--flush-interval', type=click.FloatRange(0, None, min_open=True), default=1.0,
+              help='Maximum time in seconds notifications are buffered before they are written to the sink. '
+                   'Messages are deleted once their notifications have been written durably.')
+@click.option('--adaptive-polling', type=bool, default=False,
+              help='Whether batch size and wait time of polling requests should be adapted to the queue depth and '
+                   'the share of empty receives. The wait time is limited to --wait-time.')
+@click.option('--heartbeat', type=bool, default=True,
+              help='Whether the visibility timeout of messages still being processed should be extended before it '
+                   'expires.')
+@click.option('--dedup-size', type=click.IntRange(0, None), default=100000,
+              help='Maximum number of message ids remembered to skip redelivered messages. 0 disables '
+                   'deduplication.')
+@click.option('--dedup-window', type=click.FloatRange(0, None, min_open=True), default=3600.0,
+              help='Time in seconds during which a redelivered message is skipped.')
+@click.option('--dedup-content', type=bool, default=False,
+              help='Whether messages with identical notification content are skipped as well.')
+def run_cli(backend,
+            access_key,
             secret_key,
             region,
             queue_url,
@@ -81,22 +98,129 @@ def run_cli(access_key,
             num_messages,
             wait_time,
             visibility_timeout,
-            display_overflow):
+            display_overflow,
+            pollers,
+            workers,
+            queue_size,
+            sink,
+            sink_dir,
+            rotate_size,
+            rotate_interval,
+            summary_interval,
+            summary_window,
+            summary_tumbling_window,
+            top_k,
+            flush_size,
+            buffer_size,
+            flush_interval,
+            dedup_size,
+            dedup_window,
+            dedup_content,
+            adaptive_polling,
+            heartbeat):
     """
     Runs the CLI.
     """
-    sqs_consumer = AwsSQSConsumer(access_key, secret_key, region)
-
-    while True:
-        logging.info("Retrieving messages from queue...")
-        messages = sqs_consumer.receive_messages(queue_url, num_messages, wait_time, visibility_timeout)
+    # Modules depending on pandas are imported once the command is run, hence `--help` returns immediately.
+    # pylint: disable=import-outside-toplevel
+    from ml_ids_api_client.consumer.notification_decoder import NotificationDecoder
+    from ml_ids_api_client.consumer.analytics import AttackAnalytics
+    from ml_ids_api_client.consumer.sinks import AnalyticsSink, BufferedSink, create_sink, MB
+
+    decoder = NotificationDecoder()
+    dedup = DedupCache(dedup_size, dedup_window, dedup_content) if dedup_size > 0 else None
+
+    def handle_messages(messages: List[dict]) -> List[bool]:
+        duplicates = [dedup is not None and dedup.is_duplicate(message) for message in messages]
+        received = [message for message, duplicate in zip(messages, duplicates) if not duplicate]
+
+        attack_notifications = iter(decoder.decode(received))
+        results = []
+        notifications = []
+        processed = []
+        for message, duplicate in zip(messages, duplicates):
+            attack_notification = None if duplicate else next(attack_notifications)
+            if attack_notification is not None:
+                notifications.append(attack_notification)
+
+            results.append(duplicate or attack_notification is not None)
+            if results[-1]:
+                processed.append(message)
+
+        # Messages are only recorded as seen once their notifications have been written, hence a duplicate is only
+        # detected after the original has been committed. Duplicates are acknowledged alongside the batch.
+        buffered_sink.submit(notifications, processed)
+        return results
+
+    if backend.lower() == 'sqs':
+        for name, value in [('--access-key', access_key), ('--secret-key', secret_key), ('--region', region),
+                            ('--queue-url', queue_url)]:
+            if value is None:
+                raise click.BadParameter('Required by the sqs backend.', param_hint=name)
 
-        for message in messages:
-            attack_notification = deserialize_message(message)
-            print_attack_notification(attack_notification, display_overflow)
-
-        if delete_messages:
-            sqs_consumer.delete_messages(queue_url, messages)
+    try:
+        queue_backend = create_backend(backend, access_key, secret_key, region)
+    except ValueError as err:
+        raise click.BadParameter(str(err), param_hint='--backend')
+
+    polling = None
+    if adaptive_polling:
+        polling = AdaptivePolling(functools.partial(queue_backend.queue_depth, queue_url),
+                                  max_messages=num_messages,
+                                  max_wait_time=wait_time,
+                                  num_pollers=pollers)
+
+    pipeline = ConsumerPipeline(queue_backend,
+                                queue_url,
+                                handle_messages,
+                                num_pollers=pollers,
+                                num_workers=workers,
+                                queue_size=queue_size,
+                                num_messages=num_messages,
+                                wait_time_seconds=wait_time,
+                                visibility_timeout=visibility_timeout,
+                                delete_messages=delete_messages,
+                                auto_ack=False,
+                                polling=polling,
+                                heartbeat=heartbeat)
+    if sink.upper() == 'SUMMARY':
+        analytics = AttackAnalytics(sliding_window=summary_window,
+                                    tumbling_window=summary_tumbling_window,
+                                    capacity=max(100, top_k * 10))
+        output = AnalyticsSink(analytics, summary_interval, top_k)
+    else:
+        output = create_sink(sink, sink_dir, display_overflow, int(rotate_size * MB), rotate_interval)
+
+    def complete_messages(messages: List[dict]) -> None:
+        if dedup is not None:
+            dedup.record(messages)
+        pipeline.ack(messages)
+
+    buffered_sink = BufferedSink(output,
+                                 complete_messages,
+                                 flush_size=flush_size,
+                                 flush_interval=flush_interval,
+                                 on_failed=pipeline.reject,
+                                 max_buffered=buffer_size)
+
+    stop_requested = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_requested.set())
+
+    logging.info('Retrieving messages from queue using [%d] pollers and [%d] workers...', pollers, workers)
+    pipeline.start()
+    try:
+        while not stop_requested.wait(timeout=0.1) and not queue_backend.exhausted:
+            pass
+    except KeyboardInterrupt:
+        pass
+
+    logging.info('Shutting down. Processing remaining messages...')
+    pipeline.drain()
+    buffered_sink.close()
+    pipeline.stop()
+
+    if dedup is not None:
+        logging.info('Duplicate messages skipped: %d (%.2f%%).', dedup.duplicates, dedup.hit_rate() * 100)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,30 @@
+"""
+Creation of the queue backends the attack notification consumer receives messages from.
+"""
+from typing import Optional
+
+from ml_ids_api_client.queue_backend import FileReplayQueue, QueueBackend
+
+
+def create_backend(uri: str,
+                   access_key: Optional[str],
+                   secret_key: Optional[str],
+                   region: Optional[str]) -> QueueBackend:
+    """
+    Creates the queue backend identified by the given URI.
+
+    :param uri: Either `sqs` or the path of a JSON lines file to replay (`file://`).
+    :param access_key: Access key of the AWS account connecting to the SQS queue.
+    :param secret_key: Secret key of the AWS account connecting to the SQS queue.
+    :param region: AWS region of the SQS queue.
+    :return: QueueBackend.
+    """
+    if uri.startswith('file://'):
+        return FileReplayQueue(uri[len('file://'):])
+    if uri.lower() == 'sqs':
+        if access_key is None or secret_key is None or region is None:
+            raise ValueError('The sqs backend requires an access key, a secret key and a region.')
+        # pylint: disable=import-outside-toplevel
+        from ml_ids_api_client.aws.sqs_consumer import AwsSQSConsumer
+        return AwsSQSConsumer(access_key, secret_key, region)
+    raise ValueError('Invalid backend {} given. Backend must either be [sqs] or a file [file://].'.format(uri))
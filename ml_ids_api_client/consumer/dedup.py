@@ -0,0 +1,115 @@
+"""
+Detection of redelivered SQS messages.
+"""
+from typing import List, Optional
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import threading
+import time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class DedupCache:
+    """
+    Bounded cache of recently completed messages.
+
+    Messages are identified by their `MessageId` and optionally by a hash of the notification content, which detects
+    notifications published more than once. Messages are only recorded via `record` once they have been completed,
+    e.g. their notifications have been written durably, hence a message whose processing failed is not considered a
+    duplicate upon redelivery. Entries are kept in least recently seen order and expire after `window` seconds. Once
+    `max_entries` keys are stored the least recently seen keys are evicted, hence memory usage is fixed.
+    """
+
+    def __init__(self, max_entries: int = 100000, window: float = 60 * 60, content_hash: bool = False) -> None:
+        """
+        :param max_entries: Maximum number of stored keys.
+        :param window: Time in seconds after which a message is no longer considered a duplicate.
+        :param content_hash: Whether messages with identical notification content are considered duplicates.
+        """
+        if max_entries < 1:
+            raise ValueError('max_entries must be greater 0.')
+
+        self.max_entries = max_entries
+        self.window = window
+        self.content_hash = content_hash
+        self.lookups = 0
+        self.duplicates = 0
+        self._entries: 'OrderedDict[str, float]' = OrderedDict()
+        self._loads = orjson.loads if orjson is not None else json.loads
+        self._lock = threading.Lock()
+
+    def is_duplicate(self, message: dict) -> bool:
+        """
+        Returns whether the message has been recorded within the time window.
+
+        :param message: SQS message.
+        :return: True if the message is a duplicate, else False.
+        """
+        keys = self._keys(message)
+
+        with self._lock:
+            self._expire(time.monotonic())
+            self.lookups += 1
+            duplicate = any(key in self._entries for key in keys)
+            if duplicate:
+                self.duplicates += 1
+
+        return duplicate
+
+    def record(self, messages: List[dict]) -> None:
+        """
+        Records completed messages, hence their redeliveries are considered duplicates.
+
+        :param messages: SQS messages.
+        :return: None
+        """
+        keys = [key for message in messages for key in self._keys(message)]
+        now = time.monotonic()
+
+        with self._lock:
+            for key in keys:
+                self._entries[key] = now
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def hit_rate(self) -> float:
+        """
+        Returns the share of duplicate messages.
+
+        :return: Duplicate rate. 0 if no messages have been looked up.
+        """
+        return self.duplicates / self.lookups if self.lookups > 0 else 0.0
+
+    def _keys(self, message: dict) -> List[str]:
+        keys = []
+        msg_id = message.get('MessageId')
+        if msg_id is not None:
+            keys.append('id:' + msg_id)
+        if self.content_hash:
+            content = self._content(message)
+            if isinstance(content, str):
+                keys.append('content:' + hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest())
+        return keys
+
+    def _content(self, message: dict) -> Optional[str]:
+        # The notification content is published as `Message` within the SNS envelope. The envelope itself contains
+        # fields which differ between deliveries of the same notification.
+        try:
+            return self._loads(message['Body'])['Message']
+        except (KeyError, TypeError, ValueError) as err:
+            logging.debug('Content of message [%s] could not be hashed: %s', message.get('MessageId'), err)
+            return None
+
+    def _expire(self, now: float) -> None:
+        while self._entries:
+            key, seen_at = next(iter(self._entries.items()))
+            if now - seen_at < self.window:
+                return
+            del self._entries[key]
@@ -0,0 +1,109 @@
+"""
+Batch decoder of attack notifications published by the ML-IDS API.
+"""
+from typing import Dict, List, Optional, Tuple
+from collections import namedtuple
+import io
+import json
+import logging
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+AttackNotification = namedtuple('AttackNotification', ['msg_id', 'network_flow'])
+
+Schema = namedtuple('Schema', ['columns', 'date_columns'])
+
+_Entry = namedtuple('_Entry', ['position', 'msg_id', 'msg_content', 'rows', 'index'])
+
+
+class NotificationDecoder:
+    """
+    Decodes batches of SQS messages into instances of `AttackNotification`.
+
+    The network flows of all messages sharing the same columns are decoded into a single DataFrame, each notification
+    holds a slice of it. The column schema is derived from the first message carrying a set of columns and reused for
+    subsequent batches. Message envelopes are parsed by `orjson` if it is installed.
+    """
+
+    def __init__(self) -> None:
+        self._loads = orjson.loads if orjson is not None else json.loads
+        self._schemas: Dict[Tuple[str, ...], Schema] = {}
+
+    def decode(self, messages: List[dict]) -> List[Optional[AttackNotification]]:
+        """
+        Decodes a batch of SQS messages.
+
+        :param messages: SQS messages.
+        :return: List containing an `AttackNotification` per message, None if a message could not be deserialized.
+        """
+        notifications: List[Optional[AttackNotification]] = [None] * len(messages)
+        groups: Dict[Tuple[str, ...], List[_Entry]] = {}
+
+        for position, message in enumerate(messages):
+            parsed = self._parse(message)
+            if parsed is not None:
+                columns, entry = parsed
+                groups.setdefault(columns, []).append(entry._replace(position=position))
+
+        for columns, entries in groups.items():
+            for entry, network_flow in zip(entries, self._decode_network_flows(columns, entries)):
+                notifications[entry.position] = AttackNotification(entry.msg_id, network_flow)
+
+        return notifications
+
+    def _parse(self, message: dict) -> Optional[Tuple[Tuple[str, ...], _Entry]]:
+        msg_content = None
+        try:
+            msg_id = message['MessageId']
+            msg_content = self._loads(message['Body'])['Message']
+            content = self._loads(msg_content)
+            columns = tuple(content['columns'])
+            rows = content['data']
+            index = content.get('index')
+
+            if not isinstance(rows, list) or any(len(row) != len(columns) for row in rows) \
+                    or (index is not None and len(index) != len(rows)):
+                raise ValueError('Number of values does not match the number of columns and index entries.')
+
+            return columns, _Entry(0, msg_id, msg_content, rows, index)
+        except KeyError as err:
+            logging.warning("Message [%s] could not be parsed. Cause: %s", message, err)
+        except (ValueError, TypeError) as err:
+            logging.warning('Message content [%s] could not be parsed. Message does not adhere to Pandas-split format. '
+                            'Cause %s', msg_content, err)
+        return None
+
+    def _decode_network_flows(self, columns: Tuple[str, ...], entries: List[_Entry]) -> List[pd.DataFrame]:
+        schema = self._schema(columns, entries[0].msg_content)
+
+        rows = [row for entry in entries for row in entry.rows]
+        df = pd.DataFrame(rows, columns=schema.columns)
+        df.index = np.concatenate([np.arange(len(entry.rows)) if entry.index is None else np.asarray(entry.index)
+                                   for entry in entries])
+
+        for col in schema.date_columns:
+            try:
+                df[col] = pd.to_datetime(df[col])
+            except (ValueError, TypeError, OverflowError):
+                pass
+
+        offsets = np.cumsum([0] + [len(entry.rows) for entry in entries])
+        return [df.iloc[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+    def _schema(self, columns: Tuple[str, ...], msg_content: str) -> Schema:
+        schema = self._schemas.get(columns)
+        if schema is None:
+            # The first message of a schema is decoded by Pandas to determine which columns contain dates.
+            try:
+                reference = pd.read_json(io.StringIO(msg_content), orient='split')
+                date_columns = [col for col, dtype in reference.dtypes.items() if dtype.kind == 'M']
+            except ValueError:
+                date_columns = []
+            schema = Schema(pd.Index(columns), date_columns)
+            self._schemas[columns] = schema
+        return schema
@@ -0,0 +1,338 @@
+"""
+Multi-threaded pipeline to receive, process and delete SQS messages.
+"""
+from typing import Callable, List, Optional
+import logging
+import queue
+import threading
+import time
+
+from ml_ids_api_client.consumer.polling import AdaptivePolling, MAX_BATCH_SIZE
+from ml_ids_api_client.queue_backend import QueueBackend
+
+# Interval in seconds in which threads blocked on the pipeline check for shutdown.
+POLL_INTERVAL = 0.1
+# Time in seconds a poller waits after a failed receive request.
+ERROR_BACKOFF = 1.0
+
+_SHUTDOWN = object()
+
+
+class ConsumerPipeline:
+    """
+    Receives messages from a SQS queue and processes them concurrently.
+
+    Poller threads receive batches of messages into a bounded work queue which is drained by worker threads. Messages
+    which have been processed successfully are passed to an ack thread that deletes them in batches. Pollers only
+    request as many messages as there are free slots in the work queue, hence polling pauses while the workers are busy
+    and received messages do not exceed their visibility timeout while waiting in the queue.
+
+    If `heartbeat` is set, the visibility timeout of messages which have not yet been completed is extended before it
+    expires, hence slow batches are not redelivered while they are processed.
+    """
+
+    def __init__(self,
+                 consumer: QueueBackend,
+                 queue_url: str,
+                 handler: Callable[[List[dict]], List[bool]],
+                 num_pollers: int = 1,
+                 num_workers: int = 1,
+                 queue_size: int = 100,
+                 num_messages: int = MAX_BATCH_SIZE,
+                 wait_time_seconds: int = 10,
+                 visibility_timeout: int = 60,
+                 delete_messages: bool = False,
+                 auto_ack: bool = True,
+                 ack_interval: float = 1.0,
+                 polling: Optional[AdaptivePolling] = None,
+                 heartbeat: bool = False) -> None:
+        """
+        :param consumer: Queue backend, e.g. `AwsSQSConsumer`.
+        :param queue_url: URL of the message queue.
+        :param handler: Function processing a batch of received messages. Returns for each message whether it has
+                        been processed successfully.
+        :param num_pollers: Number of threads receiving messages.
+        :param num_workers: Number of threads processing messages.
+        :param queue_size: Maximum number of received messages waiting to be processed.
+        :param num_messages: Maximum number of messages per polling request. Should be between 1 - 10.
+        :param wait_time_seconds: Time to wait in seconds for each polling request to return if no messages are
+                                  available.
+        :param visibility_timeout: Visibility timeout for a delivered messages.
+        :param delete_messages: Whether successfully processed messages should be deleted.
+        :param auto_ack: Whether messages are deleted once the handler has processed them successfully. Otherwise
+                         messages are deleted when passed to `ack`.
+        :param ack_interval: Maximum time in seconds a processed message waits for a batch to be deleted.
+        :param polling: Optional policy choosing batch size and wait time of each polling request. If absent,
+                        `num_messages` and `wait_time_seconds` are used.
+        :param heartbeat: Whether the visibility timeout of messages in flight should be extended before it expires.
+        """
+        if num_pollers < 1 or num_workers < 1 or queue_size < 1:
+            raise ValueError('Number of pollers, workers and queue size must be greater 0.')
+
+        self.consumer = consumer
+        self.queue_url = queue_url
+        self.handler = handler
+        self.num_messages = num_messages
+        self.wait_time_seconds = wait_time_seconds
+        self.visibility_timeout = visibility_timeout
+        self.delete_messages = delete_messages
+        self.auto_ack = auto_ack
+        self.ack_interval = ack_interval
+        self.polling = polling
+        self.heartbeat = heartbeat and visibility_timeout > 0
+
+        self.receives = 0
+        self.empty_receives = 0
+        self.received = 0
+        self.processed = 0
+        self.failed = 0
+        self.deleted = 0
+        self.redeliveries_avoided = 0
+        self.started_at: Optional[float] = None
+
+        self._work_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._ack_queue: queue.Queue = queue.Queue()
+        self._slots = threading.Semaphore(queue_size)
+        self._stopping = threading.Event()
+        self._drained = False
+        self._counter_lock = threading.Lock()
+        self._pollers = [threading.Thread(target=self._poll, name='sqs-poller-{}'.format(idx), daemon=True)
+                         for idx in range(num_pollers)]
+        self._workers = [threading.Thread(target=self._work, name='sqs-worker-{}'.format(idx), daemon=True)
+                         for idx in range(num_workers)]
+        self._acker = threading.Thread(target=self._ack, name='sqs-acker', daemon=True)
+        self._heartbeat = threading.Thread(target=self._extend_visibility, name='sqs-heartbeat', daemon=True)
+        self._heartbeat_stopping = threading.Event()
+        self._in_flight: dict = {}
+        self._in_flight_lock = threading.Lock()
+
+    def start(self) -> None:
+        """
+        Starts the pipeline threads.
+
+        :return: None
+        """
+        self.started_at = time.monotonic()
+        for thread in self._pollers + self._workers + [self._acker]:
+            thread.start()
+        if self.heartbeat:
+            self._heartbeat.start()
+
+    def messages_per_second(self) -> float:
+        """
+        Returns the number of processed messages per second since the start of the pipeline.
+
+        :return: Messages per second. 0 if the pipeline has not been started.
+        """
+        if self.started_at is None:
+            return 0.0
+        elapsed = time.monotonic() - self.started_at
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def ack(self, messages: List[dict]) -> None:
+        """
+        Marks messages as completed. Messages are deleted in batches if `delete_messages` is set.
+
+        :param messages: Messages to delete.
+        :return: None
+        """
+        if self.delete_messages:
+            for message in messages:
+                self._ack_queue.put(message)
+
+    def reject(self, messages: List[dict]) -> None:
+        """
+        Marks processed messages as failed, e.g. because their output could not be written. The messages are no longer
+        kept in flight, hence they are redelivered once their visibility timeout expires.
+
+        :param messages: Messages which have been passed to the handler.
+        :return: None
+        """
+        self._untrack(messages)
+        with self._counter_lock:
+            self.processed -= len(messages)
+            self.failed += len(messages)
+
+    def drain(self) -> None:
+        """
+        Stops polling and waits until all received messages have been processed.
+
+        :return: None
+        """
+        if self._drained:
+            return
+        self._drained = True
+
+        self._stopping.set()
+        for thread in self._pollers:
+            thread.join()
+
+        for _ in self._workers:
+            self._work_queue.put(_SHUTDOWN)
+        for thread in self._workers:
+            thread.join()
+
+    def stop(self) -> None:
+        """
+        Stops polling and waits until all received messages have been processed and deleted.
+
+        :return: None
+        """
+        self.drain()
+        self._ack_queue.put(_SHUTDOWN)
+        self._acker.join()
+
+        if self.heartbeat:
+            self._heartbeat_stopping.set()
+            self._heartbeat.join()
+
+        logging.info('Consumer stopped. Received: %d, processed: %d, failed: %d, deleted: %d, empty receives: %d, '
+                     'redeliveries avoided: %d, messages/s: %.1f.', self.received, self.processed, self.failed,
+                     self.deleted, self.empty_receives, self.redeliveries_avoided, self.messages_per_second())
+
+    def _poll(self) -> None:
+        while not self._stopping.is_set():
+            num_messages, wait_time_seconds = self.num_messages, self.wait_time_seconds
+            if self.polling is not None:
+                num_messages, wait_time_seconds = self.polling.next_request()
+
+            nr_slots = self._acquire_slots(num_messages)
+            if nr_slots == 0:
+                continue
+
+            try:
+                messages = self.consumer.receive_messages(self.queue_url,
+                                                          nr_slots,
+                                                          wait_time_seconds,
+                                                          self.visibility_timeout)
+            except Exception:  # pylint: disable=broad-except
+                logging.exception('Receiving messages failed. Retrying in [%.1f] seconds.', ERROR_BACKOFF)
+                for _ in range(nr_slots):
+                    self._slots.release()
+                self._stopping.wait(timeout=ERROR_BACKOFF)
+                continue
+
+            for _ in range(nr_slots - len(messages)):
+                self._slots.release()
+
+            if self.polling is not None:
+                self.polling.record(len(messages))
+            with self._counter_lock:
+                self.receives += 1
+                self.received += len(messages)
+                if not messages:
+                    self.empty_receives += 1
+
+            if messages:
+                self._track(messages)
+                self._work_queue.put(messages)
+
+    def _acquire_slots(self, num_messages: int) -> int:
+        # Blocks until at least one slot is free, then acquires as many free slots as are requested per poll.
+        if not self._slots.acquire(timeout=POLL_INTERVAL):
+            return 0
+        nr_slots = 1
+        while nr_slots < num_messages and self._slots.acquire(blocking=False):
+            nr_slots += 1
+        return nr_slots
+
+    def _work(self) -> None:
+        while True:
+            messages = self._work_queue.get()
+            if messages is _SHUTDOWN:
+                return
+
+            try:
+                results = self.handler(messages)
+            except Exception:  # pylint: disable=broad-except
+                logging.exception('Batch of [%d] messages could not be processed.', len(messages))
+                results = [False] * len(messages)
+            finally:
+                for _ in messages:
+                    self._slots.release()
+
+            processed = [message for message, success in zip(messages, results) if success]
+            with self._counter_lock:
+                self.processed += len(processed)
+                self.failed += len(messages) - len(processed)
+
+            # Failed messages become visible again once their visibility timeout expires. Processed messages are
+            # completed unless they have to be deleted.
+            self._untrack([message for message, success in zip(messages, results)
+                           if not success or not self.delete_messages])
+
+            if self.auto_ack:
+                self.ack(processed)
+
+    def _ack(self) -> None:
+        batch: List[dict] = []
+        deadline = None
+        shutdown = False
+
+        while not shutdown:
+            timeout = POLL_INTERVAL if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                message = self._ack_queue.get(timeout=timeout)
+                if message is _SHUTDOWN:
+                    shutdown = True
+                else:
+                    batch.append(message)
+                    deadline = deadline or time.monotonic() + self.ack_interval
+            except queue.Empty:
+                pass
+
+            if batch and (shutdown or len(batch) >= MAX_BATCH_SIZE or
+                          (deadline is not None and time.monotonic() >= deadline)):
+                try:
+                    failed = self.consumer.delete_messages(self.queue_url, batch)
+                except Exception:  # pylint: disable=broad-except
+                    # Messages which could not be deleted are redelivered once their visibility timeout expires.
+                    logging.exception('Deleting [%d] messages failed.', len(batch))
+                    failed = batch
+                self._untrack(batch)
+                with self._counter_lock:
+                    self.deleted += len(batch) - len(failed)
+                batch = []
+                deadline = None
+
+    def _track(self, messages: List[dict]) -> None:
+        deadline = time.monotonic() + self.visibility_timeout
+        with self._in_flight_lock:
+            for message in messages:
+                self._in_flight[id(message)] = [message, deadline, False]
+
+    def _untrack(self, messages: List[dict]) -> None:
+        with self._in_flight_lock:
+            for message in messages:
+                self._in_flight.pop(id(message), None)
+
+    def _extend_visibility(self) -> None:
+        # Messages are extended once less than half of their visibility timeout remains.
+        interval = max(self.visibility_timeout / 4, POLL_INTERVAL)
+        while not self._heartbeat_stopping.wait(timeout=interval):
+            now = time.monotonic()
+            with self._in_flight_lock:
+                expiring = [entry for entry in self._in_flight.values()
+                            if entry[1] - now < self.visibility_timeout / 2]
+            if not expiring:
+                continue
+
+            try:
+                failed = self.consumer.change_visibility(self.queue_url,
+                                                         [message for message, _, _ in expiring],
+                                                         self.visibility_timeout)
+            except Exception:  # pylint: disable=broad-except
+                logging.exception('Extending the visibility timeout of [%d] messages failed.', len(expiring))
+                continue
+            failed_ids = {id(message) for message in failed}
+            deadline = now + self.visibility_timeout
+
+            with self._in_flight_lock:
+                for entry in expiring:
+                    if id(entry[0]) in failed_ids or id(entry[0]) not in self._in_flight:
+                        continue
+                    entry[1] = deadline
+                    if not entry[2]:
+                        entry[2] = True
+                        with self._counter_lock:
+                            self.redeliveries_avoided += 1
@@ -0,0 +1,109 @@
+"""
+Adaptive polling of SQS queues.
+"""
+from typing import Callable, Optional, Tuple
+from collections import deque
+import math
+import threading
+import time
+
+
+# Maximum number of messages per SQS polling request.
+MAX_BATCH_SIZE = 10
+# Maximum wait time of SQS long-polling requests in seconds.
+MAX_WAIT_TIME = 20
+
+
+class AdaptivePolling:
+    """
+    Chooses batch size and wait time of polling requests based on the share of recent empty receives and the
+    approximate queue depth.
+
+    While messages are backed up, polling requests return immediately with full batches. While the queue is idle,
+    long-polling requests wait up to `max_wait_time` seconds, avoiding empty receives. In between, the wait time grows
+    with the share of empty receives and the backlog is split evenly among the pollers.
+    """
+
+    def __init__(self,
+                 queue_depth: Optional[Callable[[], Optional[int]]] = None,
+                 max_messages: int = MAX_BATCH_SIZE,
+                 max_wait_time: int = MAX_WAIT_TIME,
+                 num_pollers: int = 1,
+                 history: int = 20,
+                 depth_interval: float = 10.0) -> None:
+        """
+        :param queue_depth: Function returning the approximate number of visible messages, None if unknown.
+        :param max_messages: Maximum number of messages per polling request.
+        :param max_wait_time: Maximum wait time of polling requests in seconds.
+        :param num_pollers: Number of threads polling the queue concurrently.
+        :param history: Number of recent receives the share of empty receives is computed from.
+        :param depth_interval: Interval in seconds in which the queue depth is refreshed.
+        """
+        self.queue_depth = queue_depth
+        self.max_messages = max_messages
+        self.max_wait_time = max_wait_time
+        self.num_pollers = num_pollers
+        self.depth_interval = depth_interval
+        self._history: deque = deque(maxlen=history)
+        self._depth: Optional[int] = None
+        self._depth_updated_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def next_request(self) -> Tuple[int, int]:
+        """
+        Returns the parameters of the next polling request.
+
+        :return: Tuple of number of messages and wait time in seconds.
+        """
+        depth = self._current_depth()
+        with self._lock:
+            empty_ratio = sum(self._history) / len(self._history) if self._history else 0.0
+
+        if depth is not None and depth >= self.max_messages * self.num_pollers:
+            return self.max_messages, 0
+        if depth == 0 or empty_ratio >= 0.5:
+            return self.max_messages, self.max_wait_time
+
+        num_messages = self.max_messages
+        if depth is not None:
+            num_messages = min(max(math.ceil(depth / self.num_pollers), 1), self.max_messages)
+        return num_messages, int(round(self.max_wait_time * empty_ratio))
+
+    def record(self, nr_messages: int) -> None:
+        """
+        Records the number of messages returned by a polling request.
+
+        :param nr_messages: Number of received messages.
+        :return: None
+        """
+        with self._lock:
+            self._history.append(nr_messages == 0)
+            if self._depth is not None:
+                self._depth = max(self._depth - nr_messages, 0)
+
+    def empty_ratio(self) -> float:
+        """
+        Returns the share of empty receives among the recent polling requests.
+
+        :return: Share of empty receives.
+        """
+        with self._lock:
+            return sum(self._history) / len(self._history) if self._history else 0.0
+
+    def _current_depth(self) -> Optional[int]:
+        if self.queue_depth is None:
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            stale = self._depth_updated_at is None or now - self._depth_updated_at >= self.depth_interval
+            if stale:
+                # Refreshed by a single poller, others use the previous value in the meantime.
+                self._depth_updated_at = now
+            else:
+                return self._depth
+
+        depth = self.queue_depth()
+        with self._lock:
+            self._depth = depth
+        return depth
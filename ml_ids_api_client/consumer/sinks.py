@@ -0,0 +1,398 @@
+"""
+Output sinks persisting or displaying attack notifications.
+"""
+from typing import Any, Callable, List, Optional, TextIO
+from abc import ABC, abstractmethod
+import logging
+import os
+import sys
+import threading
+import time
+import pandas as pd
+
+from ml_ids_api_client.consumer.analytics import AttackAnalytics, print_analytics_summary
+from ml_ids_api_client.consumer.notification_decoder import AttackNotification
+from ml_ids_api_client.user_interaction import print_dataframe
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+MB = 1024 * 1024
+
+MSG_ID_COLUMN = 'msg_id'
+
+# Parquet files only become durable once they are closed, hence they are rotated more frequently by default.
+PARQUET_MAX_AGE = 60.0
+
+
+class NotificationSink(ABC):
+    """
+    Base class of output sinks.
+
+    Notifications passed to `write` are durable once `commit` returns True. Sinks are only accessed by a single thread.
+    """
+
+    @abstractmethod
+    def write(self, notifications: List[AttackNotification]) -> None:
+        """
+        Writes attack notifications.
+
+        :param notifications: List of attack notifications.
+        :return: None
+        """
+
+    @abstractmethod
+    def commit(self) -> bool:
+        """
+        Flushes written notifications.
+
+        :return: True if all written notifications are durable, False if they are held until a later commit.
+        """
+
+    def close(self) -> None:
+        """
+        Flushes all written notifications and releases the sink. All written notifications are durable afterwards.
+
+        :return: None
+        """
+        self.commit()
+
+
+class ConsoleSink(NotificationSink):
+    """
+    Displays attack notifications on the console.
+    """
+
+    def __init__(self, display_overflow: str) -> None:
+        """
+        :param display_overflow: Overflow behaviour if the output exceeds the window width.
+        """
+        self.display_overflow = display_overflow
+
+    def write(self, notifications: List[AttackNotification]) -> None:
+        for notification in notifications:
+            print_attack_notification(notification, self.display_overflow)
+
+    def commit(self) -> bool:
+        sys.stdout.flush()
+        return True
+
+
+class AnalyticsSink(NotificationSink):
+    """
+    Aggregates attack notifications and periodically displays a summary of the aggregates instead of each
+    notification.
+    """
+
+    def __init__(self, analytics: AttackAnalytics, interval: float = 10.0, nr_keys: int = 10) -> None:
+        """
+        :param analytics: Aggregates updated with each written notification.
+        :param interval: Interval in seconds in which the summary is displayed.
+        :param nr_keys: Number of most frequent values displayed per dimension.
+        """
+        self.analytics = analytics
+        self.interval = interval
+        self.nr_keys = nr_keys
+        self._printed_at = time.monotonic()
+
+    def write(self, notifications: List[AttackNotification]) -> None:
+        self.analytics.update(notifications)
+
+    def commit(self) -> bool:
+        if time.monotonic() - self._printed_at >= self.interval:
+            self._print_summary()
+        return True
+
+    def close(self) -> None:
+        self._print_summary()
+
+    def _print_summary(self) -> None:
+        print_analytics_summary(self.analytics, self.nr_keys)
+        sys.stdout.flush()
+        self._printed_at = time.monotonic()
+
+
+class RotatingFileSink(NotificationSink, ABC):
+    """
+    Base class of sinks writing to files in an output directory. A new file is started once the current file exceeds
+    `max_bytes` or has been opened for longer than `max_age` seconds.
+    """
+    EXTENSION = ''
+
+    def __init__(self, output_dir: str, max_bytes: int = 64 * MB, max_age: float = 60 * 60) -> None:
+        """
+        :param output_dir: Directory the files are written to.
+        :param max_bytes: Size in bytes after which a new file is started.
+        :param max_age: Time in seconds after which a new file is started.
+        """
+        self.output_dir = output_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.path: Optional[str] = None
+        self.bytes_written = 0
+        self.opened_at = 0.0
+        self._sequence = 0
+        os.makedirs(output_dir, exist_ok=True)
+
+    def _next_path(self) -> str:
+        self._sequence += 1
+        name = 'notifications-{}-{:04d}{}'.format(time.strftime('%Y%m%d-%H%M%S'), self._sequence, self.EXTENSION)
+        return os.path.join(self.output_dir, name)
+
+    def _rotation_due(self) -> bool:
+        return self.path is not None and \
+            (self.bytes_written >= self.max_bytes or time.monotonic() - self.opened_at >= self.max_age)
+
+
+class JsonlSink(RotatingFileSink):
+    """
+    Writes attack notifications as JSON lines, one line per network flow. Each line contains the message id in the
+    field `msg_id` and the network flow features.
+    """
+    EXTENSION = '.jsonl'
+
+    def __init__(self, output_dir: str, max_bytes: int = 64 * MB, max_age: float = 60 * 60) -> None:
+        super().__init__(output_dir, max_bytes, max_age)
+        self._file: Optional[TextIO] = None
+
+    def write(self, notifications: List[AttackNotification]) -> None:
+        if not notifications:
+            return
+        if self._rotation_due():
+            self._close_file()
+        if self._file is None:
+            self.path = self._next_path()
+            self._file = open(self.path, 'a', encoding='utf-8')
+            self.bytes_written = 0
+            self.opened_at = time.monotonic()
+
+        content = to_frame(notifications).to_json(orient='records', lines=True, date_format='iso')
+        if not content.endswith('\n'):
+            content += '\n'
+        self._file.write(content)
+        self.bytes_written += len(content)
+
+    def commit(self) -> bool:
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        return True
+
+    def close(self) -> None:
+        self._close_file()
+
+    def _close_file(self) -> None:
+        if self._file is not None:
+            self.commit()
+            self._file.close()
+            self._file = None
+
+
+class ParquetSink(RotatingFileSink):
+    """
+    Writes attack notifications to Parquet files, one row per network flow, with the message id in the column
+    `msg_id`. Requires the `pyarrow` package.
+
+    A Parquet file can only be read once it has been closed, hence written notifications only become durable upon
+    rotation of the file. Messages of written notifications are not acknowledged before, independent of the flush
+    interval of a `BufferedSink`, and stay in flight for up to `max_age` seconds. Keep `max_age` short to bound the
+    number of unacknowledged messages. Files are written to a temporary name and renamed once they have been closed.
+    """
+    EXTENSION = '.parquet'
+
+    def __init__(self, output_dir: str, max_bytes: int = 64 * MB, max_age: float = PARQUET_MAX_AGE) -> None:
+        if pa is None:
+            raise ImportError('pyarrow is not installed. Install it via `pip install pyarrow`.')
+        super().__init__(output_dir, max_bytes, max_age)
+        self._writer: Optional[Any] = None
+
+    def write(self, notifications: List[AttackNotification]) -> None:
+        if not notifications:
+            return
+        table = pa.Table.from_pandas(to_frame(notifications), preserve_index=False)
+
+        if self._writer is not None and not self._writer.schema.equals(table.schema, check_metadata=False):
+            self._close_file()
+        if self._writer is None:
+            self.path = self._next_path()
+            self._writer = pq.ParquetWriter(self.path + '.tmp', table.schema)
+            self.bytes_written = 0
+            self.opened_at = time.monotonic()
+
+        self._writer.write_table(table)
+        self.bytes_written += table.nbytes
+
+    def commit(self) -> bool:
+        if self._rotation_due():
+            self._close_file()
+        return self._writer is None
+
+    def close(self) -> None:
+        self._close_file()
+
+    def _close_file(self) -> None:
+        if self._writer is not None and self.path is not None:
+            self._writer.close()
+            self._writer = None
+            with open(self.path + '.tmp', 'rb') as file:
+                os.fsync(file.fileno())
+            os.replace(self.path + '.tmp', self.path)
+
+
+class BufferedSink:
+    """
+    Buffers attack notifications and writes them to a sink in batches from a background thread.
+
+    The messages of written notifications are passed to `on_durable` once the sink has committed them, hence messages
+    can be deleted from the queue after the notifications have been persisted. If writing fails, the messages of all
+    notifications which have not been committed yet are passed to `on_failed`. Once `max_buffered` notifications are
+    buffered, `submit` blocks until the buffer has been flushed, hence memory usage is bounded if the sink falls behind.
+    """
+
+    def __init__(self,
+                 sink: NotificationSink,
+                 on_durable: Callable[[List[dict]], None],
+                 flush_size: int = 1000,
+                 flush_interval: float = 1.0,
+                 on_failed: Optional[Callable[[List[dict]], None]] = None,
+                 max_buffered: Optional[int] = None) -> None:
+        """
+        :param sink: Sink the notifications are written to.
+        :param on_durable: Function called with the messages of notifications which have become durable.
+        :param flush_size: Number of buffered notifications after which the buffer is flushed.
+        :param flush_interval: Maximum time in seconds notifications are buffered.
+        :param on_failed: Optional function called with the messages of notifications which could not be written.
+        :param max_buffered: Maximum number of buffered notifications. Defaults to 10 times `flush_size`.
+        """
+        self.sink = sink
+        self.on_durable = on_durable
+        self.on_failed = on_failed
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered or 10 * flush_size
+
+        self._notifications: List[AttackNotification] = []
+        self._messages: List[dict] = []
+        self._uncommitted: List[dict] = []
+        self._closing = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='sink-flusher', daemon=True)
+        self._thread.start()
+
+    def submit(self, notifications: List[AttackNotification], messages: List[dict]) -> None:
+        """
+        Adds notifications to the buffer. Blocks while `max_buffered` notifications are buffered.
+
+        :param notifications: Attack notifications.
+        :param messages: Messages the notifications have been decoded from.
+        :return: None
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._closing or len(self._notifications) < self.max_buffered)
+            if self._closing:
+                raise ValueError('Sink has been closed.')
+            self._notifications.extend(notifications)
+            self._messages.extend(messages)
+            if len(self._notifications) >= self.flush_size:
+                self._condition.notify_all()
+
+    def close(self) -> None:
+        """
+        Flushes all buffered notifications and closes the sink.
+
+        :return: None
+        """
+        with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+        self._thread.join()
+
+    def _run(self) -> None:
+        closing = False
+        while not closing:
+            with self._condition:
+                self._condition.wait_for(lambda: self._closing or len(self._notifications) >= self.flush_size,
+                                         timeout=self.flush_interval)
+                notifications, self._notifications = self._notifications, []
+                messages, self._messages = self._messages, []
+                closing = self._closing
+                self._condition.notify_all()
+
+            self._uncommitted.extend(messages)
+            try:
+                self.sink.write(notifications)
+                if closing:
+                    self.sink.close()
+                    durable = True
+                else:
+                    durable = self.sink.commit()
+            except Exception:  # pylint: disable=broad-except
+                # Messages of notifications which could not be written are not acknowledged. They are passed to
+                # `on_failed`, hence they can be released for redelivery.
+                logging.exception('Writing [%d] attack notifications failed.', len(notifications))
+                failed, self._uncommitted = self._uncommitted, []
+                if failed and self.on_failed is not None:
+                    self.on_failed(failed)
+                continue
+
+            if durable and self._uncommitted:
+                self.on_durable(self._uncommitted)
+                self._uncommitted = []
+
+
+def create_sink(sink_type: str,
+                output_dir: str,
+                display_overflow: str,
+                max_bytes: int = 64 * MB,
+                max_age: Optional[float] = None) -> NotificationSink:
+    """
+    Creates a sink of the given type.
+
+    :param sink_type: Sink type (CONSOLE | JSONL | PARQUET).
+    :param output_dir: Output directory of file sinks.
+    :param display_overflow: Overflow behaviour of the console sink.
+    :param max_bytes: Size in bytes after which file sinks start a new file.
+    :param max_age: Time in seconds after which file sinks start a new file. Defaults to 1 hour for JSONL and to
+                    `PARQUET_MAX_AGE` for PARQUET.
+    :return: NotificationSink.
+    """
+    if sink_type.upper() == 'CONSOLE':
+        return ConsoleSink(display_overflow)
+    if sink_type.upper() == 'JSONL':
+        return JsonlSink(output_dir, max_bytes, max_age or 60 * 60)
+    if sink_type.upper() == 'PARQUET':
+        return ParquetSink(output_dir, max_bytes, max_age or PARQUET_MAX_AGE)
+    raise ValueError('Invalid sink type {} given. Type must be one of [CONSOLE | JSONL | PARQUET].'.format(sink_type))
+
+
+def to_frame(notifications: List[AttackNotification]) -> pd.DataFrame:
+    """
+    Combines the network flows of attack notifications into a single DataFrame with the message id in the first
+    column.
+
+    :param notifications: Attack notifications.
+    :return: Pandas DataFrame.
+    """
+    frames = [notification.network_flow for notification in notifications]
+    msg_ids = [notification.msg_id for notification in notifications for _ in range(len(notification.network_flow))]
+    df = pd.concat(frames, ignore_index=True, sort=False) if len(frames) > 1 else frames[0].reset_index(drop=True)
+    df.insert(0, MSG_ID_COLUMN, msg_ids)
+    return df
+
+
+def print_attack_notification(attack_notification: AttackNotification, display_overflow: str) -> None:
+    """
+    Displays the details of an attack notification to the user.
+
+    :param attack_notification: AttackNotification.
+    :param display_overflow: Overflow behaviour if the output exceeds the window width.
+    :return: None.
+    """
+    print('Attack detected [{}]'.format(attack_notification.msg_id))
+    print('Network Flow:\n')
+    print_dataframe(attack_notification.network_flow, display_overflow)
+    print('\n')
@@ -1,12 +1,29 @@
 """
 Utility functions to manipulate datasets.
 """
-from typing import List, Union, Tuple, Dict
+from typing import List, Union, Tuple, Dict, Optional, Callable, Iterator
 from collections import namedtuple
+import json
+import numpy as np
 import pandas as pd
+from ml_ids_api_client.constants import DEFAULT_THRESHOLD
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
 
 Selection = namedtuple('Selection', ['category', 'nr_samples', 'delay'])
 RandomSelection = namedtuple('RandomSelection', ['nr_samples', 'delay'])
+# `mix` maps categories to weights, which are scaled to `nr_samples` samples. If `nr_samples` is None, the values of
+# `mix` are the number of samples per category.
+MixSelection = namedtuple('MixSelection', ['mix', 'nr_samples', 'delay'])
+PredictionStats = namedtuple('PredictionStats', ['accuracy', 'precision', 'recall', 'true_positives',
+                                                 'false_positives', 'true_negatives', 'false_negatives',
+                                                 'confusion'])
+
+BENIGN_LABEL = 'Benign'
+ATTACK_LABEL = 'Attack'
 
 
 def get_categories(df: pd.DataFrame) -> Dict[int, str]:
@@ -19,21 +36,27 @@ def get_categories(df: pd.DataFrame) -> Dict[int, str]:
     return dict(zip(range(0, len(categories)), categories))
 
 
-def select_samples(df: pd.DataFrame, selection: Union[Selection, RandomSelection]) -> pd.DataFrame:
+def select_samples(df: pd.DataFrame,
+                   selection: Union[Selection, RandomSelection, MixSelection],
+                   rng: Optional[np.random.Generator] = None) -> pd.DataFrame:
     """
-    Selects samples from the given DataFrame. Selection can either be performed by specifying a category (`Selection`)
-    or by random sampling of instances (`RandomSelection`).
+    Selects samples from the given DataFrame. Selection can either be performed by specifying a category (`Selection`),
+    by random sampling of instances (`RandomSelection`) or by specifying the share of each category (`MixSelection`).
 
     :param df: Pandas DataFrame.
-    :param selection: Selection parameters to sample instances (Selection | RandomSelection).
+    :param selection: Selection parameters to sample instances (Selection | RandomSelection | MixSelection).
+    :param rng: Optional random number generator used to draw mixed selections. Pass a seeded generator to draw
+                identical samples across runs.
     :return: Selected samples as Pandas DataFrame.
     """
     if isinstance(selection, Selection):
         return select_category_samples(df, selection)
     if isinstance(selection, RandomSelection):
         return select_random_samples(df, selection)
-    raise ValueError('Invalid selection {} given. Selection must be of type [Selection | RandomSelection].'
-                     .format(selection))
+    if isinstance(selection, MixSelection):
+        return select_mix_samples(df, selection, rng)
+    raise ValueError('Invalid selection {} given. Selection must be of type [Selection | RandomSelection | '
+                     'MixSelection].'.format(selection))
 
 
 def select_random_samples(df: pd.DataFrame, selection: RandomSelection) -> pd.DataFrame:
@@ -63,27 +86,390 @@ def select_category_samples(df: pd.DataFrame, selection: Selection) -> pd.DataFr
     return samples
 
 
-def merge_predictions(samples: pd.DataFrame, predictions: List[float]) -> Tuple[pd.DataFrame, float]:
+def select_mix_samples(df: pd.DataFrame,
+                       selection: MixSelection,
+                       rng: Optional[np.random.Generator] = None) -> pd.DataFrame:
+    """
+    Selects samples of multiple categories from the DataFrame. See `draw_mix_positions`.
+
+    :param df: Pandas DataFrame.
+    :param selection: Selection parameters.
+    :param rng: Optional random number generator. If absent, samples are drawn from an unseeded generator.
+    :return: Selected samples as Pandas DataFrame.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    labels = df.label.to_numpy()
+    positions = {category: np.flatnonzero(labels == category) for category in selection.mix}
+    return df.iloc[draw_mix_positions(positions, mix_counts(selection), rng)]
+
+
+def mix_counts(selection: MixSelection) -> Dict[str, int]:
+    """
+    Returns the number of samples per category of a mixed selection. Weights are scaled to `nr_samples` samples,
+    rounding fractional counts such that the total equals `nr_samples` (largest remainder method).
+
+    :param selection: Selection parameters.
+    :return: Number of samples per category.
+    """
+    categories = list(selection.mix)
+    values = np.array([selection.mix[category] for category in categories], dtype=np.float64)
+
+    if len(values) == 0 or (values < 0).any() or not np.isfinite(values).all():
+        raise ValueError('Invalid mix {} given. Mix must contain non-negative weights or counts.'.format(selection.mix))
+
+    if selection.nr_samples is None:
+        if (values != np.floor(values)).any():
+            raise ValueError('Invalid mix {} given. Counts must be integers.'.format(selection.mix))
+        return dict(zip(categories, values.astype(np.int64).tolist()))
+
+    if values.sum() == 0:
+        raise ValueError('Invalid mix {} given. Sum of weights must be greater 0.'.format(selection.mix))
+    exact = values / values.sum() * selection.nr_samples
+    counts = np.floor(exact).astype(np.int64)
+    remainder = selection.nr_samples - counts.sum()
+    counts[np.argsort(-(exact - counts), kind='stable')[:remainder]] += 1
+    return dict(zip(categories, counts.tolist()))
+
+
+def draw_mix_positions(positions: Dict[str, np.ndarray],
+                       counts: Dict[str, int],
+                       rng: np.random.Generator) -> np.ndarray:
+    """
+    Draws the given number of row positions per category and shuffles them. Positions are drawn without replacement
+    as long as a category contains enough rows, additional positions are drawn with replacement.
+
+    :param positions: Row positions per category.
+    :param counts: Number of positions to draw per category.
+    :param rng: Random number generator.
+    :return: Drawn positions in random order.
+    """
+    missing = [category for category, count in counts.items() if count > 0 and len(positions.get(category, ())) == 0]
+    if missing:
+        raise ValueError('No network flows of categories {} found.'.format(missing))
+
+    drawn = [_draw_positions(positions[category], count, rng) for category, count in counts.items() if count > 0]
+    if not drawn:
+        return np.empty(0, dtype=np.int64)
+    return rng.permutation(np.concatenate(drawn))
+
+
+def _draw_positions(positions: np.ndarray, count: int, rng: np.random.Generator) -> np.ndarray:
+    if count <= len(positions):
+        return positions[rng.choice(len(positions), size=count, replace=False)]
+    return np.concatenate([positions, positions[rng.integers(0, len(positions), size=count - len(positions))]])
+
+
+def load_mix_profile(path: str, nr_samples: Optional[int] = None) -> MixSelection:
+    """
+    Loads a mixed selection from a JSON or YAML profile (`.yml`, `.yaml`). YAML profiles require the `pyyaml` package.
+
+    The profile contains the share of each category in `weights` and optionally the total number of samples in
+    `nr_samples`, or the number of samples of each category in `counts`, e.g.
+    `{"nr_samples": 1000, "weights": {"Benign": 0.9, "FTP-BruteForce": 0.1}}`.
+
+    :param path: Path of the profile.
+    :param nr_samples: Optional total number of samples overriding the profile. Counts are scaled accordingly.
+    :return: MixSelection.
+    """
+    with open(path, encoding='utf-8') as file:
+        if path.endswith(('.yml', '.yaml')):
+            if yaml is None:
+                raise ImportError('pyyaml is not installed. Install it via `pip install pyyaml`.')
+            profile = yaml.safe_load(file)
+        else:
+            profile = json.load(file)
+
+    if not isinstance(profile, dict) or ('weights' in profile) == ('counts' in profile):
+        raise ValueError('Invalid mix profile {} given. Profile must contain either [weights] or [counts].'
+                         .format(path))
+    if 'counts' in profile:
+        return MixSelection(mix=dict(profile['counts']), nr_samples=nr_samples, delay=None)
+
+    nr_samples = nr_samples or profile.get('nr_samples')
+    if nr_samples is None:
+        raise ValueError('Invalid mix profile {} given. Profiles containing [weights] require [nr_samples].'
+                         .format(path))
+    return MixSelection(mix=dict(profile['weights']), nr_samples=int(nr_samples), delay=None)
+
+
+class SampleIndex:
     """
-    Merges input samples with attack predictions.
+    Index over the network traffic categories of a dataset, allowing to select samples without scanning the dataset.
+
+    The index stores the row positions of each category. Samples are selected by drawing positions using a
+    `numpy.random.Generator` and are taken from the dataset with a single `iloc` call.
+    """
+
+    def __init__(self, df: pd.DataFrame, seed: Optional[int] = None) -> None:
+        """
+        Builds the index. The `label` column of the given DataFrame is converted to a categorical dtype in place.
+
+        :param df: Pandas DataFrame.
+        :param seed: Optional seed of the random number generator used to draw samples.
+        """
+        if not isinstance(df['label'].dtype, pd.CategoricalDtype):
+            df['label'] = df['label'].astype('category')
+
+        codes = df['label'].cat.codes.to_numpy()
+        labels = df['label'].cat.categories.to_list()
+        valid = codes >= 0
+        order = np.flatnonzero(valid)[np.argsort(codes[valid], kind='stable')]
+        counts = np.bincount(codes[valid], minlength=len(labels))
+
+        self.df = df
+        self.positions = dict(zip(labels, np.split(order, np.cumsum(counts)[:-1])))
+        self.rng = np.random.default_rng(seed)
+
+        by_count = sorted(labels, key=lambda label: len(self.positions[label]), reverse=True)
+        self.categories = dict(enumerate(label for label in by_count if len(self.positions[label]) > 0))
+
+    def get_categories(self) -> Dict[int, str]:
+        """
+        Returns unique network traffic categories ordered by frequency.
+
+        :return: Unique categories as dict. A unique number is assigned to each category.
+        """
+        return dict(self.categories)
+
+    def select_samples(self, selection: Union[Selection, RandomSelection, MixSelection]) -> pd.DataFrame:
+        """
+        Selects samples from the indexed DataFrame. See `select_samples`.
+
+        :param selection: Selection parameters to sample instances (Selection | RandomSelection | MixSelection).
+        :return: Selected samples as Pandas DataFrame.
+        """
+        if isinstance(selection, Selection):
+            positions = self.positions.get(selection.category, np.empty(0, dtype=np.int64))
+        elif isinstance(selection, RandomSelection):
+            positions = None
+        elif isinstance(selection, MixSelection):
+            return self.df.iloc[draw_mix_positions(self.positions, mix_counts(selection), self.rng)]
+        else:
+            raise ValueError('Invalid selection {} given. Selection must be of type [Selection | RandomSelection | '
+                             'MixSelection].'.format(selection))
+
+        if positions is None and selection.nr_samples >= len(self.df):
+            return self.df
+        return self.df.iloc[self.sample_positions(positions, selection.nr_samples)]
+
+    def sample_positions(self, positions: Optional[np.ndarray], nr_samples: int) -> np.ndarray:
+        """
+        Draws row positions without replacement.
+
+        :param positions: Row positions to draw from. If None, all rows of the DataFrame are considered.
+        :param nr_samples: Number of positions to draw.
+        :return: Drawn positions. All positions in their original order if `nr_samples` exceeds the available
+                 positions.
+        """
+        nr_available = len(self.df) if positions is None else len(positions)
+
+        if nr_available <= nr_samples:
+            return np.arange(nr_available) if positions is None else positions
+
+        drawn = self.rng.choice(nr_available, size=nr_samples, replace=False)
+        return drawn if positions is None else positions[drawn]
+
+
+class ReservoirSampler:
+    """
+    Draws a uniform random sample of fixed size from a stream of DataFrames in a single pass (reservoir sampling).
+    Memory usage is bounded by the sample size and the size of a single chunk.
+    """
+
+    def __init__(self, nr_samples: int, rng: np.random.Generator) -> None:
+        """
+        :param nr_samples: Number of samples to draw.
+        :param rng: Random number generator.
+        """
+        self.nr_samples = nr_samples
+        self.rng = rng
+        self.seen = 0
+        self.reservoir: Optional[pd.DataFrame] = None
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        """
+        Offers the rows of the given chunk to the reservoir.
+
+        :param chunk: Pandas DataFrame.
+        :return: None
+        """
+        if self.reservoir is None:
+            self.reservoir = chunk.iloc[:0]
+        if len(chunk) == 0:
+            return
+
+        # Row at stream position `pos` is placed in slot `pos` while the reservoir is not full, else it replaces a
+        # random slot in `[0, pos]` if that slot lies within the reservoir.
+        stream_pos = self.seen + np.arange(len(chunk))
+        slots = np.where(stream_pos < self.nr_samples, stream_pos, self.rng.integers(0, stream_pos + 1))
+        accepted = np.flatnonzero(slots < self.nr_samples)
+
+        pool = pd.concat([self.reservoir, chunk.iloc[accepted]])
+        source = np.arange(min(self.nr_samples, self.seen + len(chunk)))
+        # Later rows replace earlier rows assigned to the same slot.
+        source[slots[accepted]] = len(self.reservoir) + np.arange(len(accepted))
+
+        self.reservoir = pool.iloc[source]
+        self.seen += len(chunk)
+
+    def result(self) -> pd.DataFrame:
+        """
+        Returns the drawn samples.
+
+        :return: Pandas DataFrame containing at most `nr_samples` rows.
+        """
+        return self.reservoir if self.reservoir is not None else pd.DataFrame()
+
+
+class StreamSampler:
+    """
+    Selects samples from a dataset which is read in chunks, without loading the whole dataset into memory.
+    Each selection requires a single pass over the dataset.
+    """
+
+    def __init__(self, read_chunks: Callable[..., Iterator[pd.DataFrame]], seed: Optional[int] = None) -> None:
+        """
+        :param read_chunks: Function returning an iterator over the chunks of the dataset. The function must accept
+                            an optional keyword argument `columns` restricting the columns to read.
+        :param seed: Optional seed of the random number generator used to draw samples.
+        """
+        self.read_chunks = read_chunks
+        self.rng = np.random.default_rng(seed)
+        self.categories: Optional[Dict[int, str]] = None
+
+    def get_categories(self) -> Dict[int, str]:
+        """
+        Returns unique network traffic categories ordered by frequency.
+
+        :return: Unique categories as dict. A unique number is assigned to each category.
+        """
+        if self.categories is None:
+            counts = pd.Series(dtype=np.int64)
+            for chunk in self.read_chunks(columns=['label']):
+                counts = counts.add(chunk.label.value_counts(), fill_value=0)
+            categories = counts.sort_values(ascending=False, kind='stable').index.to_list()
+            self.categories = dict(enumerate(categories))
+        return dict(self.categories)
+
+    def select_samples(self, selection: Union[Selection, RandomSelection, MixSelection]) -> pd.DataFrame:
+        """
+        Selects samples from the dataset. See `select_samples`.
+
+        :param selection: Selection parameters to sample instances (Selection | RandomSelection | MixSelection).
+        :return: Selected samples as Pandas DataFrame.
+        """
+        if isinstance(selection, MixSelection):
+            return self.select_mix_samples(selection)
+        if not isinstance(selection, (Selection, RandomSelection)):
+            raise ValueError('Invalid selection {} given. Selection must be of type [Selection | RandomSelection | '
+                             'MixSelection].'.format(selection))
+
+        sampler = ReservoirSampler(selection.nr_samples, self.rng)
+        for chunk in self.read_chunks():
+            if isinstance(selection, Selection):
+                chunk = chunk[chunk.label == selection.category]
+            sampler.update(chunk)
+        return sampler.result()
+
+    def select_mix_samples(self, selection: MixSelection) -> pd.DataFrame:
+        """
+        Selects samples of multiple categories in a single pass over the dataset, using a reservoir per category.
+        See `draw_mix_positions`.
+
+        :param selection: Selection parameters.
+        :return: Selected samples as Pandas DataFrame.
+        """
+        counts = {category: count for category, count in mix_counts(selection).items() if count > 0}
+        samplers = {category: ReservoirSampler(count, self.rng) for category, count in counts.items()}
+        for chunk in self.read_chunks():
+            for category, rows in chunk.groupby('label', sort=False, observed=True):
+                if category in samplers:
+                    samplers[category].update(rows)
+
+        reservoirs = [samplers[category].result() for category in counts]
+        if not reservoirs:
+            return pd.DataFrame()
+        pool = pd.concat(reservoirs)
+        offsets = np.cumsum([0] + [len(reservoir) for reservoir in reservoirs])
+        positions = {category: np.arange(offsets[idx], offsets[idx + 1]) for idx, category in enumerate(counts)}
+        return pool.iloc[draw_mix_positions(positions, counts, self.rng)]
+
+
+SampleSource = Union[SampleIndex, StreamSampler]
+
+
+def merge_predictions(samples: pd.DataFrame,
+                      predictions: List[float],
+                      threshold: float = DEFAULT_THRESHOLD) -> Tuple[pd.DataFrame, PredictionStats]:
+    """
+    Merges input samples with attack predictions. The input samples are not modified.
 
     :param samples: Pandas DataFrame containing input samples.
-    :param predictions: Attack predictions.
-    :return: Tuple of (merged DataFrame, Accuracy of predictions).
+    :param predictions: Attack predictions in the range of `[0, 1]`.
+    :param threshold: Predictions greater or equal to the threshold are considered attacks.
+    :return: Tuple of (merged DataFrame, `PredictionStats`).
     """
+    scores = np.asarray(predictions, dtype=np.float64)
+    if len(scores) != len(samples):
+        raise ValueError('Number of predictions [{}] does not match number of samples [{}].'
+                         .format(len(scores), len(samples)))
+
+    pred_is_attack = scores >= threshold
+    label_is_attack = (samples['label'] != BENIGN_LABEL).to_numpy()
+    is_correct = pred_is_attack == label_is_attack
+
+    df = samples.drop(columns=['label'])
+    df.insert(0, 'predicted_label', np.array([BENIGN_LABEL, ATTACK_LABEL], dtype=object)[pred_is_attack.astype(int)])
+    df.insert(0, 'label', samples['label'])
+    df.insert(0, 'is_correct', is_correct)
+    df['prediction_raw'] = scores
+
+    return df, prediction_stats(samples['label'], pred_is_attack)
+
+
+def prediction_stats(labels: pd.Series, pred_is_attack: np.ndarray) -> PredictionStats:
+    """
+    Computes accuracy, precision, recall and per-category confusion counts of binary attack predictions. Attacks are
+    considered the positive class.
+
+    :param labels: Network traffic categories of the samples.
+    :param pred_is_attack: Boolean array which is True if a sample has been predicted as an attack.
+    :return: PredictionStats.
+    """
+    codes, categories = pd.factorize(labels)
+    nr_categories = len(categories)
+
+    # counts[category, 0] = predicted benign, counts[category, 1] = predicted attack
+    counts = np.bincount(codes * 2 + pred_is_attack.astype(np.int64), minlength=nr_categories * 2) \
+        .reshape(nr_categories, 2)
+    category_is_attack = np.asarray(categories) != BENIGN_LABEL
+
+    true_pos = int(counts[category_is_attack, 1].sum())
+    false_neg = int(counts[category_is_attack, 0].sum())
+    false_pos = int(counts[~category_is_attack, 1].sum())
+    true_neg = int(counts[~category_is_attack, 0].sum())
+    total = true_pos + false_neg + false_pos + true_neg
 
-    def is_correct_prediction(row):
-        label_is_attack = row['label'] != 'Benign'
-        pred_is_attack = row['prediction_raw']
-        return label_is_attack == pred_is_attack
+    correct = np.where(category_is_attack, counts[:, 1], counts[:, 0])
+    category_counts = counts.sum(axis=1)
+    confusion = pd.DataFrame({'count': category_counts,
+                              'predicted_benign': counts[:, 0],
+                              'predicted_attack': counts[:, 1],
+                              'correct': correct,
+                              'accuracy': _percentage(correct, category_counts)},
+                             index=pd.Index(np.asarray(categories), name='label'))
 
-    df = samples
-    df['prediction_raw'] = predictions
-    df['predicted_label'] = df.prediction_raw.apply(lambda p: 'Benign' if p == 0 else 'Attack')
-    df['is_correct'] = df.apply(is_correct_prediction, axis=1)
-    acc = (len(df[df.is_correct]) / len(df)) * 100
+    return PredictionStats(accuracy=float(_percentage(true_pos + true_neg, total)),
+                           precision=float(_percentage(true_pos, true_pos + false_pos)),
+                           recall=float(_percentage(true_pos, true_pos + false_neg)),
+                           true_positives=true_pos,
+                           false_positives=false_pos,
+                           true_negatives=true_neg,
+                           false_negatives=false_neg,
+                           confusion=confusion.sort_values('count', ascending=False))
 
-    cols = ['is_correct', 'label', 'predicted_label']
-    cols = cols + df.columns.drop(cols).to_list()
 
-    return df[cols], acc
+def _percentage(numerator, denominator):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.nan_to_num(np.divide(numerator * 100.0, denominator))
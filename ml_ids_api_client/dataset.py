@@ -1,81 +1,353 @@
 """
 Utility functions to read datasets.
 """
+from typing import Optional, Iterator, List, Dict, TYPE_CHECKING
+import contextlib
+import hashlib
+import json
 import os
 import re
+import time
 import pandas as pd
-import boto3
-from botocore.exceptions import ClientError
-from botocore import UNSIGNED
-from botocore.config import Config
+from ml_ids_api_client.columnar import load_cached_dataset
 
+if TYPE_CHECKING:
+    from botocore.exceptions import ClientError
 
-def load_dataset(path: str, s3_region: str, s3_storage_path: str) -> pd.DataFrame:
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # type: ignore
+
+GB = 1024 ** 3
+
+
+def load_dataset(path: str,
+                 s3_region: str,
+                 s3_storage_path: str,
+                 cache_dir: Optional[str] = None,
+                 downcast: bool = False,
+                 dataset_cache: Optional['DatasetCache'] = None) -> pd.DataFrame:
     """
     Loads a dataset in `h5` format from the given path.
 
     :param path: Either a local file (`file://`) or a S3 bucket (`s3://`).
     :param s3_region: The AWS region if the path is an S3 bucket.
     :param s3_storage_path: The local storage path for the downloaded file from the S3 bucket.
+    :param cache_dir: Optional directory of the columnar cache. If given, the dataset is converted into a columnar
+                      format upon first load and memory-mapped on subsequent loads.
+    :param downcast: Whether numeric columns should be downcast when creating the columnar cache.
+    :param dataset_cache: Optional `DatasetCache` storing datasets downloaded from S3. If given, `s3_storage_path`
+                          is not used.
     :return: Dataset as a Pandas DataFrame.
     """
     if path.startswith(r'file://'):
-        return load_dataset_from_file(re.sub('file://', '', path))
+        return load_dataset_from_file(re.sub('file://', '', path), cache_dir, downcast)
+    if path.startswith(r's3://') and dataset_cache is not None:
+        return load_dataset_from_file(dataset_cache.fetch(path, s3_region), cache_dir, downcast)
     if path.startswith(r's3://'):
-        return load_dataset_from_s3(re.sub('s3://', '', path), s3_region, s3_storage_path)
+        return load_dataset_from_s3(re.sub('s3://', '', path), s3_region, s3_storage_path, cache_dir, downcast)
 
     raise ValueError('Invalid dataset URI provided! Supported protocols are ["file://", "s3://"]')
 
 
-def load_dataset_from_file(path: str) -> pd.DataFrame:
+def load_dataset_from_file(path: str, cache_dir: Optional[str] = None, downcast: bool = False) -> pd.DataFrame:
     """
     Loads a dataset in `h5` format from a local file path.
 
     :param path: Path to the local file.
+    :param cache_dir: Optional directory of the columnar cache.
+    :param downcast: Whether numeric columns should be downcast when creating the columnar cache.
     :return: Dataset as a Pandas DataFrame.
     """
+    if cache_dir is not None:
+        if not os.path.isfile(path):
+            raise FileNotFoundError('File ["{}"] not found.'.format(path))
+        return load_cached_dataset(path, cache_dir, downcast)
+
     dataset = pd.read_hdf(path)
     return dataset
 
 
-def load_dataset_from_s3(path: str, s3_region: str, s3_storage_path: str) -> pd.DataFrame:
+def load_dataset_from_s3(path: str,
+                         s3_region: str,
+                         s3_storage_path: str,
+                         cache_dir: Optional[str] = None,
+                         downcast: bool = False) -> pd.DataFrame:
     """
     Loads a dataset in `h5` format from an S3 bucket.
 
     :param path: Path of the file in the S3 bucket.
     :param s3_region: The AWS region if the path is an S3 bucket.
     :param s3_storage_path: The local storage path for the downloaded file from the S3 bucket.
+    :param cache_dir: Optional directory of the columnar cache.
+    :param downcast: Whether numeric columns should be downcast when creating the columnar cache.
     :return: Dataset as a Pandas DataFrame.
     """
-    if os.path.isfile(s3_storage_path):
-        print('Dataset is already present on path ["{}"].'.format(s3_storage_path))
-    else:
-        print('Downloading dataset from S3 location ["{}"] to ["{}"]'.format(path, s3_storage_path))
-        transfer_file_from_s3(path, s3_region, s3_storage_path)
+    download_dataset_from_s3(path, s3_region, s3_storage_path)
+    return load_dataset_from_file(s3_storage_path, cache_dir, downcast)
+
+
+def read_dataset_chunks(path: str, chunk_size: int, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Reads a dataset stored in `h5` table format in chunks of rows, without loading the whole dataset into memory.
+
+    :param path: Path to the local file. See `fetch_dataset` to obtain a local copy of a dataset stored on S3.
+    :param chunk_size: Number of rows per chunk.
+    :param columns: Optional list of columns to read. If absent, all columns are read.
+    :return: Iterator of Pandas DataFrames.
+    """
+    with pd.HDFStore(path, mode='r') as store:
+        key = store.keys()[0]
+        if not store.get_storer(key).is_table:
+            raise ValueError('Dataset ["{}"] cannot be read in chunks. Chunked reading requires the HDF5 table format.'
+                             .format(path))
+
+        for chunk in store.select(key, columns=columns, chunksize=chunk_size):
+            yield chunk
+
+
+def fetch_dataset(path: str,
+                  s3_region: str,
+                  s3_storage_path: str,
+                  dataset_cache: Optional['DatasetCache'] = None) -> str:
+    """
+    Returns the local path of a dataset. Datasets stored in an S3 bucket are downloaded if not already present.
+
+    :param path: Either a local file (`file://`) or a S3 bucket (`s3://`).
+    :param s3_region: The AWS region if the path is an S3 bucket.
+    :param s3_storage_path: The local storage path for the downloaded file from the S3 bucket.
+    :param dataset_cache: Optional `DatasetCache` storing datasets downloaded from S3.
+    :return: Path to the local file.
+    """
+    if path.startswith(r'file://'):
+        local_path = re.sub('file://', '', path)
+        if not os.path.isfile(local_path):
+            raise FileNotFoundError('File ["{}"] not found.'.format(local_path))
+        return local_path
+    if path.startswith(r's3://') and dataset_cache is not None:
+        return dataset_cache.fetch(path, s3_region)
+    if path.startswith(r's3://'):
+        download_dataset_from_s3(re.sub('s3://', '', path), s3_region, s3_storage_path)
+        return s3_storage_path
 
-    return pd.read_hdf(s3_storage_path)
+    raise ValueError('Invalid dataset URI provided! Supported protocols are ["file://", "s3://"]')
 
 
-def transfer_file_from_s3(path: str, s3_region: str, s3_storage_path: str) -> None:
+def download_dataset_from_s3(path: str, s3_region: str, s3_storage_path: str) -> None:
     """
-    Downloads a file from an S3 bucket and stores it as a local file.
+    Downloads a dataset from an S3 bucket unless an up-to-date copy is already present on the local storage path.
 
     :param path: Path of the file in the S3 bucket.
     :param s3_region: The AWS region if the path is an S3 bucket.
     :param s3_storage_path: The local storage path for the downloaded file from the S3 bucket.
     :return: None
     """
+    print('Synchronizing dataset from S3 location ["{}"] to ["{}"]'.format(path, s3_storage_path))
+    if transfer_file_from_s3(path, s3_region, s3_storage_path):
+        print('Dataset downloaded to path ["{}"].'.format(s3_storage_path))
+    else:
+        print('Dataset is already present on path ["{}"].'.format(s3_storage_path))
+
+
+def transfer_file_from_s3(path: str, s3_region: str, s3_storage_path: str) -> bool:
+    """
+    Downloads a file from an S3 bucket and stores it as a local file. The file is only downloaded if it is not present
+    on the local storage path or if the remote file has changed. Interrupted downloads are resumed.
+
+    If the S3 bucket cannot be reached, a previously downloaded file is used.
+
+    :param path: Path of the file in the S3 bucket.
+    :param s3_region: The AWS region if the path is an S3 bucket.
+    :param s3_storage_path: The local storage path for the downloaded file from the S3 bucket.
+    :return: True if the file has been downloaded, False if the local file is up-to-date.
+    """
+    # boto3 is imported on first access of S3, as importing it delays the start of the CLIs.
+    # pylint: disable=import-outside-toplevel
+    from botocore.exceptions import ClientError, BotoCoreError
+    from ml_ids_api_client.aws.s3_transfer import AwsS3Downloader, read_local_meta
+
     try:
-        storage_dir = os.path.sep.join(s3_storage_path.split(os.path.sep)[:-1])
-        os.makedirs(storage_dir, exist_ok=True)
-
-        bucket = path.split(os.path.sep)[0]
-        key = os.path.sep.join(path.split(os.path.sep)[1:])
-        s3_client = boto3.client('s3',
-                                 region_name=s3_region,
-                                 config=Config(signature_version=UNSIGNED))
-        s3_client.download_file(bucket, key, s3_storage_path)
+        storage_dir = os.path.dirname(s3_storage_path)
+        if storage_dir:
+            os.makedirs(storage_dir, exist_ok=True)
+
+        bucket, key = _split_s3_path(path)
+        return AwsS3Downloader(_create_s3_client(s3_region)).download(bucket, key, s3_storage_path)
     except ClientError as err:
-        if err.response['Error']['Code'] == '404':
-            raise FileNotFoundError('File ["s3://{}"] not found.'.format(path))
+        raise _s3_error(path, err)
+    except BotoCoreError as err:
+        if os.path.isfile(s3_storage_path) and read_local_meta(s3_storage_path) is not None:
+            print('S3 location ["s3://{}"] could not be reached, using previously downloaded file. Cause: {}.'
+                  .format(path, err))
+            return False
         raise IOError('File ["s3://{}"] could not be retrieved. Cause: {}.'.format(path, err))
+
+
+class DatasetCache:
+    """
+    Local cache of datasets downloaded from S3.
+
+    Datasets are stored content-addressed by their URI and the ETag of the remote object, hence several datasets and
+    versions can be kept side by side. Once the total size of the cached datasets exceeds `max_size`, the least
+    recently used datasets are evicted. The cache index is guarded by a file lock, hence the cache can be shared by
+    concurrent client processes.
+    """
+    INDEX_FILE = 'index.json'
+    LOCK_FILE = '.lock'
+
+    def __init__(self, cache_dir: str, max_size: int = 10 * GB, max_age: Optional[float] = 24 * 60 * 60) -> None:
+        """
+        :param cache_dir: Cache directory.
+        :param max_size: Maximum total size of the cached datasets in bytes. The most recently used dataset is never
+                         evicted, even if it exceeds the maximum size.
+        :param max_age: Time in seconds after which a cached dataset is checked against the remote object. Within
+                        this period cached datasets are used without contacting S3. None disables revalidation.
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.max_age = max_age
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def fetch(self, uri: str, s3_region: str) -> str:
+        """
+        Returns the local path of a dataset stored on S3, downloading it if it is not cached or has changed.
+
+        :param uri: S3 URI of the dataset (`s3://`).
+        :param s3_region: The AWS region of the S3 bucket.
+        :return: Path to the local file.
+        """
+        # pylint: disable=import-outside-toplevel
+        from botocore.exceptions import ClientError, BotoCoreError
+        from ml_ids_api_client.aws.s3_transfer import AwsS3Downloader
+
+        now = time.time()
+        with self._lock():
+            index = self._read_index()
+            entry = index.get(uri)
+            if entry is not None and self._is_fresh(entry, now):
+                entry['last_access'] = now
+                self._write_index(index)
+                return self._path(entry['file'])
+
+        path = re.sub('s3://', '', uri)
+        bucket, key = _split_s3_path(path)
+        downloader = AwsS3Downloader(_create_s3_client(s3_region))
+        try:
+            remote = downloader.head(bucket, key)
+            file_name = '{}.h5'.format(_hash('{}|{}'.format(uri, remote.etag)))
+
+            with self._lock(file_name + '.lock'):
+                if downloader.download(bucket, key, self._path(file_name), remote):
+                    print('Dataset ["{}"] downloaded to cache ["{}"].'.format(uri, self.cache_dir))
+        except ClientError as err:
+            raise _s3_error(path, err)
+        except BotoCoreError as err:
+            if entry is not None and os.path.isfile(self._path(entry['file'])):
+                print('S3 location ["{}"] could not be reached, using cached dataset. Cause: {}.'.format(uri, err))
+                return self._path(entry['file'])
+            raise IOError('File ["{}"] could not be retrieved. Cause: {}.'.format(uri, err))
+
+        with self._lock():
+            index = self._read_index()
+            previous = index.get(uri)
+            index[uri] = {'file': file_name,
+                          'etag': remote.etag,
+                          'size': remote.size,
+                          'last_access': now,
+                          'checked_at': now}
+            if previous is not None and previous['file'] != file_name:
+                self._remove_file(previous['file'])
+            self._evict(index, keep=uri)
+            self._write_index(index)
+
+        return self._path(file_name)
+
+    def entries(self) -> Dict[str, dict]:
+        """
+        Returns the cached datasets.
+
+        :return: Dict of dataset URI to cache entry.
+        """
+        with self._lock():
+            return self._read_index()
+
+    def _is_fresh(self, entry: dict, now: float) -> bool:
+        if not os.path.isfile(self._path(entry['file'])):
+            return False
+        return self.max_age is None or now - entry['checked_at'] < self.max_age
+
+    def _evict(self, index: Dict[str, dict], keep: str) -> None:
+        total_size = sum(entry['size'] for entry in index.values())
+        for uri, entry in sorted(index.items(), key=lambda item: item[1]['last_access']):
+            if total_size <= self.max_size:
+                break
+            if uri == keep:
+                continue
+            print('Evicting dataset ["{}"] from cache ["{}"].'.format(uri, self.cache_dir))
+            self._remove_file(entry['file'])
+            del index[uri]
+            total_size -= entry['size']
+
+    def _remove_file(self, file_name: str) -> None:
+        # The file lock is held while downloading, hence a file is not removed while it is being written. The index
+        # lock is always acquired before the file lock.
+        lock_name = file_name + '.lock'
+        with self._lock(lock_name):
+            for path in [self._path(file_name), self._path(file_name) + '.meta.json', self._path(lock_name)]:
+                if os.path.isfile(path):
+                    os.remove(path)
+
+    def _path(self, file_name: str) -> str:
+        return os.path.join(self.cache_dir, file_name)
+
+    def _read_index(self) -> Dict[str, dict]:
+        try:
+            with open(self._path(DatasetCache.INDEX_FILE), encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self, index: Dict[str, dict]) -> None:
+        tmp_path = self._path(DatasetCache.INDEX_FILE + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(index, file)
+        os.replace(tmp_path, self._path(DatasetCache.INDEX_FILE))
+
+    @contextlib.contextmanager
+    def _lock(self, name: str = LOCK_FILE):
+        with open(self._path(name), 'a', encoding='utf-8') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def _create_s3_client(s3_region: str):
+    # pylint: disable=import-outside-toplevel
+    import boto3
+    from botocore import UNSIGNED
+    from botocore.config import Config
+
+    return boto3.client('s3',
+                        region_name=s3_region,
+                        config=Config(signature_version=UNSIGNED))
+
+
+def _split_s3_path(path: str):
+    bucket = path.split(os.path.sep)[0]
+    key = os.path.sep.join(path.split(os.path.sep)[1:])
+    return bucket, key
+
+
+def _s3_error(path: str, err: 'ClientError') -> IOError:
+    if err.response['Error']['Code'] in ['404', 'NoSuchKey']:
+        return FileNotFoundError('File ["s3://{}"] not found.'.format(path))
+    return IOError('File ["s3://{}"] could not be retrieved. Cause: {}.'.format(path, err))
+
+
+def _hash(value: str) -> str:
+    return hashlib.sha1(value.encode('utf-8')).hexdigest()
@@ -1,34 +1,348 @@
 """
 HTTP utilities to invoke the `predict` endpoint of the ML-IDS API.
 """
-from typing import List
+from typing import Callable, List, Dict, Optional, Tuple, Union
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import gzip
+import logging
+import threading
+import time
 import urllib.parse
+import numpy as np
 import pandas as pd
 import requests
-from requests.exceptions import HTTPError
+from requests.adapters import HTTPAdapter
+from requests.exceptions import HTTPError, RequestException
+from urllib3.util.retry import Retry
+from ml_ids_api_client.http.prediction_cache import PredictionCache
+from ml_ids_api_client.http.serialization import encode_pandas_split, encode_msgpack, encode_arrow, \
+    is_msgpack_available, is_pyarrow_available
+from ml_ids_api_client.constants import WIRE_FORMATS
+from ml_ids_api_client.metrics import RequestMetrics
 
 API_REQUEST_HEADERS = {
     'Content-Type': 'application/json; format=pandas-split'
 }
 API_ENDPOINT_NAME = '/api/predictions'
 
+RETRY_STATUS_CODES = (500, 502, 503, 504)
 
-def call_predict_api(url: str, data: pd.DataFrame) -> List[float]:
+# Status codes of servers rejecting the format or the content encoding of the request body.
+REJECTED_FORMAT_STATUS_CODES = (400, 406, 415)
+
+GZIP_LEVEL = 6
+
+ConnectionStats = namedtuple('ConnectionStats', ['requests', 'new_connections', 'reused_connections'])
+
+
+class PredictClient:
+    """
+    Client for the `predict` endpoint of the ML-IDS API.
+
+    The client owns a pooled `requests.Session`, hence TCP/TLS connections are kept alive and reused across
+    consecutive requests. Requests failing with a connection error or a 5xx status code are retried with exponential
+    backoff.
+
+    Request bodies are encoded in the pandas-split JSON format by default. Alternatively network flows can be sent in
+    a binary format (MessagePack or Arrow IPC) and bodies can be compressed using gzip. If the API rejects a binary
+    format or a compressed body, the client falls back to uncompressed pandas-split for all further requests.
+    """
+
+    def __init__(self,
+                 url: str,
+                 pool_size: int = 10,
+                 keep_alive: bool = True,
+                 connect_timeout: float = 5.0,
+                 read_timeout: float = 60.0,
+                 max_retries: int = 3,
+                 backoff_factor: float = 0.3,
+                 use_orjson: bool = False,
+                 wire_format: str = 'PANDAS_SPLIT',
+                 compress: bool = False,
+                 metrics: Optional[RequestMetrics] = None,
+                 prediction_cache: Optional[PredictionCache] = None) -> None:
+        """
+        :param url: URL of the API.
+        :param pool_size: Maximum number of connections kept open to the API.
+        :param keep_alive: Whether connections should be kept alive and reused between requests.
+        :param connect_timeout: Timeout in seconds to establish a connection.
+        :param read_timeout: Timeout in seconds to wait for the server to send a response.
+        :param max_retries: Number of retries on connection errors and 5xx responses.
+        :param backoff_factor: Backoff factor applied between retries (`backoff_factor * 2 ** (retry - 1)` seconds).
+        :param use_orjson: Whether pandas-split request bodies should be encoded using `orjson`.
+        :param wire_format: Format of the request body (PANDAS_SPLIT | MSGPACK | ARROW). MSGPACK requires the `msgpack`
+                            package, ARROW requires the `pyarrow` package.
+        :param compress: Whether request bodies should be compressed using gzip.
+        :param metrics: Optional `RequestMetrics` recording timings, payload sizes and row counts of each request.
+        :param prediction_cache: Optional `PredictionCache`. If given, only the predictions of distinct network flows
+                                 which are not cached are requested from the API.
+        """
+        self.endpoint_url = urllib.parse.urljoin(url, API_ENDPOINT_NAME)
+        self.timeout = (connect_timeout, read_timeout)
+        wire_format = wire_format.upper()
+        if wire_format not in WIRE_FORMATS:
+            raise ValueError('Invalid wire format {} given. Format must be one of [{}].'
+                             .format(wire_format, ' | '.join(WIRE_FORMATS)))
+        if wire_format == 'MSGPACK' and not is_msgpack_available():
+            raise ImportError('msgpack is not installed. Install it via `pip install msgpack`.')
+        if wire_format == 'ARROW' and not is_pyarrow_available():
+            raise ImportError('pyarrow is not installed. Install it via `pip install pyarrow`.')
+
+        self.use_orjson = use_orjson
+        self.encoding = (wire_format, compress)
+        self.metrics = metrics
+        self.prediction_cache = prediction_cache
+
+        self._adapter = HTTPAdapter(pool_connections=1,
+                                    pool_maxsize=pool_size,
+                                    max_retries=_create_retry(max_retries, backoff_factor))
+        self.session = requests.Session()
+        self.session.mount('http://', self._adapter)
+        self.session.mount('https://', self._adapter)
+        self.session.headers.update(API_REQUEST_HEADERS)
+        self.session.headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+        self._encoding_lock = threading.Lock()
+
+    def predict(self, data: pd.DataFrame) -> List[float]:
+        """
+        Invokes the `predict` endpoint of the ML-IDS API.
+
+        :param data: Features to send in request body.
+        :return: List of predictions in the range of `[0, 1]`. Returns one prediction per input row in the same
+                 order.
+        """
+        if self.prediction_cache is not None:
+            return self._predict_cached(data, self.prediction_cache, self._send)
+        return self._send(data)
+
+    def predict_batched(self, data: pd.DataFrame, batch_size: int, concurrency: int = 1) -> List[float]:
+        """
+        Invokes the `predict` endpoint of the ML-IDS API, splitting the given data into chunks of `batch_size` rows
+        which are sent concurrently. At most `concurrency` requests are in-flight at any time.
+
+        :param data: Features to send.
+        :param batch_size: Maximum number of rows sent per request.
+        :param concurrency: Maximum number of concurrent requests.
+        :return: List of predictions in the range of `[0, 1]`. Returns one prediction per input row in the same
+                 order.
+        """
+        if batch_size < 1 or concurrency < 1:
+            raise ValueError('Batch size and concurrency must be greater 0.')
+
+        if self.prediction_cache is not None:
+            return self._predict_cached(data,
+                                        self.prediction_cache,
+                                        lambda unique: self._send_batched(unique, batch_size, concurrency))
+        return self._send_batched(data, batch_size, concurrency)
+
+    def connection_stats(self) -> ConnectionStats:
+        """
+        Returns the number of issued requests and the number of new and reused connections.
+
+        :return: ConnectionStats.
+        """
+        pools = self._adapter.poolmanager.pools
+        nr_requests = 0
+        nr_connections = 0
+
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                nr_requests += pool.num_requests
+                nr_connections += pool.num_connections
+
+        return ConnectionStats(requests=nr_requests,
+                               new_connections=nr_connections,
+                               reused_connections=max(nr_requests - nr_connections, 0))
+
+    def close(self) -> None:
+        """
+        Closes all pooled connections.
+
+        :return: None
+        """
+        self.session.close()
+
+    def _send(self, data: pd.DataFrame) -> List[float]:
+        start = time.perf_counter()
+        encoding = self.encoding
+        body, headers = self._encode(data, *encoding)
+        serialized = time.perf_counter()
+
+        try:
+            response = self.session.post(url=self.endpoint_url,
+                                         data=body,
+                                         headers=headers,
+                                         timeout=self.timeout)
+
+            if response.status_code in REJECTED_FORMAT_STATUS_CODES and self._fall_back(encoding, response):
+                response.close()
+                return self._send(data)
+            response.raise_for_status()
+            received = time.perf_counter()
+            predictions = response.json()
+        except HTTPError as http_err:
+            self._record_error()
+            raise IOError('{} - {}'.format(http_err, response.text))
+        except (RequestException, ValueError):
+            self._record_error()
+            raise
+
+        if self.metrics is not None:
+            self.metrics.record(serialization=serialized - start,
+                                network=received - serialized,
+                                parsing=time.perf_counter() - received,
+                                rows=len(data),
+                                request_bytes=len(body),
+                                response_bytes=len(response.content))
+        return predictions
+
+    def _send_batched(self, data: pd.DataFrame, batch_size: int, concurrency: int) -> List[float]:
+        if len(data) <= batch_size:
+            return self._send(data)
+
+        offsets = iter(range(0, len(data), batch_size))
+        results: Dict[int, List[float]] = {}
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            pending = {}
+
+            def submit_next() -> bool:
+                offset = next(offsets, None)
+                if offset is None:
+                    return False
+                future = executor.submit(self._send, data.iloc[offset:offset + batch_size])
+                pending[future] = offset
+                return True
+
+            while len(pending) < concurrency and submit_next():
+                pass
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[pending.pop(future)] = future.result()
+                    submit_next()
+
+        return [pred for offset in sorted(results) for pred in results[offset]]
+
+    def _predict_cached(self,
+                        data: pd.DataFrame,
+                        cache: PredictionCache,
+                        send: Callable[[pd.DataFrame], List[float]]) -> List[float]:
+        # Only the first occurrence of each distinct network flow which is not cached is sent. The predictions are
+        # mapped back to all rows via the inverse of the distinct keys.
+        keys = cache.hash_rows(data)
+        unique_keys, first_positions, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        predictions = cache.get_many(unique_keys)
+        missing = [idx for idx, pred in enumerate(predictions) if pred is None]
+        # Only rows whose key has been found in the cache are hits. Duplicates of missing rows are sent once, but are
+        # not counted as hits.
+        rows_per_key = np.bincount(inverse, minlength=len(unique_keys))
+        hits = int(rows_per_key.sum() - rows_per_key[missing].sum())
+
+        if missing:
+            fetched = send(data.iloc[first_positions[missing]])
+            cache.put_many(unique_keys[missing], fetched)
+            for idx, pred in zip(missing, fetched):
+                predictions[idx] = pred
+
+        if self.metrics is not None:
+            self.metrics.record_cache(lookups=len(data), hits=hits)
+        return [predictions[idx] for idx in inverse]
+
+    def _encode(self, data: pd.DataFrame, wire_format: str, compress: bool) -> Tuple[Union[str, bytes], dict]:
+        payload: Union[str, bytes]
+        if wire_format == 'MSGPACK':
+            payload = encode_msgpack(data)
+        elif wire_format == 'ARROW':
+            payload = encode_arrow(data)
+        else:
+            payload = encode_pandas_split(data, use_orjson=self.use_orjson)
+
+        headers = {'Content-Type': WIRE_FORMATS[wire_format]}
+        if not compress:
+            return payload, headers
+
+        compressed: bytes = gzip.compress(payload.encode('utf-8') if isinstance(payload, str) else payload,
+                                          compresslevel=GZIP_LEVEL)
+        headers['Content-Encoding'] = 'gzip'
+        return compressed, headers
+
+    def _fall_back(self, encoding: Tuple[str, bool], response: requests.Response) -> bool:
+        # Returns whether the request should be repeated in the pandas-split format. Concurrent requests may have been
+        # rejected in the meantime, hence the encoding is only switched if it has been used by the rejected request.
+        with self._encoding_lock:
+            if encoding == ('PANDAS_SPLIT', False):
+                return False
+            if self.encoding == encoding:
+                logging.warning('API rejected request body in format [%s] (compressed: %s) with status [%d]. '
+                                'Falling back to [PANDAS_SPLIT].', encoding[0], encoding[1], response.status_code)
+                self.encoding = ('PANDAS_SPLIT', False)
+            return True
+
+    def _record_error(self) -> None:
+        if self.metrics is not None:
+            self.metrics.record_error()
+
+    def __enter__(self) -> 'PredictClient':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+_DEFAULT_CLIENTS: Dict[str, PredictClient] = {}
+_DEFAULT_CLIENTS_LOCK = threading.Lock()
+
+
+def get_default_client(url: str) -> PredictClient:
+    """
+    Returns a shared `PredictClient` for the given API URL. The client is created upon first use.
+
+    :param url: URL of the API.
+    :return: PredictClient.
+    """
+    with _DEFAULT_CLIENTS_LOCK:
+        if url not in _DEFAULT_CLIENTS:
+            _DEFAULT_CLIENTS[url] = PredictClient(url)
+        return _DEFAULT_CLIENTS[url]
+
+
+def call_predict_api(url: str,
+                     data: pd.DataFrame,
+                     client: Optional[PredictClient] = None,
+                     batch_size: Optional[int] = None,
+                     concurrency: int = 1) -> List[float]:
     """
     Invokes the `predict` endpoint of the ML-IDS API.
 
     :param url: URL of the API.
     :param data: Features to send in request body.
+    :param client: Optional `PredictClient` to use. If absent, a shared client for the given URL is used.
+    :param batch_size: Optional maximum number of rows per request. If given, the data is split into chunks which
+                       are sent concurrently.
+    :param concurrency: Maximum number of concurrent requests if `batch_size` is given.
     :return: List of predictions in the range of `[0, 1]`. Returns one prediction per input row in the same order.
     """
-    json_body = data.drop(columns=['label']).to_json(orient='split', index=False)
+    if client is None:
+        client = get_default_client(url)
+    if batch_size is not None:
+        return client.predict_batched(data, batch_size, concurrency)
+    return client.predict(data)
+
 
+def _create_retry(max_retries: int, backoff_factor: float) -> Retry:
+    retry_args = dict(total=max_retries,
+                      connect=max_retries,
+                      read=max_retries,
+                      status=max_retries,
+                      status_forcelist=RETRY_STATUS_CODES,
+                      backoff_factor=backoff_factor,
+                      raise_on_status=False)
     try:
-        response = requests.post(url=urllib.parse.urljoin(url, API_ENDPOINT_NAME),
-                                 data=json_body,
-                                 headers=API_REQUEST_HEADERS)
-
-        response.raise_for_status()
-        return response.json()
-    except HTTPError as http_err:
-        raise IOError('{} - {}'.format(http_err, response.text))
+        return Retry(allowed_methods=frozenset(['POST']), **retry_args)
+    except TypeError:
+        # urllib3 < 1.26
+        return Retry(method_whitelist=frozenset(['POST']), **retry_args)
@@ -0,0 +1,148 @@
+"""
+Cache of predictions keyed by the feature values of network flows.
+"""
+from typing import List, Optional, Sequence
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+from ml_ids_api_client.http.serialization import LABEL_COLUMN
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache of predictions.
+
+    Predictions are keyed by a 64 bit hash of the feature values of a network flow, excluding the label, combined with
+    the feature column names. Identical network flows therefore share a single entry, independent of their category or
+    position in the dataset. Entries expire `ttl` seconds after they have been stored. Once `max_entries` entries are
+    stored the least recently used entries are evicted.
+
+    If a path is given, the cache is loaded from the path upon creation and written to it by `save`.
+    """
+
+    def __init__(self,
+                 max_entries: int = 1000000,
+                 ttl: Optional[float] = None,
+                 path: Optional[str] = None,
+                 exclude: Sequence[str] = (LABEL_COLUMN,)) -> None:
+        """
+        :param max_entries: Maximum number of cached predictions.
+        :param ttl: Time in seconds after which a cached prediction expires. Predictions never expire if absent.
+        :param path: Optional path of the file the cache is persisted to.
+        :param exclude: Columns which are not part of the cache key.
+        """
+        if max_entries < 1:
+            raise ValueError('max_entries must be greater 0.')
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.exclude = tuple(exclude)
+        self._entries: 'OrderedDict[int, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def hash_rows(self, data: pd.DataFrame) -> np.ndarray:
+        """
+        Returns the cache keys of the given network flows.
+
+        :param data: Pandas DataFrame containing network flows.
+        :return: NumPy array containing one 64 bit key per row.
+        """
+        features = data.drop(columns=[col for col in self.exclude if col in data.columns])
+        columns = hashlib.blake2b('\x1f'.join(map(str, features.columns)).encode('utf-8'), digest_size=8).digest()
+        keys = pd.util.hash_pandas_object(features, index=False).to_numpy()
+        return keys ^ np.frombuffer(columns, dtype=np.uint64)[0]
+
+    def get_many(self, keys: Sequence[int]) -> List[Optional[float]]:
+        """
+        Returns the cached predictions of the given keys.
+
+        :param keys: Cache keys.
+        :return: List containing the cached prediction or None per key.
+        """
+        now = time.time()
+        predictions: List[Optional[float]] = []
+
+        with self._lock:
+            for key in keys:
+                key = int(key)
+                entry = self._entries.get(key)
+                if entry is not None and self.ttl is not None and now - entry[1] >= self.ttl:
+                    del self._entries[key]
+                    entry = None
+                if entry is None:
+                    predictions.append(None)
+                else:
+                    self._entries.move_to_end(key)
+                    predictions.append(entry[0])
+        return predictions
+
+    def put_many(self, keys: Sequence[int], predictions: Sequence[float]) -> None:
+        """
+        Stores predictions.
+
+        :param keys: Cache keys.
+        :param predictions: Prediction per key.
+        :return: None
+        """
+        now = time.time()
+        with self._lock:
+            for key, prediction in zip(keys, predictions):
+                key = int(key)
+                self._entries[key] = (prediction, now)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def save(self, path: Optional[str] = None) -> None:
+        """
+        Writes the cache entries in least recently used order to a NumPy `.npz` file.
+
+        :param path: Output path. Defaults to the path given upon creation.
+        :return: None
+        """
+        path = path or self.path
+        if path is None:
+            raise ValueError('No path given to save the prediction cache to.')
+
+        with self._lock:
+            keys = np.fromiter(self._entries.keys(), dtype=np.uint64, count=len(self._entries))
+            values = np.array([entry for entry in self._entries.values()], dtype=np.float64).reshape(-1, 2)
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as file:
+            np.savez(file, keys=keys, predictions=values[:, 0], stored_at=values[:, 1])
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> None:
+        """
+        Adds the entries of a file written by `save`. Expired entries are skipped.
+
+        :param path: Input path.
+        :return: None
+        """
+        with np.load(path) as content:
+            keys, predictions, stored_at = content['keys'], content['predictions'], content['stored_at']
+
+        now = time.time()
+        with self._lock:
+            for key, prediction, timestamp in zip(keys.tolist(), predictions.tolist(), stored_at.tolist()):
+                if self.ttl is None or now - timestamp < self.ttl:
+                    self._entries[key] = (prediction, timestamp)
+                    self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
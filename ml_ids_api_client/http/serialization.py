@@ -0,0 +1,238 @@
+"""
+Encoders to serialize network flows into the request body format of the ML-IDS API.
+"""
+from typing import List, Sequence, Tuple
+import functools
+import numpy as np
+import pandas as pd
+
+try:
+    from pandas._libs.json import ujson_dumps as _ujson_dumps
+except ImportError:
+    from pandas._libs.json import dumps as _ujson_dumps
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# Precision used by `DataFrame.to_json` to format floating point numbers.
+DOUBLE_PRECISION = 10
+
+LABEL_COLUMN = 'label'
+
+# Type of MessagePack encoded columns which are not sent as NumPy buffers.
+OBJECT_DTYPE = 'object'
+
+
+def is_orjson_available() -> bool:
+    """
+    Returns whether the optional `orjson` library is installed.
+
+    :return: True if `orjson` can be used, else False.
+    """
+    return orjson is not None
+
+
+def is_msgpack_available() -> bool:
+    """
+    Returns whether the optional `msgpack` library is installed.
+
+    :return: True if `msgpack` can be used, else False.
+    """
+    return msgpack is not None
+
+
+def is_pyarrow_available() -> bool:
+    """
+    Returns whether the optional `pyarrow` library is installed.
+
+    :return: True if `pyarrow` can be used, else False.
+    """
+    return pa is not None
+
+
+def encode_pandas_split(data: pd.DataFrame,
+                        exclude: Sequence[str] = (LABEL_COLUMN,),
+                        use_orjson: bool = False) -> str:
+    """
+    Serializes a DataFrame into the pandas-split JSON format (`{"columns": [...], "data": [[...], ...]}`).
+
+    The output of the default encoder is identical to `data.drop(columns=exclude).to_json(orient='split',
+    index=False)`, but it is created from the underlying NumPy arrays of each column without copying the DataFrame.
+    If `use_orjson` is set, numbers are formatted by `orjson` using their shortest round-trip representation.
+
+    :param data: Pandas DataFrame.
+    :param exclude: Columns to exclude from the output.
+    :param use_orjson: Whether to use `orjson` to format the column values.
+    :return: JSON string in pandas-split format.
+    """
+    if use_orjson and orjson is None:
+        raise ImportError('orjson is not installed. Install it via `pip install orjson`.')
+
+    columns = tuple(col for col in data.columns if col not in exclude)
+
+    if not _is_supported(data, columns):
+        return data.drop(columns=[col for col in exclude if col in data.columns]).to_json(orient='split', index=False)
+
+    header = _encode_header(columns)
+    if len(data) == 0:
+        return header + ']}'
+
+    encode_column = _encode_column_orjson if use_orjson else _encode_column
+    tokens = [_encode_categorical_column(data[col].array, encode_column)
+              if isinstance(data[col].dtype, pd.CategoricalDtype) else encode_column(data[col].to_numpy())
+              for col in columns]
+    rows = ','.join(['[' + ','.join(row) + ']' for row in zip(*tokens)])
+
+    return header + rows + ']}'
+
+
+def encode_msgpack(data: pd.DataFrame, exclude: Sequence[str] = (LABEL_COLUMN,)) -> bytes:
+    """
+    Serializes a DataFrame column-wise into MessagePack (`{"columns": [...], "dtypes": [...], "data": [...]}`).
+
+    Numeric and boolean columns are sent as the little-endian buffer of the underlying NumPy array together with the
+    NumPy type string (e.g. `<f4`). All other columns are sent as lists of values with the type `object`. Infinite
+    values are sent as NaN, as the pandas-split format encodes both as `null`.
+
+    :param data: Pandas DataFrame.
+    :param exclude: Columns to exclude from the output.
+    :return: MessagePack encoded bytes.
+    """
+    if msgpack is None:
+        raise ImportError('msgpack is not installed. Install it via `pip install msgpack`.')
+
+    columns = [col for col in data.columns if col not in exclude]
+    dtypes = []
+    values = []
+    for col in columns:
+        column = data[col].to_numpy()
+        if column.dtype.kind in 'biuf':
+            column = np.ascontiguousarray(_replace_infinite(column), dtype=column.dtype.newbyteorder('<'))
+            dtypes.append(column.dtype.str)
+            values.append(column.tobytes())
+        else:
+            dtypes.append(OBJECT_DTYPE)
+            values.append(column.tolist())
+
+    return msgpack.packb({'columns': [str(col) for col in columns], 'dtypes': dtypes, 'data': values},
+                         use_bin_type=True, default=str)
+
+
+def decode_msgpack(body: bytes) -> pd.DataFrame:
+    """
+    Deserializes a DataFrame encoded by `encode_msgpack`.
+
+    :param body: MessagePack encoded bytes.
+    :return: Pandas DataFrame.
+    """
+    if msgpack is None:
+        raise ImportError('msgpack is not installed. Install it via `pip install msgpack`.')
+
+    content = msgpack.unpackb(body, raw=False)
+    columns = {col: np.frombuffer(values, dtype=dtype) if dtype != OBJECT_DTYPE else values
+               for col, dtype, values in zip(content['columns'], content['dtypes'], content['data'])}
+    return pd.DataFrame(columns, columns=content['columns'])
+
+
+def encode_arrow(data: pd.DataFrame, exclude: Sequence[str] = (LABEL_COLUMN,)) -> bytes:
+    """
+    Serializes a DataFrame into the Arrow IPC stream format. Requires the `pyarrow` package. Infinite values are sent
+    as missing values, as the pandas-split format encodes both as `null`.
+
+    :param data: Pandas DataFrame.
+    :param exclude: Columns to exclude from the output.
+    :return: Arrow IPC stream bytes.
+    """
+    if pa is None:
+        raise ImportError('pyarrow is not installed. Install it via `pip install pyarrow`.')
+
+    features = data.drop(columns=[col for col in exclude if col in data.columns])
+    infinite = [col for col in features.columns
+                if features[col].dtype.kind == 'f' and np.isinf(features[col].to_numpy()).any()]
+    if infinite:
+        features = features.copy()
+        features[infinite] = features[infinite].replace([np.inf, -np.inf], np.nan)
+
+    table = pa.Table.from_pandas(features, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def decode_arrow(body: bytes) -> pd.DataFrame:
+    """
+    Deserializes a DataFrame encoded by `encode_arrow`.
+
+    :param body: Arrow IPC stream bytes.
+    :return: Pandas DataFrame.
+    """
+    if pa is None:
+        raise ImportError('pyarrow is not installed. Install it via `pip install pyarrow`.')
+
+    return pa.ipc.open_stream(body).read_all().to_pandas()
+
+
+def _replace_infinite(values: np.ndarray) -> np.ndarray:
+    if values.dtype.kind != 'f' or not np.isinf(values).any():
+        return values
+    return np.where(np.isinf(values), np.nan, values).astype(values.dtype, copy=False)
+
+
+@functools.lru_cache(maxsize=32)
+def _encode_header(columns: Tuple[str, ...]) -> str:
+    return '{"columns":' + _ujson_dumps(list(columns)) + ',"data":['
+
+
+def _is_supported(data: pd.DataFrame, columns: Tuple[str, ...]) -> bool:
+    if not data.columns.is_unique or not all(isinstance(col, str) for col in columns):
+        return False
+    return all(_is_supported_dtype(dtype.categories.dtype if isinstance(dtype, pd.CategoricalDtype) else dtype)
+               for dtype in data.dtypes[list(columns)])
+
+
+def _is_supported_dtype(dtype) -> bool:
+    return isinstance(dtype, np.dtype) and dtype.kind in 'biufO'
+
+
+def _encode_column(values: np.ndarray) -> List[str]:
+    if values.dtype == object:
+        return _encode_object_column(values, _ujson_dumps)
+    return _ujson_dumps(values, double_precision=DOUBLE_PRECISION)[1:-1].split(',')
+
+
+def _encode_column_orjson(values: np.ndarray) -> List[str]:
+    if values.dtype == object:
+        return _encode_object_column(values, lambda value: orjson.dumps(value).decode('utf-8'))
+    try:
+        return orjson.dumps(np.ascontiguousarray(values), option=orjson.OPT_SERIALIZE_NUMPY) \
+                   .decode('utf-8')[1:-1].split(',')
+    except orjson.JSONEncodeError:
+        return _encode_column(values)
+
+
+def _encode_categorical_column(values: pd.Categorical, encode_column) -> List[str]:
+    # Categories are encoded once. Missing values are assigned the code -1, hence `null` is appended to the end of the
+    # encoded categories.
+    encoded = np.array(encode_column(values.categories.to_numpy()) + ['null'], dtype=object)
+    return encoded[values.codes].tolist()
+
+
+def _encode_object_column(values: np.ndarray, dumps) -> List[str]:
+    # Each distinct value is encoded once. Missing values are assigned the code -1, hence `null` is appended to the
+    # end of the encoded unique values.
+    codes, uniques = pd.factorize(values)
+    encoded = np.array([dumps(value) for value in uniques] + ['null'], dtype=object)
+    return encoded[codes].tolist()
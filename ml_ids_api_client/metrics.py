@@ -0,0 +1,371 @@
+"""
+Latency and throughput metrics of prediction requests.
+"""
+from typing import Dict, List, Optional, Tuple
+import json
+import math
+import threading
+import time
+
+PHASES = ['serialization', 'network', 'parsing', 'total']
+
+
+class LogHistogram:
+    """
+    Histogram with logarithmically sized buckets.
+
+    Bucket boundaries grow by the factor `growth`, hence recorded values are retained with a relative error of at most
+    `growth - 1` while memory usage only depends on the range of recorded values.
+    """
+
+    def __init__(self, min_value: float = 1e-6, growth: float = 1.05) -> None:
+        """
+        :param min_value: Smallest value distinguishable from 0. Smaller values are recorded in the first bucket.
+        :param growth: Ratio between the upper bounds of consecutive buckets.
+        """
+        if min_value <= 0 or growth <= 1:
+            raise ValueError('min_value must be greater 0 and growth must be greater 1.')
+
+        self.min_value = min_value
+        self.growth = growth
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._log_growth = math.log(growth)
+        self._lock = threading.Lock()
+
+    def record(self, value: float) -> None:
+        """
+        Records a value.
+
+        :param value: Value to record. Must not be negative.
+        :return: None
+        """
+        bucket = self._bucket(value)
+        with self._lock:
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+            self.count += 1
+            self.sum += value
+            self.max = max(self.max, value)
+
+    def percentile(self, quantile: float) -> float:
+        """
+        Returns the value at the given quantile.
+
+        :param quantile: Quantile in the range of `[0, 100]`.
+        :return: Upper bound of the bucket containing the quantile, capped at the maximum recorded value.
+                 0 if no values have been recorded.
+        """
+        with self._lock:
+            if self.count == 0:
+                return 0.0
+
+            rank = max(math.ceil(self.count * quantile / 100), 1)
+            seen = 0
+            for bucket in sorted(self.buckets):
+                seen += self.buckets[bucket]
+                if seen >= rank:
+                    return min(self.upper_bound(bucket), self.max)
+            return self.max
+
+    def upper_bound(self, bucket: int) -> float:
+        """
+        Returns the upper bound of the given bucket.
+
+        :param bucket: Bucket index.
+        :return: Upper bound.
+        """
+        return self.min_value * self.growth ** bucket
+
+    def merge(self, other: 'LogHistogram') -> None:
+        """
+        Adds the values recorded by another histogram with identical bucket boundaries.
+
+        :param other: LogHistogram.
+        :return: None
+        """
+        if (other.min_value, other.growth) != (self.min_value, self.growth):
+            raise ValueError('Histograms with different bucket boundaries cannot be merged.')
+
+        with self._lock:
+            for bucket, count in other.buckets.items():
+                self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+            self.count += other.count
+            self.sum += other.sum
+            self.max = max(self.max, other.max)
+
+    def cumulative_buckets(self) -> List[Tuple[float, int]]:
+        """
+        Returns the non-empty buckets as list of (upper bound, cumulative count).
+
+        :return: List of tuples sorted by upper bound.
+        """
+        with self._lock:
+            result = []
+            seen = 0
+            for bucket in sorted(self.buckets):
+                seen += self.buckets[bucket]
+                result.append((self.upper_bound(bucket), seen))
+            return result
+
+    def to_dict(self) -> dict:
+        """
+        Returns the histogram as JSON serializable dict.
+
+        :return: Dict.
+        """
+        return {
+            'min_value': self.min_value,
+            'growth': self.growth,
+            'count': self.count,
+            'sum': self.sum,
+            'max': self.max,
+            'buckets': {str(bucket): count for bucket, count in sorted(self.buckets.items())}
+        }
+
+    @staticmethod
+    def from_dict(values: dict) -> 'LogHistogram':
+        """
+        Creates a histogram from a dict created by `to_dict`.
+
+        :param values: Dict.
+        :return: LogHistogram.
+        """
+        histogram = LogHistogram(values['min_value'], values['growth'])
+        histogram.buckets = {int(bucket): count for bucket, count in values['buckets'].items()}
+        histogram.count = values['count']
+        histogram.sum = values['sum']
+        histogram.max = values['max']
+        return histogram
+
+    def _bucket(self, value: float) -> int:
+        if value <= self.min_value:
+            return 0
+        return math.ceil(math.log(value / self.min_value) / self._log_growth)
+
+
+class RequestMetrics:
+    """
+    Collects timings, payload sizes and row counts of prediction requests.
+
+    Timings are recorded in seconds per phase of a request: `serialization` of the request body, `network` round
+    trip and `parsing` of the response body, as well as the `total` duration.
+    """
+
+    def __init__(self) -> None:
+        self.durations = {phase: LogHistogram() for phase in PHASES}
+        self.request_bytes = LogHistogram(min_value=1.0)
+        self.requests = 0
+        self.errors = 0
+        self.rows = 0
+        self.response_bytes = 0
+        self.cache_lookups = 0
+        self.cache_hits = 0
+        self.first_start: Optional[float] = None
+        self.last_end: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def record(self,
+               serialization: float,
+               network: float,
+               parsing: float,
+               rows: int,
+               request_bytes: int,
+               response_bytes: int) -> None:
+        """
+        Records a successful request.
+
+        :param serialization: Time spent serializing the request body in seconds.
+        :param network: Time spent sending the request and receiving the response in seconds.
+        :param parsing: Time spent parsing the response body in seconds.
+        :param rows: Number of rows sent.
+        :param request_bytes: Size of the request body in bytes.
+        :param response_bytes: Size of the response body in bytes.
+        :return: None
+        """
+        total = serialization + network + parsing
+        self.durations['serialization'].record(serialization)
+        self.durations['network'].record(network)
+        self.durations['parsing'].record(parsing)
+        self.durations['total'].record(total)
+        self.request_bytes.record(request_bytes)
+
+        now = time.time()
+        with self._lock:
+            self.requests += 1
+            self.rows += rows
+            self.response_bytes += response_bytes
+            self._update_interval(now - total, now)
+
+    def record_error(self) -> None:
+        """
+        Records a failed request.
+
+        :return: None
+        """
+        with self._lock:
+            self.errors += 1
+
+    def record_cache(self, lookups: int, hits: int) -> None:
+        """
+        Records lookups of the prediction cache.
+
+        :param lookups: Number of rows looked up.
+        :param hits: Number of rows served without requesting a prediction from the API.
+        :return: None
+        """
+        with self._lock:
+            self.cache_lookups += lookups
+            self.cache_hits += hits
+
+    def cache_hit_rate(self) -> float:
+        """
+        Returns the share of rows served without requesting a prediction from the API.
+
+        :return: Hit rate. 0 if the prediction cache has not been used.
+        """
+        return self.cache_hits / self.cache_lookups if self.cache_lookups > 0 else 0.0
+
+    def elapsed(self) -> float:
+        """
+        Returns the wall-clock time between the start of the first and the end of the last recorded request.
+
+        :return: Elapsed time in seconds.
+        """
+        if self.first_start is None or self.last_end is None:
+            return 0.0
+        return self.last_end - self.first_start
+
+    def rows_per_second(self) -> float:
+        """
+        Returns the throughput in rows per second.
+
+        :return: Rows per second. 0 if no requests have been recorded.
+        """
+        elapsed = self.elapsed()
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+    def merge(self, other: 'RequestMetrics') -> None:
+        """
+        Adds the metrics collected by another instance.
+
+        :param other: RequestMetrics.
+        :return: None
+        """
+        for phase in PHASES:
+            self.durations[phase].merge(other.durations[phase])
+        self.request_bytes.merge(other.request_bytes)
+
+        with self._lock:
+            self.requests += other.requests
+            self.errors += other.errors
+            self.rows += other.rows
+            self.response_bytes += other.response_bytes
+            self.cache_lookups += other.cache_lookups
+            self.cache_hits += other.cache_hits
+            if other.first_start is not None and other.last_end is not None:
+                self._update_interval(other.first_start, other.last_end)
+
+    def to_dict(self) -> dict:
+        """
+        Returns the metrics as JSON serializable dict.
+
+        :return: Dict.
+        """
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'rows': self.rows,
+            'response_bytes': self.response_bytes,
+            'cache_lookups': self.cache_lookups,
+            'cache_hits': self.cache_hits,
+            'first_start': self.first_start,
+            'last_end': self.last_end,
+            'rows_per_second': self.rows_per_second(),
+            'durations': {phase: histogram.to_dict() for phase, histogram in self.durations.items()},
+            'request_bytes': self.request_bytes.to_dict()
+        }
+
+    @staticmethod
+    def from_dict(values: dict) -> 'RequestMetrics':
+        """
+        Creates metrics from a dict created by `to_dict`.
+
+        :param values: Dict.
+        :return: RequestMetrics.
+        """
+        metrics = RequestMetrics()
+        metrics.durations = {phase: LogHistogram.from_dict(histogram)
+                             for phase, histogram in values['durations'].items()}
+        metrics.request_bytes = LogHistogram.from_dict(values['request_bytes'])
+        metrics.requests = values['requests']
+        metrics.errors = values['errors']
+        metrics.rows = values['rows']
+        metrics.response_bytes = values['response_bytes']
+        metrics.cache_lookups = values.get('cache_lookups', 0)
+        metrics.cache_hits = values.get('cache_hits', 0)
+        metrics.first_start = values['first_start']
+        metrics.last_end = values['last_end']
+        return metrics
+
+    def to_prometheus(self) -> str:
+        """
+        Returns the metrics in the Prometheus text exposition format.
+
+        :return: Metrics as string.
+        """
+        lines = ['# TYPE ml_ids_client_request_duration_seconds histogram']
+        for phase, histogram in self.durations.items():
+            lines.extend(_prometheus_histogram('ml_ids_client_request_duration_seconds', histogram,
+                                               'phase="{}",'.format(phase)))
+
+        lines.append('# TYPE ml_ids_client_request_body_bytes histogram')
+        lines.extend(_prometheus_histogram('ml_ids_client_request_body_bytes', self.request_bytes, ''))
+
+        for name, value in [('ml_ids_client_requests_total', self.requests),
+                            ('ml_ids_client_request_errors_total', self.errors),
+                            ('ml_ids_client_rows_total', self.rows),
+                            ('ml_ids_client_response_body_bytes_total', self.response_bytes),
+                            ('ml_ids_client_cache_lookups_total', self.cache_lookups),
+                            ('ml_ids_client_cache_hits_total', self.cache_hits)]:
+            lines.append('# TYPE {} counter'.format(name))
+            lines.append('{} {}'.format(name, value))
+
+        return '\n'.join(lines) + '\n'
+
+    def _update_interval(self, start: float, end: float) -> None:
+        self.first_start = start if self.first_start is None else min(self.first_start, start)
+        self.last_end = end if self.last_end is None else max(self.last_end, end)
+
+
+def write_metrics(metrics: RequestMetrics, path: str, metrics_format: str) -> None:
+    """
+    Writes the metrics to a file.
+
+    :param metrics: RequestMetrics.
+    :param path: Output file path.
+    :param metrics_format: Output format (JSON | PROMETHEUS).
+    :return: None
+    """
+    if metrics_format.upper() == 'JSON':
+        content = json.dumps(metrics.to_dict(), indent=2)
+    elif metrics_format.upper() == 'PROMETHEUS':
+        content = metrics.to_prometheus()
+    else:
+        raise ValueError('Invalid metrics format {} given. Format must be one of [JSON | PROMETHEUS].'
+                         .format(metrics_format))
+
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(content)
+
+
+def _prometheus_histogram(name: str, histogram: LogHistogram, labels: str) -> List[str]:
+    lines = ['{}_bucket{{{}le="{:.6g}"}} {}'.format(name, labels, upper_bound, count)
+             for upper_bound, count in histogram.cumulative_buckets()]
+    lines.append('{}_bucket{{{}le="+Inf"}} {}'.format(name, labels, histogram.count))
+
+    labels = '{{{}}}'.format(labels.rstrip(',')) if labels else ''
+    lines.append('{}_sum{} {}'.format(name, labels, histogram.sum))
+    lines.append('{}_count{} {}'.format(name, labels, histogram.count))
+    return lines
@@ -0,0 +1,85 @@
+"""
+Open-loop load generator to submit prediction requests to the ML-IDS API at a constant rate.
+"""
+from typing import Callable, List, Optional
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+from ml_ids_api_client.http.http_client import PredictClient
+
+LoadTestResult = namedtuple('LoadTestResult', ['samples', 'predictions', 'send_lags', 'errors', 'elapsed'])
+
+
+def run_constant_rate(client: PredictClient,
+                      samples: pd.DataFrame,
+                      rate: float,
+                      duration: float,
+                      concurrency: int,
+                      on_result: Optional[Callable[[int, float], None]] = None) -> LoadTestResult:
+    """
+    Submits one prediction request per network flow at a fixed rate for the given duration. Network flows are taken
+    from `samples` in a round-robin fashion.
+
+    Requests are scheduled on a fixed clock (open-loop), hence a slow response does not delay subsequent requests.
+    The lag between the scheduled and the actual send time of each request is recorded.
+
+    :param client: Client used to submit the prediction requests.
+    :param samples: Network flows to submit.
+    :param rate: Number of requests per second.
+    :param duration: Duration of the load test in seconds.
+    :param concurrency: Maximum number of concurrent requests.
+    :param on_result: Optional function called with the position of the network flow in `samples` and the prediction
+                      of each successful request as soon as its response has been received.
+    :return: LoadTestResult containing the submitted network flows, predictions, send lags in seconds, number of
+             failed requests and elapsed time in seconds. Failed requests are excluded from samples and predictions.
+    """
+    if rate <= 0 or duration <= 0:
+        raise ValueError('Rate and duration must be greater 0.')
+    if len(samples) == 0:
+        raise ValueError('No network flows to submit.')
+
+    nr_requests = int(rate * duration)
+    interval = 1.0 / rate
+    predictions: List[Optional[float]] = [None] * nr_requests
+    send_lags = np.zeros(nr_requests)
+    errors = 0
+    errors_lock = threading.Lock()
+
+    def send(idx: int, scheduled: float) -> None:
+        nonlocal errors
+        send_lags[idx] = time.perf_counter() - scheduled
+        pos = idx % len(samples)
+        try:
+            prediction = client.predict(samples.iloc[pos:pos + 1])[0]
+        except (IOError, ValueError) as err:
+            logging.warning('Prediction request [%d] failed: %s', idx, err)
+            with errors_lock:
+                errors += 1
+            return
+        predictions[idx] = prediction
+        if on_result is not None:
+            on_result(pos, prediction)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for idx in range(nr_requests):
+            scheduled = start + idx * interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(send, idx, scheduled)
+    elapsed = time.perf_counter() - start
+
+    succeeded = [idx for idx, pred in enumerate(predictions) if pred is not None]
+    positions = np.array(succeeded, dtype=np.int64) % len(samples)
+
+    return LoadTestResult(samples=samples.iloc[positions].copy(),
+                          predictions=[predictions[idx] for idx in succeeded],
+                          send_lags=send_lags,
+                          errors=errors,
+                          elapsed=elapsed)
@@ -1,13 +1,22 @@
 """
 REST Client CLI to submit prediction requests to the ML-IDS API (https://github.com/cstub/ml-ids-api)
 """
+from typing import Optional, TYPE_CHECKING
 from time import sleep
+import functools
+import os
+import sys
 import click
 
-from ml_ids_api_client.dataset import load_dataset
-from ml_ids_api_client.data import get_categories, select_samples, merge_predictions
-from ml_ids_api_client.user_interaction import prompt_for_selection, show_prediction_results
-from ml_ids_api_client.http.http_client import call_predict_api
+from ml_ids_api_client.constants import DEFAULT_THRESHOLD, DISPLAY_MODES, WIRE_FORMATS
+
+# Modules depending on pandas, boto3 and requests are imported once a command is run, hence `--help` returns
+# immediately.
+if TYPE_CHECKING:
+    import pandas as pd
+    from ml_ids_api_client.data import SampleSource
+    from ml_ids_api_client.http.http_client import PredictClient
+    from ml_ids_api_client.user_interaction import DisplayOptions
 
 
 @click.command()
@@ -19,15 +28,231 @@ from ml_ids_api_client.http.http_client import call_predict_api
               help='Region of the S3 Bucket.')
 @click.option('--s3-local-storage-path', type=click.Path(), default='./output/s3_dataset.h5',
               help='Local path used to store the downloaded dataset from S3.')
+@click.option('--dataset-cache-dir', type=click.Path(file_okay=False), default=None,
+              help='Directory of a shared cache of datasets downloaded from S3. If given, several datasets are cached '
+                   'side by side and the S3 local storage path is not used.')
+@click.option('--dataset-cache-max-size', type=click.FloatRange(0, None), default=10.0,
+              help='Maximum size of the dataset cache in GB. Least recently used datasets are evicted.')
+@click.option('--dataset-cache-max-age', type=click.FloatRange(0, None), default=24.0,
+              help='Time in hours after which a cached dataset is checked for changes on S3.')
+@click.option('--columnar-cache', type=bool, default=False,
+              help='Whether the dataset should be converted into a memory-mapped columnar cache upon first load. '
+                   'The cache is stored in the directory `cache` next to the S3 local storage path.')
+@click.option('--downcast', type=bool, default=False,
+              help='Whether numeric columns should be downcast to reduce memory usage when creating the columnar '
+                   'cache.')
+@click.option('--streaming', type=bool, default=False,
+              help='Whether the dataset should be read in chunks instead of being loaded into memory. Network flows '
+                   'are selected in a single pass over the dataset per selection. Requires the HDF5 table format. '
+                   'In constant rate mode --nr-samples is required, hence memory usage is bounded by the selection.')
+@click.option('--chunk-size', type=click.IntRange(1, None), default=100000,
+              help='Number of rows read per chunk in streaming mode.')
 @click.option('--display-overflow', type=click.Choice(['WRAP', 'NOWRAP'], case_sensitive=False),
               default='WRAP', help='Defines the overflow behaviour if the output exceeds the window width.')
-def run_client(dataset_uri, api_url, s3_region, s3_local_storage_path, display_overflow):
+@click.option('--display-mode', type=click.Choice(DISPLAY_MODES, case_sensitive=False), default='FULL',
+              help='Defines how prediction results are displayed. FULL prints all rows, PAGED prints pages of rows '
+                   'via the system pager, TRUNCATED prints the first and last rows and SUMMARY prints the prediction '
+                   'statistics only.')
+@click.option('--page-size', type=click.IntRange(1, None), default=50,
+              help='Number of rows per page in display mode PAGED.')
+@click.option('--display-rows', type=click.IntRange(1, None), default=20,
+              help='Maximum number of rows printed in display mode TRUNCATED.')
+@click.option('--pool-size', type=click.IntRange(1, None), default=10,
+              help='Maximum number of pooled connections to the prediction API server.')
+@click.option('--connect-timeout', type=float, default=5.0,
+              help='Timeout in seconds to establish a connection to the prediction API server.')
+@click.option('--read-timeout', type=float, default=60.0,
+              help='Timeout in seconds to wait for a response of the prediction API server.')
+@click.option('--max-retries', type=click.IntRange(0, None), default=3,
+              help='Number of retries on connection errors and server errors (5xx).')
+@click.option('--batch-size', type=click.IntRange(1, None), default=None,
+              help='Maximum number of network flows per prediction request. Larger selections are split into '
+                   'multiple requests which are sent concurrently.')
+@click.option('--concurrency', type=click.IntRange(1, None), default=4,
+              help='Maximum number of concurrent prediction requests in batch and constant rate mode.')
+@click.option('--json-encoder', type=click.Choice(['PANDAS', 'ORJSON'], case_sensitive=False), default='PANDAS',
+              help='JSON encoder used to serialize network flows. ORJSON requires the `orjson` package.')
+@click.option('--wire-format', type=click.Choice(list(WIRE_FORMATS), case_sensitive=False), default='PANDAS_SPLIT',
+              help='Format of the request body. MSGPACK and ARROW send the feature columns in binary form and require '
+                   'the `msgpack` or `pyarrow` package. Falls back to PANDAS_SPLIT if rejected by the server.')
+@click.option('--compress', type=bool, default=False,
+              help='Whether request bodies should be compressed using gzip.')
+@click.option('--prediction-cache', type=bool, default=False,
+              help='Whether predictions should be cached by the feature values of network flows. Only distinct '
+                   'network flows whose prediction is not cached are sent to the prediction API server.')
+@click.option('--prediction-cache-size', type=click.IntRange(1, None), default=1000000,
+              help='Maximum number of cached predictions.')
+@click.option('--prediction-cache-ttl', type=click.FloatRange(0, None, min_open=True), default=None,
+              help='Time in seconds after which cached predictions expire. Defaults to no expiry.')
+@click.option('--prediction-cache-path', type=click.Path(dir_okay=False), default=None,
+              help='File the prediction cache is loaded from upon start and saved to upon exit.')
+@click.option('--rate', type=click.FloatRange(0, None, min_open=True), default=None,
+              help='Runs the client non-interactively, sending prediction requests containing a single network flow '
+                   'at the given constant rate (requests per second) for the given duration.')
+@click.option('--processes', type=click.IntRange(1, None), default=1,
+              help='Number of processes sending prediction requests in constant rate mode. The selected network flows '
+                   'are shared via memory-mapping and sharded across the processes, each sending at an equal share '
+                   'of the rate with the given concurrency.')
+@click.option('--duration', type=click.FloatRange(0, None, min_open=True), default=60.0,
+              help='Duration of the constant rate mode in seconds.')
+@click.option('--category', type=str, default=None,
+              help='Network traffic category used in constant rate mode. Defaults to all categories.')
+@click.option('--nr-samples', type=click.IntRange(1, None), default=None,
+              help='Number of network flows selected in constant rate mode. Defaults to all network flows. '
+                   'Required by --streaming.')
+@click.option('--mix-profile', type=click.Path(exists=True, dir_okay=False), default=None,
+              help='JSON or YAML profile defining the share of each network traffic category in constant rate mode. '
+                   'Cannot be combined with --category.')
+@click.option('--seed', type=int, default=None,
+              help='Seed of the random number generator used to select network flows.')
+@click.option('--threshold', type=click.FloatRange(0, 1), default=DEFAULT_THRESHOLD,
+              help='Predictions greater or equal to the threshold are considered attacks.')
+@click.option('--metrics-out', type=click.Path(dir_okay=False), default=None,
+              help='File the request latency histograms are written to upon exit.')
+@click.option('--metrics-format', type=click.Choice(['JSON', 'PROMETHEUS'], case_sensitive=False), default='JSON',
+              help='Format of the metrics file.')
+def run_client(dataset_uri,
+               api_url,
+               s3_region,
+               s3_local_storage_path,
+               dataset_cache_dir,
+               dataset_cache_max_size,
+               dataset_cache_max_age,
+               columnar_cache,
+               downcast,
+               streaming,
+               chunk_size,
+               display_overflow,
+               display_mode,
+               page_size,
+               display_rows,
+               pool_size,
+               connect_timeout,
+               read_timeout,
+               max_retries,
+               batch_size,
+               concurrency,
+               json_encoder,
+               wire_format,
+               compress,
+               prediction_cache,
+               prediction_cache_size,
+               prediction_cache_ttl,
+               prediction_cache_path,
+               rate,
+               processes,
+               duration,
+               category,
+               nr_samples,
+               mix_profile,
+               seed,
+               threshold,
+               metrics_out,
+               metrics_format):
     """
     Runs the CLI.
     """
-    click.echo('Loading dataset...')
-    dataset = load_dataset(dataset_uri, s3_region, s3_local_storage_path)
-    categories = get_categories(dataset)
+    # pylint: disable=import-outside-toplevel
+    from ml_ids_api_client.dataset import load_dataset, fetch_dataset, read_dataset_chunks, DatasetCache, GB
+    from ml_ids_api_client.data import merge_predictions, SampleIndex, StreamSampler, SampleSource
+    from ml_ids_api_client.user_interaction import show_prediction_results, show_load_test_summary, DisplayOptions
+    from ml_ids_api_client.http.http_client import PredictClient
+    from ml_ids_api_client.http.prediction_cache import PredictionCache
+    from ml_ids_api_client.producer.load_generator import run_constant_rate
+    from ml_ids_api_client.producer.sharded_replay import run_sharded_constant_rate
+    from ml_ids_api_client.metrics import RequestMetrics, write_metrics
+
+    if category is not None and mix_profile is not None:
+        raise click.BadParameter('--category and --mix-profile are mutually exclusive.', param_hint='--mix-profile')
+    if processes > 1 and rate is None:
+        raise click.BadParameter('--processes requires --rate.', param_hint='--processes')
+    if processes > 1 and prediction_cache:
+        raise click.BadParameter('--prediction-cache cannot be combined with --processes.', param_hint='--processes')
+    if streaming and rate is not None and nr_samples is None:
+        raise click.BadParameter('Required by --streaming in constant rate mode.', param_hint='--nr-samples')
+
+    dataset_cache = None
+    if dataset_cache_dir is not None:
+        dataset_cache = DatasetCache(dataset_cache_dir,
+                                     max_size=int(dataset_cache_max_size * GB),
+                                     max_age=dataset_cache_max_age * 60 * 60)
+
+    if streaming:
+        local_path = fetch_dataset(dataset_uri, s3_region, s3_local_storage_path, dataset_cache)
+        sampler: SampleSource = StreamSampler(functools.partial(read_dataset_chunks, local_path, chunk_size), seed)
+    else:
+        click.echo('Loading dataset...')
+        cache_dir = os.path.join(os.path.dirname(s3_local_storage_path), 'cache') if columnar_cache else None
+        dataset = load_dataset(dataset_uri, s3_region, s3_local_storage_path, cache_dir, downcast, dataset_cache)
+        sampler = SampleIndex(dataset, seed)
+    display_options = DisplayOptions(mode=display_mode, page_size=page_size, max_rows=display_rows)
+    cache = None
+    if prediction_cache:
+        cache = PredictionCache(prediction_cache_size, prediction_cache_ttl, prediction_cache_path)
+    metrics = RequestMetrics()
+    client_options = dict(url=api_url,
+                          pool_size=max(pool_size, concurrency),
+                          connect_timeout=connect_timeout,
+                          read_timeout=read_timeout,
+                          max_retries=max_retries,
+                          use_orjson=json_encoder.upper() == 'ORJSON',
+                          wire_format=wire_format,
+                          compress=compress)
+    client = PredictClient(metrics=metrics, prediction_cache=cache, **client_options)
+
+    if rate is None:
+        run_interactive(client, sampler, batch_size, concurrency, threshold, display_overflow, display_options)
+    else:
+        samples = select_replay_samples(sampler, category, nr_samples, mix_profile)
+        if len(samples) == 0:
+            raise click.BadParameter('No network flows of category [{}] found.'.format(category),
+                                     param_hint='--category')
+        if processes > 1:
+            result = run_sharded_constant_rate(client_options, samples, rate, duration, concurrency, processes, metrics)
+        else:
+            result = run_constant_rate(client, samples, rate, duration, concurrency)
+        show_load_test_summary(result.send_lags, result.errors, result.elapsed)
+        results, stats = merge_predictions(result.samples, result.predictions, threshold)
+        show_prediction_results(results, stats, display_overflow, metrics, display_options)
+
+    client.close()
+
+    if cache is not None and prediction_cache_path is not None:
+        cache.save()
+
+    if metrics_out is not None:
+        write_metrics(metrics, metrics_out, metrics_format)
+
+
+def run_interactive(client: 'PredictClient',
+                    sampler: 'SampleSource',
+                    batch_size: Optional[int],
+                    concurrency: int,
+                    threshold: float,
+                    display_overflow: str,
+                    display_options: Optional['DisplayOptions'] = None) -> None:
+    """
+    Prompts the user for network flow selections and submits the selected network flows until the user quits.
+    Request metrics of each selection are displayed separately and added to the metrics of the client.
+
+    :param client: Client used to submit the prediction requests.
+    :param sampler: Sampler used to select network flows from the dataset.
+    :param batch_size: Optional maximum number of network flows per prediction request.
+    :param concurrency: Maximum number of concurrent prediction requests if a batch size is given.
+    :param threshold: Predictions greater or equal to the threshold are considered attacks.
+    :param display_overflow: Overflow behaviour if the output exceeds the window width.
+    :param display_options: Defines how the prediction results are displayed. Defaults to displaying all rows.
+    :return: None
+    """
+    # pylint: disable=import-outside-toplevel
+    from ml_ids_api_client.data import merge_predictions
+    from ml_ids_api_client.metrics import RequestMetrics
+    from ml_ids_api_client.user_interaction import prompt_for_selection, show_prediction_results, \
+        DEFAULT_DISPLAY_OPTIONS
+
+    display_options = display_options or DEFAULT_DISPLAY_OPTIONS
+    categories = sampler.get_categories()
+    session_metrics = client.metrics
 
     while True:
         selection = prompt_for_selection(categories)
@@ -35,22 +260,58 @@ def run_client(dataset_uri, api_url, s3_region, s3_local_storage_path, display_o
         if selection is None:
             break
 
-        samples = select_samples(dataset, selection)
+        samples = sampler.select_samples(selection)
+        client.metrics = RequestMetrics()
 
-        if selection.delay is None:
-            predictions = call_predict_api(api_url, samples)
+        if selection.delay is None and batch_size is not None:
+            predictions = client.predict_batched(samples, batch_size, concurrency)
+        elif selection.delay is None:
+            predictions = client.predict(samples)
         else:
             predictions = []
             for i in range(0, selection.nr_samples):
                 sample = samples.iloc[i:i + 1].copy()
                 click.echo('Requesting prediction [{}] for label [{}]...'
                            .format(i + 1, sample.at[sample.index.to_list()[0], 'label']))
-                pred = call_predict_api(api_url, sample)
+                pred = client.predict(sample)
                 predictions.extend(pred)
                 sleep(selection.delay / 1000)
 
-        results, acc = merge_predictions(samples, predictions)
-        show_prediction_results(results, acc, display_overflow)
+        results, stats = merge_predictions(samples, predictions, threshold)
+        show_prediction_results(results, stats, display_overflow, client.metrics, display_options)
+
+        if session_metrics is not None:
+            session_metrics.merge(client.metrics)
+
+    client.metrics = session_metrics
+
+
+def select_replay_samples(sampler: 'SampleSource',
+                          category: Optional[str],
+                          nr_samples: Optional[int],
+                          mix_profile: Optional[str] = None) -> 'pd.DataFrame':
+    """
+    Selects the network flows used in the non-interactive modes.
+
+    :param sampler: Sampler used to select network flows from the dataset.
+    :param category: Optional network traffic category. If absent, network flows of all categories are selected.
+    :param nr_samples: Optional number of network flows. If absent, all matching network flows are selected.
+    :param mix_profile: Optional path of a profile defining the share of each category. See `load_mix_profile`.
+    :return: Selected network flows as Pandas DataFrame.
+    """
+    # pylint: disable=import-outside-toplevel
+    from ml_ids_api_client.data import Selection, RandomSelection, load_mix_profile
+
+    if mix_profile is not None:
+        # Invalid profiles and categories of the profile which are not present in the dataset are reported as usage
+        # errors.
+        try:
+            return sampler.select_samples(load_mix_profile(mix_profile, nr_samples))
+        except ValueError as err:
+            raise click.BadParameter(str(err), param_hint='--mix-profile')
+    if category is not None:
+        return sampler.select_samples(Selection(category, nr_samples or sys.maxsize, None))
+    return sampler.select_samples(RandomSelection(nr_samples or sys.maxsize, None))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,205 @@
+"""
+Constant rate load generator distributing the prediction requests over several processes.
+"""
+from typing import List, Optional, Set
+import logging
+import multiprocessing
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+import traceback
+import numpy as np
+import pandas as pd
+
+from ml_ids_api_client.columnar import write_columnar, read_columnar
+from ml_ids_api_client.http.http_client import PredictClient
+from ml_ids_api_client.metrics import RequestMetrics
+from ml_ids_api_client.producer.load_generator import run_constant_rate, LoadTestResult
+
+# RAM-backed directory the network flows are shared through, if available and large enough.
+SHARED_MEMORY_DIR = '/dev/shm'
+# Number of predictions a worker buffers before sending them to the parent process.
+RESULT_CHUNK_SIZE = 1000
+# Maximum time in seconds a worker waits for the other workers to load their shard.
+START_TIMEOUT = 120.0
+
+MSG_RESULTS = 'results'
+MSG_DONE = 'done'
+MSG_FAILED = 'failed'
+
+
+def run_sharded_constant_rate(client_options: dict,
+                              samples: pd.DataFrame,
+                              rate: float,
+                              duration: float,
+                              concurrency: int,
+                              processes: int,
+                              metrics: Optional[RequestMetrics] = None) -> LoadTestResult:
+    """
+    Submits one prediction request per network flow at a fixed rate for the given duration using several worker
+    processes, hence serialization and response parsing are not limited by a single interpreter lock.
+
+    The network flows are written to a columnar directory, which each worker memory-maps instead of receiving a copy.
+    The directory is created in shared memory if it has enough free space, else in the default temporary directory.
+    The network flows are sharded round-robin over the workers. Each worker creates its own `PredictClient` and runs
+    `run_constant_rate` on its shard at `rate / processes`. Schedules of the workers are offset against each other,
+    hence the combined requests are evenly spaced. Predictions are streamed to the parent process in chunks while the
+    load test runs, send lags and request metrics once a worker has finished.
+
+    :param client_options: Keyword arguments of the `PredictClient` created by each worker, excluding metrics.
+    :param samples: Network flows to submit.
+    :param rate: Total number of requests per second.
+    :param duration: Duration of the load test in seconds.
+    :param concurrency: Maximum number of concurrent requests per worker.
+    :param processes: Number of worker processes.
+    :param metrics: Optional metrics the request metrics of all workers are merged into.
+    :return: LoadTestResult of all workers. Samples and predictions are ordered by the position of the network flows
+             in `samples`.
+    """
+    if rate <= 0 or duration <= 0:
+        raise ValueError('Rate and duration must be greater 0.')
+    if processes < 1:
+        raise ValueError('processes must be greater 0.')
+    if len(samples) < processes:
+        raise ValueError('At least one network flow per process is required.')
+
+    context = multiprocessing.get_context('spawn')
+
+    with tempfile.TemporaryDirectory(dir=_shared_dir(samples), prefix='ml-ids-replay-') as tmp_dir:
+        data_dir = os.path.join(tmp_dir, 'samples')
+        write_columnar(samples, data_dir)
+
+        results = context.Queue()
+        start_barrier = context.Barrier(processes)
+        workers: List[multiprocessing.process.BaseProcess] = [context.Process(target=_run_worker,
+                                   args=(worker_id, processes, data_dir, client_options, rate, duration, concurrency,
+                                         start_barrier, results),
+                                   name='replay-worker-{}'.format(worker_id),
+                                   daemon=True)
+                   for worker_id in range(processes)]
+        for worker in workers:
+            worker.start()
+
+        try:
+            positions, predictions, send_lags, errors, elapsed = _collect_results(workers, results, metrics)
+        finally:
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+                worker.join()
+
+    order = np.argsort(positions, kind='stable')
+    positions = positions[order]
+    return LoadTestResult(samples=samples.iloc[positions].copy(),
+                          predictions=predictions[order].tolist(),
+                          send_lags=send_lags,
+                          errors=errors,
+                          elapsed=elapsed)
+
+
+def _shared_dir(samples: pd.DataFrame) -> Optional[str]:
+    # Containers limit shared memory to 64MB by default. The in-memory size of the network flows is an upper bound of
+    # their columnar size, since object columns are stored as categorical codes.
+    if not os.path.isdir(SHARED_MEMORY_DIR):
+        return None
+    required = int(samples.memory_usage(index=False, deep=True).sum())
+    if shutil.disk_usage(SHARED_MEMORY_DIR).free < required:
+        logging.info('Not enough shared memory for [%d] bytes of network flows, using [%s] instead.',
+                     required, tempfile.gettempdir())
+        return None
+    return SHARED_MEMORY_DIR
+
+
+def _collect_results(workers: List[multiprocessing.process.BaseProcess],
+                     results: multiprocessing.Queue,
+                     metrics: Optional[RequestMetrics]) -> tuple:
+    positions: List[np.ndarray] = []
+    predictions: List[np.ndarray] = []
+    send_lags: List[np.ndarray] = []
+    errors = 0
+    elapsed = 0.0
+    finished: Set[int] = set()
+
+    while len(finished) < len(workers):
+        try:
+            message = results.get(timeout=1.0)
+        except queue.Empty:
+            # A worker terminated by a signal cannot report its failure.
+            for worker_id, worker in enumerate(workers):
+                if worker_id not in finished and worker.exitcode is not None:
+                    raise RuntimeError('Replay worker [{}] exited with code [{}].'.format(worker_id, worker.exitcode))
+            continue
+
+        kind, worker_id, content = message
+        if kind == MSG_RESULTS:
+            positions.append(content[0])
+            predictions.append(content[1])
+        elif kind == MSG_DONE:
+            send_lags.append(content['send_lags'])
+            errors += content['errors']
+            elapsed = max(elapsed, content['elapsed'])
+            if metrics is not None:
+                metrics.merge(RequestMetrics.from_dict(content['metrics']))
+            finished.add(worker_id)
+        else:
+            raise RuntimeError('Replay worker [{}] failed:\n{}'.format(worker_id, content))
+
+    return (np.concatenate(positions) if positions else np.zeros(0, dtype=np.int64),
+            np.concatenate(predictions) if predictions else np.zeros(0),
+            np.concatenate(send_lags),
+            errors,
+            elapsed)
+
+
+def _run_worker(worker_id: int,
+                processes: int,
+                data_dir: str,
+                client_options: dict,
+                rate: float,
+                duration: float,
+                concurrency: int,
+                start_barrier: threading.Barrier,
+                results: multiprocessing.Queue) -> None:
+    try:
+        samples = read_columnar(data_dir)
+        shard_positions = np.arange(worker_id, len(samples), processes, dtype=np.int64)
+        shard = samples.iloc[shard_positions]
+        metrics = RequestMetrics()
+        client = PredictClient(metrics=metrics, **client_options)
+
+        pending_positions: List[int] = []
+        pending_predictions: List[float] = []
+        pending_lock = threading.Lock()
+
+        def flush() -> None:
+            if pending_positions:
+                results.put((MSG_RESULTS, worker_id, (shard_positions[pending_positions],
+                                                      np.array(pending_predictions, dtype=np.float64))))
+                pending_positions.clear()
+                pending_predictions.clear()
+
+        def on_result(pos: int, prediction: float) -> None:
+            with pending_lock:
+                pending_positions.append(pos)
+                pending_predictions.append(prediction)
+                if len(pending_positions) >= RESULT_CHUNK_SIZE:
+                    flush()
+
+        start_barrier.wait(timeout=START_TIMEOUT)
+        time.sleep(worker_id / rate)
+        result = run_constant_rate(client, shard, rate / processes, duration, concurrency, on_result)
+        client.close()
+
+        with pending_lock:
+            flush()
+        results.put((MSG_DONE, worker_id, {'send_lags': result.send_lags,
+                                           'errors': result.errors,
+                                           'elapsed': result.elapsed,
+                                           'metrics': metrics.to_dict()}))
+    except Exception:  # pylint: disable=broad-except
+        logging.exception('Replay worker [%d] failed.', worker_id)
+        start_barrier.abort()
+        results.put((MSG_FAILED, worker_id, traceback.format_exc()))
@@ -0,0 +1,237 @@
+"""
+Queue backends the attack notification consumer receives messages from.
+"""
+from typing import Dict, Iterator, List, Optional
+from abc import ABC, abstractmethod
+from collections import deque
+import itertools
+import json
+import threading
+import time
+import uuid
+
+KEY_MESSAGE_ID = 'MessageId'
+KEY_RECEIPT_HANDLE = 'ReceiptHandle'
+KEY_BODY = 'Body'
+
+# Maximum time in seconds a receive on an empty local queue blocks at once.
+REPLAY_IDLE_WAIT = 0.1
+
+
+class QueueBackend(ABC):
+    """
+    Interface of message queues with SQS semantics.
+
+    Received messages carry a `ReceiptHandle` and stay invisible to other receivers for the visibility timeout. They
+    are removed from the queue by deleting them via their receipt handle.
+    """
+
+    @abstractmethod
+    def receive_messages(self,
+                         queue_url: str,
+                         num_messages: int,
+                         wait_time_seconds: int,
+                         visibility_timeout: int) -> List[dict]:
+        """
+        Polls the message queue and returns visible messages.
+
+        :param queue_url: URL of the message queue.
+        :param num_messages: Maximum number of messages to receive. Should be between 1 - 10.
+        :param wait_time_seconds: Time to wait in seconds for messages if none are available.
+        :param visibility_timeout: Visibility timeout for delivered messages.
+        :return: List of messages.
+        """
+
+    @abstractmethod
+    def delete_messages(self, queue_url: str, messages: List[dict], max_retries: int = 3) -> List[dict]:
+        """
+        Deletes received messages from the message queue.
+
+        :param queue_url: URL of the message queue.
+        :param messages: Messages to delete.
+        :param max_retries: Maximum number of retries of failed deletions.
+        :return: List of messages which could not be deleted.
+        """
+
+    @abstractmethod
+    def change_visibility(self,
+                          queue_url: str,
+                          messages: List[dict],
+                          visibility_timeout: int,
+                          max_retries: int = 3) -> List[dict]:
+        """
+        Changes the visibility timeout of received messages.
+
+        :param queue_url: URL of the message queue.
+        :param messages: Received messages.
+        :param visibility_timeout: New visibility timeout in seconds, counted from now.
+        :param max_retries: Maximum number of retries of failed changes.
+        :return: List of messages whose visibility timeout could not be changed.
+        """
+
+    def queue_depth(self, queue_url: str) -> Optional[int]:
+        """
+        Returns the approximate number of visible messages in the message queue.
+
+        :param queue_url: URL of the message queue.
+        :return: Number of messages or None if unknown.
+        """
+        return None
+
+    @property
+    def exhausted(self) -> bool:
+        """
+        Whether the queue will not deliver any further messages.
+
+        :return: True for finite queues which have been consumed completely, else False.
+        """
+        return False
+
+
+class InMemoryQueue(QueueBackend):
+    """
+    Thread-safe in-memory message queue with SQS semantics. Messages which are not deleted within their visibility
+    timeout are delivered again.
+    """
+
+    def __init__(self) -> None:
+        self._visible: deque = deque()
+        self._in_flight: Dict[str, list] = {}
+        self._condition = threading.Condition()
+        self._ids = itertools.count()
+
+    def send_message(self, body: str, message_id: Optional[str] = None) -> str:
+        """
+        Adds a message to the queue.
+
+        :param body: Message body.
+        :param message_id: Message id. Generated if absent.
+        :return: Message id.
+        """
+        message_id = message_id or str(uuid.uuid4())
+        with self._condition:
+            self._visible.append({KEY_MESSAGE_ID: message_id, KEY_BODY: body})
+            self._condition.notify()
+        return message_id
+
+    def receive_messages(self,
+                         queue_url: str,
+                         num_messages: int,
+                         wait_time_seconds: int,
+                         visibility_timeout: int) -> List[dict]:
+        deadline = time.monotonic() + wait_time_seconds
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                self._restore_expired(now)
+                if self._visible or now >= deadline:
+                    break
+                self._condition.wait(timeout=min(deadline - now, REPLAY_IDLE_WAIT))
+
+            received: List[dict] = []
+            while self._visible and len(received) < num_messages:
+                message = dict(self._visible.popleft(), ReceiptHandle='handle-{}'.format(next(self._ids)))
+                self._in_flight[message[KEY_RECEIPT_HANDLE]] = [message, now + visibility_timeout]
+                received.append(message)
+            return received
+
+    def delete_messages(self, queue_url: str, messages: List[dict], max_retries: int = 3) -> List[dict]:
+        with self._condition:
+            return [message for message in messages
+                    if self._in_flight.pop(message.get(KEY_RECEIPT_HANDLE, ''), None) is None]
+
+    def change_visibility(self,
+                          queue_url: str,
+                          messages: List[dict],
+                          visibility_timeout: int,
+                          max_retries: int = 3) -> List[dict]:
+        visible_at = time.monotonic() + visibility_timeout
+        failed = []
+        with self._condition:
+            for message in messages:
+                entry = self._in_flight.get(message.get(KEY_RECEIPT_HANDLE, ''))
+                if entry is None:
+                    failed.append(message)
+                else:
+                    entry[1] = visible_at
+        return failed
+
+    def queue_depth(self, queue_url: str) -> Optional[int]:
+        with self._condition:
+            self._restore_expired(time.monotonic())
+            return len(self._visible)
+
+    def _restore_expired(self, now: float) -> None:
+        expired = [handle for handle, (_, visible_at) in self._in_flight.items() if visible_at <= now]
+        for handle in expired:
+            message, _ = self._in_flight.pop(handle)
+            self._visible.append({key: value for key, value in message.items() if key != KEY_RECEIPT_HANDLE})
+
+
+class FileReplayQueue(QueueBackend):
+    """
+    Replays messages recorded in a JSON lines file as fast as they are requested.
+
+    Each line contains either a SQS message with `MessageId` and `Body` or a message body, e.g. the SNS envelope of an
+    attack notification. The file is read incrementally. Deleting and changing the visibility of messages has no
+    effect, every message is delivered exactly once.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        :param path: Path of the JSON lines file.
+        """
+        self.path = path
+        self.delivered = 0
+        self.deleted = 0
+        self._lines = self._read_messages()
+        self._exhausted = False
+        self._lock = threading.Lock()
+
+    def receive_messages(self,
+                         queue_url: str,
+                         num_messages: int,
+                         wait_time_seconds: int,
+                         visibility_timeout: int) -> List[dict]:
+        with self._lock:
+            messages = list(itertools.islice(self._lines, num_messages))
+            if len(messages) < num_messages:
+                self._exhausted = True
+            self.delivered += len(messages)
+
+        if not messages:
+            time.sleep(min(wait_time_seconds, REPLAY_IDLE_WAIT))
+        return messages
+
+    def delete_messages(self, queue_url: str, messages: List[dict], max_retries: int = 3) -> List[dict]:
+        with self._lock:
+            self.deleted += len(messages)
+        return []
+
+    def change_visibility(self,
+                          queue_url: str,
+                          messages: List[dict],
+                          visibility_timeout: int,
+                          max_retries: int = 3) -> List[dict]:
+        return []
+
+    @property
+    def exhausted(self) -> bool:
+        return self._exhausted
+
+    def _read_messages(self) -> Iterator[dict]:
+        with open(self.path, encoding='utf-8') as file:
+            for line_nr, line in enumerate(file):
+                line = line.strip()
+                if not line:
+                    continue
+
+                content = json.loads(line)
+                if isinstance(content, dict) and KEY_BODY in content:
+                    message = dict(content)
+                    message.setdefault(KEY_MESSAGE_ID, 'replay-{}'.format(line_nr))
+                else:
+                    message = {KEY_MESSAGE_ID: 'replay-{}'.format(line_nr), KEY_BODY: line}
+                message[KEY_RECEIPT_HANDLE] = 'replay-{}'.format(line_nr)
+                yield message
+
@@ -1,20 +1,23 @@
 """
 Utility functions for CLI applications.
 """
-from typing import Dict, Union, Optional, Callable
+from typing import Dict, Iterator, Union, Optional, Callable
+from collections import namedtuple
+import functools
 import shutil
 import click
+import numpy as np
 import pandas as pd
 from tabulate import tabulate
-from ml_ids_api_client.data import Selection, RandomSelection
+from ml_ids_api_client.data import Selection, RandomSelection, PredictionStats
+from ml_ids_api_client.metrics import RequestMetrics
 
 QUIT_CHAR = 'q'
 RANDOM_CHAR = 'r'
 
-COLS, _ = shutil.get_terminal_size()
-pd.set_option('display.max_columns', 100)
-pd.set_option('display.max_rows', 1000)
-pd.set_option('display.width', COLS)
+DisplayOptions = namedtuple('DisplayOptions', ['mode', 'page_size', 'max_rows'])
+
+DEFAULT_DISPLAY_OPTIONS = DisplayOptions(mode='FULL', page_size=50, max_rows=20)
 
 
 def prompt_for_selection(categories: Dict[int, str]) -> Optional[Union[Selection, RandomSelection]]:
@@ -143,25 +146,99 @@ def prompt(prompt_msg: str, invalid_msg: str, text: str, is_valid_fn: Callable[[
         click.echo(invalid_msg)
 
 
-def show_prediction_results(result_df: pd.DataFrame, accuracy: float, display_overflow: str) -> None:
+def show_prediction_results(result_df: pd.DataFrame,
+                            stats: PredictionStats,
+                            display_overflow: str,
+                            metrics: Optional[RequestMetrics] = None,
+                            display_options: DisplayOptions = DEFAULT_DISPLAY_OPTIONS) -> None:
     """
     Displays prediction results to the user.
 
     :param result_df: Pandas DataFrame containing the prediction results.
-    :param accuracy: Accuracy of the prediction results.
+    :param stats: Accuracy, precision, recall and per-category confusion counts of the prediction results.
     :param display_overflow: Defines the overflow behaviour if the output exceeds the window width (WRAP | NOWRAP).
+    :param metrics: Optional request metrics to display.
+    :param display_options: Defines how the details of the prediction results are displayed. In mode `FULL` all rows
+                            are printed at once, `PAGED` prints pages of `page_size` rows via the system pager,
+                            `TRUNCATED` prints the first and last rows up to `max_rows` rows and `SUMMARY` omits the
+                            details.
     :return: None
     """
     click.echo()
     click.echo('Prediction Results:')
     click.echo('===================')
-    click.echo('Accuracy: {:.2f}%'.format(accuracy))
-    click.echo('\nDetails:')
-    click.echo('--------')
-    print_dataframe(result_df, display_overflow)
+    print_prediction_stats(stats)
+    if metrics is not None:
+        print_request_metrics(metrics)
+
+    mode = display_options.mode.upper()
+    if mode != 'SUMMARY':
+        click.echo('\nDetails:')
+        click.echo('--------')
+        if mode == 'PAGED':
+            print_dataframe_paged(result_df, display_overflow, display_options.page_size)
+        elif mode == 'TRUNCATED':
+            print_dataframe_truncated(result_df, display_overflow, display_options.max_rows)
+        else:
+            print_dataframe(result_df, display_overflow)
     click.echo()
 
 
+def print_prediction_stats(stats: PredictionStats) -> None:
+    """
+    Prints accuracy, precision, recall and the per-category confusion counts of prediction results.
+
+    :param stats: PredictionStats.
+    :return: None
+    """
+    click.echo('Accuracy: {:.2f}%'.format(stats.accuracy))
+    click.echo('Precision: {:.2f}%, Recall: {:.2f}% (TP: {}, FP: {}, TN: {}, FN: {})'
+               .format(stats.precision, stats.recall, stats.true_positives, stats.false_positives,
+                       stats.true_negatives, stats.false_negatives))
+    click.echo(tabulate(stats.confusion.reset_index().to_dict(orient='list'), headers='keys', floatfmt='.2f'))
+
+
+def print_request_metrics(metrics: RequestMetrics) -> None:
+    """
+    Prints latency percentiles per request phase and the throughput of prediction requests.
+
+    :param metrics: Request metrics.
+    :return: None
+    """
+    click.echo('Requests: {} ({} failed), Rows: {}, Throughput: {:.2f} rows/s'
+               .format(metrics.requests, metrics.errors, metrics.rows, metrics.rows_per_second()))
+    if metrics.cache_lookups > 0:
+        click.echo('Prediction cache: {:.2f}% hit rate ({} of {} rows)'
+                   .format(metrics.cache_hit_rate() * 100, metrics.cache_hits, metrics.cache_lookups))
+    for phase, histogram in metrics.durations.items():
+        click.echo('Latency [{}]: p50 {:.2f}ms, p90 {:.2f}ms, p99 {:.2f}ms, max {:.2f}ms'
+                   .format(phase,
+                           histogram.percentile(50) * 1000,
+                           histogram.percentile(90) * 1000,
+                           histogram.percentile(99) * 1000,
+                           histogram.max * 1000))
+
+
+def show_load_test_summary(send_lags: np.ndarray, errors: int, elapsed: float) -> None:
+    """
+    Displays the summary of a constant rate load test to the user.
+
+    :param send_lags: Lag between the scheduled and the actual send time of each request in seconds.
+    :param errors: Number of failed requests.
+    :param elapsed: Elapsed time of the load test in seconds.
+    :return: None
+    """
+    click.echo()
+    click.echo('Load Test Summary:')
+    click.echo('==================')
+    click.echo('Requests: {} ({} failed) in {:.2f}s'.format(len(send_lags), errors, elapsed))
+    if elapsed > 0:
+        click.echo('Achieved rate: {:.2f} requests/s'.format(len(send_lags) / elapsed))
+    if len(send_lags) > 0:
+        p50, p99 = np.percentile(send_lags, [50, 99]) * 1000
+        click.echo('Send lag: p50 {:.2f}ms, p99 {:.2f}ms, max {:.2f}ms'.format(p50, p99, send_lags.max() * 1000))
+
+
 def print_dataframe(df: pd.DataFrame, display_overflow: str) -> None:
     """
     Prints a Pandas DataFrame to the standard output.
@@ -171,6 +248,91 @@ def print_dataframe(df: pd.DataFrame, display_overflow: str) -> None:
     :return:
     """
     if display_overflow == 'WRAP':
+        configure_pandas_display()
         click.echo(df.reset_index(drop=True))
     else:
         click.echo(tabulate(df, headers='keys', showindex=False))
+
+
+def print_dataframe_paged(df: pd.DataFrame, display_overflow: str, page_size: int) -> None:
+    """
+    Prints a Pandas DataFrame in pages of `page_size` rows via the system pager. Pages are rendered on demand, hence
+    the time to display the first page does not depend on the number of rows.
+
+    :param df: Pandas DataFrame.
+    :param display_overflow: Defines the overflow behaviour if the output exceeds the window width (WRAP | NOWRAP).
+    :param page_size: Number of rows per page.
+    :return: None
+    """
+    click.echo_via_pager(render_pages(df, display_overflow, page_size))
+
+
+def print_dataframe_truncated(df: pd.DataFrame, display_overflow: str, max_rows: int) -> None:
+    """
+    Prints the first and last rows of a Pandas DataFrame, limited to `max_rows` rows in total.
+
+    :param df: Pandas DataFrame.
+    :param display_overflow: Defines the overflow behaviour if the output exceeds the window width (WRAP | NOWRAP).
+    :param max_rows: Maximum number of rows to print.
+    :return: None
+    """
+    if len(df) <= max_rows:
+        click.echo(render_rows(df, 0, display_overflow))
+        return
+
+    nr_head = (max_rows + 1) // 2
+    nr_tail = max_rows - nr_head
+    click.echo(render_rows(df.iloc[:nr_head], 0, display_overflow))
+    click.echo('... {} rows omitted ...'.format(len(df) - max_rows))
+    if nr_tail > 0:
+        click.echo(render_rows(df.iloc[len(df) - nr_tail:], len(df) - nr_tail, display_overflow))
+
+
+def render_pages(df: pd.DataFrame, display_overflow: str, page_size: int) -> Iterator[str]:
+    """
+    Lazily renders a Pandas DataFrame in pages of `page_size` rows.
+
+    :param df: Pandas DataFrame.
+    :param display_overflow: Defines the overflow behaviour if the output exceeds the window width (WRAP | NOWRAP).
+    :param page_size: Number of rows per page.
+    :return: Iterator of rendered pages.
+    """
+    if page_size < 1:
+        raise ValueError('page_size must be greater 0.')
+
+    nr_pages = max((len(df) + page_size - 1) // page_size, 1)
+    for page in range(nr_pages):
+        start = page * page_size
+        yield 'Rows {} - {} of {}\n'.format(start + 1, min(start + page_size, len(df)), len(df))
+        yield render_rows(df.iloc[start:start + page_size], start, display_overflow) + '\n\n'
+
+
+def render_rows(df: pd.DataFrame, start: int, display_overflow: str) -> str:
+    """
+    Renders rows of a Pandas DataFrame. Rows are labeled by their position, starting at `start`.
+
+    :param df: Pandas DataFrame.
+    :param start: Position of the first row.
+    :param display_overflow: Defines the overflow behaviour if the output exceeds the window width (WRAP | NOWRAP).
+    :return: Rendered rows.
+    """
+    if display_overflow == 'WRAP':
+        configure_pandas_display()
+        rows = df.copy()
+        rows.index = pd.RangeIndex(start, start + len(df))
+        return rows.to_string(line_width=pd.get_option('display.width'))
+    return tabulate(df, headers='keys', showindex=False)
+
+
+@functools.lru_cache(maxsize=None)
+def configure_pandas_display() -> None:
+    """
+    Sets the Pandas display options to the size of the terminal. The options are set once, before the first DataFrame
+    is printed.
+
+    :return: None
+    """
+    cols, _ = shutil.get_terminal_size()
+    pd.set_option('display.max_columns', 100)
+    pd.set_option('display.max_rows', 1000)
+    pd.set_option('display.width', cols)
@@ -0,0 +1,95 @@
+import random
+from collections import Counter
+import pandas as pd
+from ml_ids_api_client.consumer.analytics import AttackAnalytics, SlidingWindowCounter, SpaceSaving, \
+    print_analytics_summary
+from ml_ids_api_client.consumer.notification_decoder import AttackNotification
+
+
+def notification(ports, protocol=6):
+    return AttackNotification('msg', pd.DataFrame({'dst_port': ports, 'protocol': [protocol] * len(ports)}))
+
+
+def test_space_saving_must_count_exactly_within_capacity():
+    sketch = SpaceSaving(10)
+    stream = [1, 2, 2, 3, 3, 3]
+    for key in stream:
+        sketch.update(key)
+
+    assert sketch.top(2) == [(3, 3), (2, 2)]
+    assert sketch.total == 6
+    assert sketch.error(3) == 0
+
+
+def test_space_saving_must_find_heavy_hitters_with_bounded_counters():
+    rng = random.Random(42)
+    stream = [80] * 500 + [443] * 300 + [rng.randrange(1000, 60000) for _ in range(2000)]
+    rng.shuffle(stream)
+
+    sketch = SpaceSaving(20)
+    for key in stream:
+        sketch.update(key)
+
+    top = sketch.top(2)
+    assert [key for key, _ in top] == [80, 443]
+    assert len(sketch.items()) <= 20
+    for key, count in top:
+        assert count - sketch.error(key) <= Counter(stream)[key] <= count
+
+
+def test_sliding_window_counter_must_drop_expired_slots():
+    counter = SlidingWindowCounter(window=60, nr_slots=6, capacity=10)
+    counter.update('a', 0)
+    counter.update('b', 30)
+    assert counter.total(59) == 2
+
+    counter.update('b', 65)
+    assert counter.top(1, 65) == [('b', 2)]
+    assert counter.total(65) == 2
+    assert counter.total(200) == 0
+
+
+def test_analytics_must_aggregate_sliding_window_per_dimension():
+    analytics = AttackAnalytics(sliding_window=60, tumbling_window=60, nr_slots=6)
+    analytics.update([notification([80, 80, 443])], now=1000)
+    analytics.update([notification([80], protocol=17)], now=1010)
+
+    summary = analytics.sliding_summary(now=1020)
+
+    assert summary['dst_port'].flows == 4
+    assert summary['dst_port'].flows_per_minute == 4
+    assert summary['dst_port'].top == [(80, 3), (443, 1)]
+    assert summary['protocol'].top == [(6, 3), (17, 1)]
+    assert analytics.flows == 4
+
+
+def test_analytics_must_report_completed_tumbling_window():
+    analytics = AttackAnalytics(sliding_window=300, tumbling_window=60)
+    analytics.update([notification([80, 22])], now=60)
+    assert analytics.tumbling_summary(now=100) is None
+
+    analytics.update([notification([443])], now=125)
+    completed = analytics.tumbling_summary(now=125)
+
+    assert (completed['dst_port'].start, completed['dst_port'].end) == (60, 120)
+    assert completed['dst_port'].flows == 2
+    assert sorted(completed['dst_port'].top) == [(22, 1), (80, 1)]
+
+
+def test_analytics_must_match_columns_ignoring_case_and_spaces():
+    analytics = AttackAnalytics()
+    flow = pd.DataFrame({'Dst Port': [8080], 'Protocol': [6]})
+
+    analytics.update([AttackNotification('msg', flow)], now=0)
+
+    assert analytics.sliding_summary(now=0)['dst_port'].top == [(8080, 1)]
+
+
+def test_print_analytics_summary_must_display_top_values(capsys):
+    analytics = AttackAnalytics()
+    analytics.update([notification([80, 80, 443])])
+
+    print_analytics_summary(analytics, nr_keys=1)
+
+    output = capsys.readouterr().out
+    assert 'dst_port' in output and '80' in output and '443' not in output
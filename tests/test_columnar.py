@@ -0,0 +1,119 @@
+import pytest
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+from tests.conf import TEST_DATA_DIR
+from ml_ids_api_client.columnar import load_cached_dataset, write_columnar, read_columnar
+
+
+@pytest.fixture
+def test_data():
+    validation_data_path = os.path.join(TEST_DATA_DIR, 'dataset.h5')
+    return pd.read_hdf(validation_data_path)
+
+
+@pytest.fixture
+def tmp_dir():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        yield tmp_dir
+
+
+def test_read_columnar_must_return_stored_dataframe(test_data, tmp_dir):
+    path = os.path.join(tmp_dir, 'dataset')
+    write_columnar(test_data, path)
+
+    df = read_columnar(path)
+
+    assert_frame_equal(test_data, df, check_categorical=False, check_dtype=False)
+    assert df.dtypes.drop(['timestamp', 'label']).equals(test_data.dtypes.drop(['timestamp', 'label']))
+    assert df.label.dtype == 'category'
+
+
+def test_read_columnar_must_memory_map_numeric_columns(test_data, tmp_dir):
+    path = os.path.join(tmp_dir, 'dataset')
+    write_columnar(test_data, path)
+
+    df = read_columnar(path)
+
+    assert isinstance(df['flow_duration'].to_numpy().base, np.memmap)
+
+
+def test_write_columnar_must_store_extension_dtypes_as_codes(tmp_dir):
+    df = pd.DataFrame({'a': pd.array([1, None, 3], dtype='Int64'),
+                       'b': pd.array(['x', 'y', 'x'], dtype='string')})
+    path = os.path.join(tmp_dir, 'dataset')
+    write_columnar(df, path)
+
+    stored = read_columnar(path)
+
+    assert stored['a'].tolist()[::2] == [1, 3]
+    assert pd.isna(stored['a'].tolist()[1])
+    assert stored['b'].tolist() == ['x', 'y', 'x']
+
+
+def test_write_columnar_must_reject_columns_which_cannot_be_serialized(tmp_dir):
+    df = pd.DataFrame({'a': pd.date_range('2018-02-21', periods=2, tz='UTC')})
+
+    with pytest.raises(ValueError):
+        write_columnar(df, os.path.join(tmp_dir, 'dataset'))
+
+
+def test_write_columnar_with_downcast_must_halve_memory_usage(tmp_dir):
+    df = pd.DataFrame({'a': np.arange(1000, dtype=np.float64),
+                       'b': np.arange(1000, dtype=np.int64),
+                       'label': ['Benign'] * 1000})
+    path = os.path.join(tmp_dir, 'dataset')
+    write_columnar(df, path, downcast=True)
+
+    downcast = read_columnar(path)
+
+    assert downcast.memory_usage(deep=True).sum() * 2 <= df.memory_usage(deep=True).sum()
+    assert downcast['a'].dtype == np.float32
+    assert downcast['b'].dtype == np.uint16
+    assert (downcast['b'] == df['b']).all()
+
+
+def test_load_cached_dataset_must_reuse_cache(test_data, tmp_dir, monkeypatch):
+    source = os.path.join(tmp_dir, 'dataset.h5')
+    cache_dir = os.path.join(tmp_dir, 'cache')
+    shutil.copyfile(os.path.join(TEST_DATA_DIR, 'dataset.h5'), source)
+
+    load_cached_dataset(source, cache_dir)
+    entries = os.listdir(cache_dir)
+    monkeypatch.setattr(pd, 'read_hdf', lambda *args, **kwargs: pytest.fail('source must not be read'))
+    df = load_cached_dataset(source, cache_dir)
+
+    assert_frame_equal(test_data, df, check_categorical=False, check_dtype=False)
+    assert os.listdir(cache_dir) == entries
+
+
+def test_load_cached_dataset_must_replace_cache_entry_if_source_changed(test_data, tmp_dir):
+    source = os.path.join(tmp_dir, 'dataset.h5')
+    cache_dir = os.path.join(tmp_dir, 'cache')
+    shutil.copyfile(os.path.join(TEST_DATA_DIR, 'dataset.h5'), source)
+
+    load_cached_dataset(source, cache_dir)
+    entries = os.listdir(cache_dir)
+    os.remove(source)
+    shutil.copyfile(os.path.join(TEST_DATA_DIR, 'dataset.h5'), source)
+    os.utime(source, ns=(1, 1))
+    df = load_cached_dataset(source, cache_dir)
+
+    assert len(df) == len(test_data)
+    assert len(os.listdir(cache_dir)) == 1
+    assert os.listdir(cache_dir) != entries
+
+
+def test_load_cached_dataset_must_not_convert_twice(tmp_dir):
+    source = os.path.join(tmp_dir, 'dataset.h5')
+    cache_dir = os.path.join(tmp_dir, 'cache')
+    shutil.copyfile(os.path.join(TEST_DATA_DIR, 'dataset.h5'), source)
+
+    load_cached_dataset(source, cache_dir)
+    mtime = os.stat(os.path.join(cache_dir, os.listdir(cache_dir)[0])).st_mtime_ns
+    load_cached_dataset(source, cache_dir)
+
+    assert os.stat(os.path.join(cache_dir, os.listdir(cache_dir)[0])).st_mtime_ns == mtime
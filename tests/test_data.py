@@ -1,8 +1,10 @@
 import pytest
 import os
+import numpy as np
 import pandas as pd
 from tests.conf import TEST_DATA_DIR
-from ml_ids_api_client.data import get_categories, select_samples, Selection, RandomSelection
+from ml_ids_api_client.data import get_categories, select_samples, merge_predictions, Selection, RandomSelection, \
+    SampleIndex, ReservoirSampler, StreamSampler, MixSelection, mix_counts, load_mix_profile
 
 SAMPLE_COUNT = 100
 
@@ -58,3 +60,245 @@ def test_select_samples_from_random_must_return_all_samples(test_data):
     samples = select_samples(test_data, RandomSelection(nr_samples=SAMPLE_COUNT, delay=None))
 
     assert len(samples) == SAMPLE_COUNT
+
+
+def test_merge_predictions_must_not_modify_samples(test_data):
+    columns = test_data.columns.to_list()
+    merge_predictions(test_data, [0.0] * SAMPLE_COUNT)
+
+    assert test_data.columns.to_list() == columns
+
+
+def test_merge_predictions_must_order_result_columns(test_data):
+    results, _ = merge_predictions(test_data, [0.0] * SAMPLE_COUNT)
+
+    assert results.columns.to_list()[:3] == ['is_correct', 'label', 'predicted_label']
+    assert results.columns.to_list()[-1] == 'prediction_raw'
+    assert len(results.columns) == len(test_data.columns) + 3
+
+
+def test_merge_predictions_must_apply_threshold(test_data):
+    predictions = (test_data.label != 'Benign').to_numpy() * 0.7
+
+    results, stats = merge_predictions(test_data, predictions, threshold=0.5)
+    assert results.is_correct.all()
+    assert stats.accuracy == 100.0
+
+    results, stats = merge_predictions(test_data, predictions, threshold=0.8)
+    assert (results.predicted_label == 'Benign').all()
+    assert stats.accuracy == 56.0
+    assert stats.recall == 0.0
+
+
+def test_merge_predictions_must_compute_confusion_counts(test_data):
+    predictions = [1.0] * SAMPLE_COUNT
+    _, stats = merge_predictions(test_data, predictions)
+
+    assert stats.true_positives == 44
+    assert stats.false_positives == 56
+    assert stats.true_negatives == 0
+    assert stats.false_negatives == 0
+    assert stats.precision == 44.0
+    assert stats.recall == 100.0
+    assert stats.confusion.loc['Benign', 'predicted_attack'] == 56
+    assert stats.confusion.loc['Benign', 'correct'] == 0
+    assert stats.confusion['count'].sum() == SAMPLE_COUNT
+
+
+def test_merge_predictions_must_raise_ValueError_on_length_mismatch(test_data):
+    with pytest.raises(ValueError):
+        merge_predictions(test_data, [0.0])
+
+
+def test_sample_index_must_return_categories_ordered_by_frequency(test_data):
+    index = SampleIndex(test_data.copy())
+
+    assert index.get_categories() == get_categories(test_data)
+
+
+def test_sample_index_must_select_samples_of_given_category(test_data):
+    index = SampleIndex(test_data.reset_index(drop=True))
+    samples = index.select_samples(Selection(category='Benign', nr_samples=10, delay=None))
+
+    assert len(samples) == 10
+    assert (samples.label == 'Benign').all()
+    assert samples.index.is_unique
+
+
+def test_sample_index_must_return_all_samples_of_given_category(test_data):
+    index = SampleIndex(test_data.copy())
+    samples = index.select_samples(Selection(category='Benign', nr_samples=SAMPLE_COUNT, delay=None))
+
+    assert samples.index.to_list() == test_data[test_data.label == 'Benign'].index.to_list()
+
+
+def test_sample_index_must_return_empty_if_category_not_present(test_data):
+    index = SampleIndex(test_data.copy())
+    samples = index.select_samples(Selection(category='Non-Existent', nr_samples=10, delay=None))
+
+    assert len(samples) == 0
+
+
+def test_sample_index_must_return_random_samples(test_data):
+    index = SampleIndex(test_data.reset_index(drop=True))
+    samples = index.select_samples(RandomSelection(nr_samples=10, delay=None))
+
+    assert len(samples) == 10
+    assert samples.index.is_unique
+    assert len(samples.label.drop_duplicates()) > 1
+
+
+def test_sample_index_must_select_identical_samples_for_identical_seeds(test_data):
+    first = SampleIndex(test_data.copy(), seed=42).select_samples(RandomSelection(nr_samples=10, delay=None))
+    second = SampleIndex(test_data.copy(), seed=42).select_samples(RandomSelection(nr_samples=10, delay=None))
+
+    assert first.index.to_list() == second.index.to_list()
+
+
+def chunks_of(df, chunk_size):
+    def read_chunks(columns=None):
+        for start in range(0, len(df), chunk_size):
+            chunk = df.iloc[start:start + chunk_size]
+            yield chunk if columns is None else chunk[columns]
+
+    return read_chunks
+
+
+def test_reservoir_sampler_must_return_all_rows_if_stream_is_smaller(test_data):
+    sampler = ReservoirSampler(SAMPLE_COUNT * 2, np.random.default_rng(0))
+    for chunk in chunks_of(test_data, 30)():
+        sampler.update(chunk)
+
+    assert sampler.result().index.to_list() == test_data.index.to_list()
+
+
+def test_reservoir_sampler_must_return_unique_rows_of_stream(test_data):
+    test_data = test_data.reset_index(drop=True)
+    sampler = ReservoirSampler(10, np.random.default_rng(0))
+    for chunk in chunks_of(test_data, 7)():
+        sampler.update(chunk)
+
+    samples = sampler.result()
+    assert len(samples) == 10
+    assert samples.index.is_unique
+    assert samples.index.isin(test_data.index).all()
+
+
+def test_stream_sampler_must_return_categories_ordered_by_frequency(test_data):
+    sampler = StreamSampler(chunks_of(test_data, 30))
+
+    assert sampler.get_categories()[0] == 'Benign'
+    assert set(sampler.get_categories().values()) == set(get_categories(test_data).values())
+
+
+def test_stream_sampler_must_select_samples_of_given_category(test_data):
+    sampler = StreamSampler(chunks_of(test_data, 30), seed=0)
+    samples = sampler.select_samples(Selection(category='Benign', nr_samples=10, delay=None))
+
+    assert len(samples) == 10
+    assert (samples.label == 'Benign').all()
+
+
+def test_stream_sampler_must_return_empty_if_category_not_present(test_data):
+    sampler = StreamSampler(chunks_of(test_data, 30), seed=0)
+    samples = sampler.select_samples(Selection(category='Non-Existent', nr_samples=10, delay=None))
+
+    assert len(samples) == 0
+
+
+def test_stream_sampler_must_return_random_samples(test_data):
+    sampler = StreamSampler(chunks_of(test_data, 30), seed=0)
+    samples = sampler.select_samples(RandomSelection(nr_samples=10, delay=None))
+
+    assert len(samples) == 10
+    assert len(samples.label.drop_duplicates()) > 1
+
+
+def test_mix_counts_must_scale_weights_to_nr_samples():
+    counts = mix_counts(MixSelection(mix={'Benign': 0.9, 'DDoS': 0.05, 'FTP': 0.05}, nr_samples=101, delay=None))
+
+    assert counts == {'Benign': 91, 'DDoS': 5, 'FTP': 5}
+
+
+def test_mix_counts_must_return_counts_if_nr_samples_absent():
+    counts = mix_counts(MixSelection(mix={'Benign': 9, 'DDoS': 1}, nr_samples=None, delay=None))
+
+    assert counts == {'Benign': 9, 'DDoS': 1}
+
+
+def test_mix_counts_must_raise_ValueError_on_negative_weights():
+    with pytest.raises(ValueError):
+        mix_counts(MixSelection(mix={'Benign': -1, 'DDoS': 1}, nr_samples=10, delay=None))
+
+
+def test_select_samples_from_mix_must_return_samples_per_category(test_data):
+    selection = MixSelection(mix={'Benign': 0.8, 'DoS attacks-GoldenEye': 0.2}, nr_samples=20, delay=None)
+    samples = select_samples(test_data, selection)
+
+    assert samples.label.value_counts().to_dict() == {'Benign': 16, 'DoS attacks-GoldenEye': 4}
+
+
+def test_select_samples_from_mix_must_select_identical_samples_for_identical_seeds(test_data):
+    selection = MixSelection(mix={'Benign': 0.8, 'DoS attacks-GoldenEye': 0.2}, nr_samples=20, delay=None)
+    first = select_samples(test_data, selection, np.random.default_rng(42))
+    second = select_samples(test_data, selection, np.random.default_rng(42))
+
+    assert first.index.to_list() == second.index.to_list()
+
+
+def test_sample_index_must_select_identical_mix_for_identical_seeds(test_data):
+    selection = MixSelection(mix={'Benign': 50, 'DoS attacks-GoldenEye': 5}, nr_samples=None, delay=None)
+    first = SampleIndex(test_data.copy(), seed=42).select_samples(selection)
+    second = SampleIndex(test_data.copy(), seed=42).select_samples(selection)
+
+    assert first.index.to_list() == second.index.to_list()
+    assert first.label.astype(str).value_counts().to_dict() == {'Benign': 50, 'DoS attacks-GoldenEye': 5}
+    assert first.label.iloc[:len(first) // 2].nunique() == 2
+
+
+def test_sample_index_must_draw_with_replacement_if_category_exhausted(test_data):
+    available = (test_data.label == 'DoS attacks-GoldenEye').sum()
+    selection = MixSelection(mix={'DoS attacks-GoldenEye': available + 5}, nr_samples=None, delay=None)
+    samples = SampleIndex(test_data.copy(), seed=0).select_samples(selection)
+
+    assert len(samples) == available + 5
+    assert samples.index.nunique() == available
+
+
+def test_sample_index_must_raise_ValueError_if_mix_category_not_present(test_data):
+    selection = MixSelection(mix={'Non-Existent': 1}, nr_samples=10, delay=None)
+
+    with pytest.raises(ValueError):
+        SampleIndex(test_data.copy()).select_samples(selection)
+
+
+def test_stream_sampler_must_select_mix_samples(test_data):
+    selection = MixSelection(mix={'Benign': 0.8, 'DoS attacks-GoldenEye': 0.2}, nr_samples=20, delay=None)
+    first = StreamSampler(chunks_of(test_data, 30), seed=1).select_samples(selection)
+    second = StreamSampler(chunks_of(test_data, 30), seed=1).select_samples(selection)
+
+    assert first.label.value_counts().to_dict() == {'Benign': 16, 'DoS attacks-GoldenEye': 4}
+    assert first.index.to_list() == second.index.to_list()
+
+
+@pytest.mark.parametrize('file_name, content', [
+    ('profile.json', '{"nr_samples": 10, "weights": {"Benign": 0.9, "FTP-BruteForce": 0.1}}'),
+    ('profile.yml', 'nr_samples: 10\nweights:\n  Benign: 0.9\n  FTP-BruteForce: 0.1\n')
+])
+def test_load_mix_profile_must_load_weights(tmp_path, file_name, content):
+    if file_name.endswith('.yml'):
+        pytest.importorskip('yaml')
+    path = tmp_path / file_name
+    path.write_text(content)
+
+    assert load_mix_profile(str(path)) == MixSelection(mix={'Benign': 0.9, 'FTP-BruteForce': 0.1}, nr_samples=10,
+                                                       delay=None)
+    assert load_mix_profile(str(path), nr_samples=100).nr_samples == 100
+
+
+def test_load_mix_profile_must_raise_ValueError_if_nr_samples_absent(tmp_path):
+    path = tmp_path / 'profile.json'
+    path.write_text('{"weights": {"Benign": 1}}')
+
+    with pytest.raises(ValueError):
+        load_mix_profile(str(path))
@@ -2,7 +2,7 @@ import pytest
 import os
 import tempfile
 from tests.conf import TEST_DATA_DIR
-from ml_ids_api_client.dataset import load_dataset
+from ml_ids_api_client.dataset import load_dataset, read_dataset_chunks
 
 S3_REGION = 'eu-west-1'
 
@@ -42,3 +42,27 @@ def test_load_dataset_from_s3_must_raise_FileNotFoundError_if_file_does_not_exis
 
         with pytest.raises(IOError):
             load_dataset('s3://ml-ids-2018-sm/testing/non_existent.h5', S3_REGION, path)
+
+
+def test_load_dataset_from_file_must_load_data_via_columnar_cache():
+    path = os.path.join(TEST_DATA_DIR, 'dataset.h5')
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dataset = load_dataset('file://' + path, S3_REGION, 'tmp.h5', cache_dir=tmp_dir)
+
+        assert len(dataset) == 1000
+        assert len(os.listdir(tmp_dir)) == 1
+
+
+def test_read_dataset_chunks_must_return_all_rows_in_chunks():
+    path = os.path.join(TEST_DATA_DIR, 'dataset.h5')
+    chunks = list(read_dataset_chunks(path, 300))
+
+    assert [len(chunk) for chunk in chunks] == [300, 300, 300, 100]
+
+
+def test_read_dataset_chunks_must_return_selected_columns():
+    path = os.path.join(TEST_DATA_DIR, 'dataset.h5')
+    chunks = list(read_dataset_chunks(path, 500, columns=['label']))
+
+    assert all(chunk.columns.to_list() == ['label'] for chunk in chunks)
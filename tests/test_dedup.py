@@ -0,0 +1,58 @@
+import json
+from unittest import mock
+from ml_ids_api_client.consumer.dedup import DedupCache
+
+
+def message(msg_id, content='{"columns":["a"],"data":[[1]]}'):
+    return {'MessageId': msg_id, 'Body': json.dumps({'Message': content, 'Timestamp': msg_id})}
+
+
+def test_is_duplicate_must_detect_redelivered_message_ids():
+    cache = DedupCache()
+
+    assert not cache.is_duplicate(message('a'))
+    cache.record([message('a')])
+    assert not cache.is_duplicate(message('b'))
+    assert cache.is_duplicate(message('a'))
+    assert (cache.lookups, cache.duplicates) == (3, 1)
+
+
+def test_is_duplicate_must_not_detect_messages_which_have_not_been_recorded():
+    cache = DedupCache()
+
+    assert not cache.is_duplicate(message('a'))
+    assert not cache.is_duplicate(message('a'))
+
+
+def test_is_duplicate_must_detect_identical_content_if_enabled():
+    cache = DedupCache()
+    cache.record([message('a')])
+    assert not cache.is_duplicate(message('b'))
+
+    cache = DedupCache(content_hash=True)
+    cache.record([message('a')])
+    assert cache.is_duplicate(message('b'))
+    assert not cache.is_duplicate(message('c', content='{"columns":["a"],"data":[[2]]}'))
+
+
+def test_is_duplicate_must_expire_entries_after_window():
+    cache = DedupCache(window=10)
+
+    with mock.patch('time.monotonic', return_value=100.0):
+        cache.record([message('a')])
+    with mock.patch('time.monotonic', return_value=105.0):
+        assert cache.is_duplicate(message('a'))
+    with mock.patch('time.monotonic', return_value=116.0):
+        assert not cache.is_duplicate(message('a'))
+
+
+def test_record_must_evict_least_recently_seen_entries():
+    cache = DedupCache(max_entries=2)
+
+    cache.record([message('a'), message('b')])
+    cache.record([message('a')])
+    cache.record([message('c')])
+
+    assert cache.is_duplicate(message('a'))
+    assert not cache.is_duplicate(message('b'))
+    assert len(cache._entries) == 2
@@ -1,10 +1,19 @@
 import pytest
 import os
+import json
+import gzip
+import threading
+from types import SimpleNamespace
 import responses
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
 import pandas as pd
 from pandas.util.testing import assert_frame_equal
 from tests.conf import TEST_DATA_DIR
-from ml_ids_api_client.http.http_client import call_predict_api
+from ml_ids_api_client.http.http_client import call_predict_api, PredictClient, WIRE_FORMATS
+from ml_ids_api_client.http.serialization import decode_msgpack, decode_arrow, is_pyarrow_available
+from ml_ids_api_client.http.prediction_cache import PredictionCache
+from ml_ids_api_client.metrics import RequestMetrics
 
 ML_IDS_URL = 'http://api.ml-ids.com/api/predictions'
 
@@ -15,6 +24,12 @@ def test_data():
     return pd.read_hdf(validation_data_path)[:1]
 
 
+@pytest.fixture
+def test_data_large():
+    validation_data_path = os.path.join(TEST_DATA_DIR, 'dataset.h5')
+    return pd.read_hdf(validation_data_path)
+
+
 @pytest.fixture
 def api_success_response():
     with responses.RequestsMock() as rsps:
@@ -45,6 +60,61 @@ def api_client_error_response():
         yield rsps
 
 
+@pytest.fixture
+def api_server():
+    state = SimpleNamespace(url=None, failures=[], echo_first_column=False, score_features=False, requests=0,
+                            rejected=set(), content_types=[])
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers['Content-Length']))
+            content_type = self.headers['Content-Type']
+            state.requests += 1
+            state.content_types.append((content_type, self.headers.get('Content-Encoding')))
+            if self.headers.get('Content-Encoding') == 'gzip':
+                body = gzip.decompress(body)
+
+            if state.failures:
+                status, payload = state.failures.pop(0), b'{"error": "server-error"}'
+            elif content_type in state.rejected or self.headers.get('Content-Encoding') in state.rejected:
+                status, payload = 415, b'{"error": "unsupported-media-type"}'
+            else:
+                features = decode_body(body, content_type)
+                if state.score_features:
+                    # Model inputs are float32, hence identical features result in identical predictions.
+                    predictions = features.select_dtypes('number').astype(np.float32).sum(axis=1).tolist()
+                else:
+                    predictions = features.iloc[:, 0].tolist() if state.echo_first_column else [0.0] * len(features)
+                status, payload = 200, json.dumps(predictions).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    state.url = 'http://127.0.0.1:{}'.format(server.server_address[1])
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+def decode_body(body, content_type):
+    if content_type == WIRE_FORMATS['MSGPACK']:
+        return decode_msgpack(body)
+    if content_type == WIRE_FORMATS['ARROW']:
+        return decode_arrow(body)
+    content = json.loads(body)
+    return pd.DataFrame(content['data'], columns=content['columns'])
+
+
 def test_call_predict_api_must_invoke_api_endpoint(test_data, api_success_response):
     call_predict_api(ML_IDS_URL, test_data)
 
@@ -73,6 +143,14 @@ def test_call_predict_api_must_send_body_in_pandas_json_split_format(test_data,
                        check_dtype=False)
 
 
+def test_call_predict_api_must_send_body_identical_to_pandas_to_json(test_data, api_success_response):
+    call_predict_api(ML_IDS_URL, test_data)
+
+    expected = test_data.drop(columns=['label']).to_json(orient='split', index=False)
+
+    assert api_success_response.calls[0].request.body == expected
+
+
 def test_call_predict_api_must_return_predictions_on_success(test_data, api_success_response):
     predictions = call_predict_api(ML_IDS_URL, test_data)
 
@@ -88,3 +166,145 @@ def test_call_predict_api_must_raise_error_on_server_error(test_data, api_server
 def test_call_predict_api_must_raise_error_on_client_error(test_data, api_client_error_response):
     with pytest.raises(IOError):
         call_predict_api(ML_IDS_URL, test_data)
+
+
+def test_predict_client_must_reuse_connections(test_data, api_server):
+    with PredictClient(api_server.url) as client:
+        for _ in range(5):
+            assert client.predict(test_data) == [0.0]
+
+        stats = client.connection_stats()
+
+    assert stats.requests == 5
+    assert stats.new_connections == 1
+    assert stats.reused_connections == 4
+
+
+def test_predict_client_must_retry_on_server_error(test_data, api_server):
+    api_server.failures.extend([503, 502])
+
+    with PredictClient(api_server.url, max_retries=2, backoff_factor=0) as client:
+        assert client.predict(test_data) == [0.0]
+        assert client.connection_stats().requests == 3
+
+
+def test_predict_client_must_raise_error_if_retries_exhausted(test_data, api_server):
+    api_server.failures.extend([503, 503])
+
+    with PredictClient(api_server.url, max_retries=1, backoff_factor=0) as client:
+        with pytest.raises(IOError):
+            client.predict(test_data)
+
+
+def test_predict_batched_must_return_predictions_in_original_order(test_data_large, api_server):
+    api_server.echo_first_column = True
+
+    with PredictClient(api_server.url) as client:
+        predictions = client.predict_batched(test_data_large, batch_size=64, concurrency=4)
+
+    assert predictions == test_data_large.iloc[:, 0].to_list()
+    assert api_server.requests == 16
+
+
+def test_call_predict_api_must_split_data_into_batches(test_data_large, api_server):
+    predictions = call_predict_api(api_server.url, test_data_large[:10], batch_size=3, concurrency=2)
+
+    assert api_server.requests == 4
+    assert len(predictions) == 10
+
+
+def test_predict_client_must_record_request_metrics(test_data_large, api_server):
+    metrics = RequestMetrics()
+
+    with PredictClient(api_server.url, metrics=metrics) as client:
+        client.predict_batched(test_data_large, batch_size=100, concurrency=2)
+
+    assert metrics.requests == 10
+    assert metrics.rows == 1000
+    assert metrics.errors == 0
+    assert metrics.durations['network'].count == 10
+    assert metrics.rows_per_second() > 0
+
+
+def test_predict_client_must_record_failed_requests(test_data, api_client_error_response):
+    metrics = RequestMetrics()
+
+    with pytest.raises(IOError):
+        PredictClient(ML_IDS_URL, metrics=metrics).predict(test_data)
+
+    assert metrics.errors == 1
+    assert metrics.requests == 0
+
+
+def test_predict_must_send_distinct_uncached_rows_only(api_server):
+    api_server.echo_first_column = True
+    flows = pd.DataFrame({'label': ['DoS', 'Benign', 'DoS', 'DDoS', 'Benign'],
+                          'feature_1': [1.0, 2.0, 1.0, 3.0, 1.0],
+                          'feature_2': [10, 20, 10, 30, 10]})
+    metrics = RequestMetrics()
+
+    with PredictClient(api_server.url, metrics=metrics, prediction_cache=PredictionCache()) as client:
+        assert client.predict(flows) == flows.feature_1.to_list()
+        assert metrics.rows == 3
+
+        assert client.predict(flows.iloc[::-1]) == flows.feature_1.to_list()[::-1]
+
+    assert api_server.requests == 1
+    assert metrics.cache_lookups == 10
+    assert metrics.cache_hits == 5
+    assert metrics.cache_hit_rate() == 0.5
+
+
+def test_predict_batched_must_fan_out_predictions_in_original_order(api_server):
+    api_server.echo_first_column = True
+    flows = pd.DataFrame({'label': ['DoS'] * 100, 'feature_1': [value % 7 for value in range(100)]})
+
+    with PredictClient(api_server.url, prediction_cache=PredictionCache()) as client:
+        predictions = client.predict_batched(flows, batch_size=2, concurrency=2)
+
+    assert predictions == flows.feature_1.to_list()
+    assert api_server.requests == 4
+
+
+@pytest.mark.parametrize('wire_format', ['MSGPACK', 'ARROW'])
+@pytest.mark.parametrize('compress', [False, True])
+def test_predict_must_return_identical_predictions_for_all_wire_formats(test_data_large, api_server, wire_format,
+                                                                        compress):
+    if wire_format == 'MSGPACK':
+        pytest.importorskip('msgpack')
+    if wire_format == 'ARROW' and not is_pyarrow_available():
+        pytest.skip('pyarrow is not installed.')
+    api_server.score_features = True
+
+    with PredictClient(api_server.url) as client:
+        expected = client.predict(test_data_large)
+    with PredictClient(api_server.url, wire_format=wire_format, compress=compress) as client:
+        predictions = client.predict(test_data_large)
+
+    assert predictions == expected
+    assert api_server.content_types[-1] == (WIRE_FORMATS[wire_format], 'gzip' if compress else None)
+
+
+def test_predict_must_fall_back_to_pandas_split_if_format_rejected(test_data_large, api_server):
+    pytest.importorskip('msgpack')
+    api_server.echo_first_column = True
+    api_server.rejected.add(WIRE_FORMATS['MSGPACK'])
+
+    with PredictClient(api_server.url, wire_format='MSGPACK', compress=True) as client:
+        assert client.predict(test_data_large[:10]) == test_data_large.iloc[:10, 0].to_list()
+        assert client.predict(test_data_large[:10]) == test_data_large.iloc[:10, 0].to_list()
+        assert client.encoding == ('PANDAS_SPLIT', False)
+
+    assert api_server.content_types == [(WIRE_FORMATS['MSGPACK'], 'gzip'),
+                                        (WIRE_FORMATS['PANDAS_SPLIT'], None),
+                                        (WIRE_FORMATS['PANDAS_SPLIT'], None)]
+
+
+def test_predict_must_raise_error_if_pandas_split_rejected(test_data, api_server):
+    api_server.rejected.add('gzip')
+
+    with PredictClient(api_server.url, compress=True) as client:
+        assert client.predict(test_data) == [0.0]
+        with pytest.raises(IOError):
+            api_server.rejected.add(WIRE_FORMATS['PANDAS_SPLIT'])
+            client.predict(test_data)
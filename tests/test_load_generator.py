@@ -0,0 +1,124 @@
+import pytest
+import os
+import json
+import time
+import threading
+from collections import namedtuple
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pandas as pd
+from tests.conf import TEST_DATA_DIR
+from ml_ids_api_client.metrics import RequestMetrics
+from ml_ids_api_client.producer.load_generator import run_constant_rate
+from ml_ids_api_client.producer.sharded_replay import run_sharded_constant_rate, _shared_dir, SHARED_MEMORY_DIR
+
+
+class SlowClient:
+    def __init__(self, latency, fail_every=None):
+        self.latency = latency
+        self.fail_every = fail_every
+        self.calls = 0
+
+    def predict(self, data):
+        self.calls += 1
+        time.sleep(self.latency)
+        if self.fail_every is not None and self.calls % self.fail_every == 0:
+            raise IOError('server-error')
+        return [0.0] * len(data)
+
+
+@pytest.fixture
+def dst_port_server():
+    """
+    Prediction API server returning the destination port of each network flow as prediction.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            column = body['columns'].index('dst_port')
+            payload = json.dumps([float(row[column]) for row in body['data']]).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{}'.format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def test_data():
+    validation_data_path = os.path.join(TEST_DATA_DIR, 'dataset.h5')
+    return pd.read_hdf(validation_data_path)[:10]
+
+
+def test_run_constant_rate_must_send_requests_at_given_rate(test_data):
+    result = run_constant_rate(SlowClient(latency=0.001), test_data, rate=100, duration=0.5, concurrency=2)
+
+    assert len(result.predictions) == 50
+    assert len(result.samples) == 50
+    assert result.errors == 0
+    assert 0.45 <= result.elapsed < 1.0
+
+
+def test_run_constant_rate_must_not_be_delayed_by_slow_responses(test_data):
+    result = run_constant_rate(SlowClient(latency=0.2), test_data, rate=50, duration=0.4, concurrency=20)
+
+    assert len(result.predictions) == 20
+    assert result.send_lags.max() < 0.1
+
+
+def test_run_constant_rate_must_exclude_failed_requests(test_data):
+    result = run_constant_rate(SlowClient(latency=0, fail_every=2), test_data, rate=100, duration=0.2, concurrency=1)
+
+    assert result.errors == 10
+    assert len(result.predictions) == 10
+    assert result.samples.label.to_list() == test_data.iloc[[0, 2, 4, 6, 8, 0, 2, 4, 6, 8]].label.to_list()
+
+
+def test_run_constant_rate_must_report_each_successful_result(test_data):
+    reported = []
+    result = run_constant_rate(SlowClient(latency=0, fail_every=2), test_data, rate=100, duration=0.2, concurrency=1,
+                               on_result=lambda pos, pred: reported.append(pos))
+
+    assert sorted(reported) == [0, 0, 2, 2, 4, 4, 6, 6, 8, 8]
+    assert len(result.predictions) == 10
+
+
+def test_run_sharded_constant_rate_must_merge_results_of_all_processes(test_data, dst_port_server):
+    metrics = RequestMetrics()
+    result = run_sharded_constant_rate({'url': dst_port_server, 'max_retries': 0}, test_data, rate=40, duration=1.0,
+                                       concurrency=2, processes=2, metrics=metrics)
+
+    assert result.errors == 0
+    assert len(result.send_lags) == 40
+    assert len(result.predictions) == 40
+    assert result.samples.index.to_list() == test_data.index.repeat(4).to_list()
+    assert result.predictions == result.samples.dst_port.astype(float).to_list()
+    assert metrics.requests == 40
+
+
+def test_run_sharded_constant_rate_must_require_a_network_flow_per_process(test_data, dst_port_server):
+    with pytest.raises(ValueError):
+        run_sharded_constant_rate({'url': dst_port_server}, test_data[:2], rate=10, duration=1.0, concurrency=1,
+                                  processes=3)
+
+
+@pytest.mark.skipif(not os.path.isdir(SHARED_MEMORY_DIR), reason='shared memory is not available')
+def test_shared_dir_must_fall_back_to_temporary_directory_without_free_shared_memory(test_data):
+    usage = namedtuple('usage', ['total', 'used', 'free'])
+
+    with mock.patch('shutil.disk_usage', return_value=usage(64, 64, 0)):
+        assert _shared_dir(test_data) is None
+    with mock.patch('shutil.disk_usage', return_value=usage(2 ** 40, 0, 2 ** 40)):
+        assert _shared_dir(test_data) == SHARED_MEMORY_DIR
@@ -0,0 +1,67 @@
+import pytest
+import os
+import json
+import tempfile
+from ml_ids_api_client.metrics import LogHistogram, RequestMetrics, write_metrics
+
+
+def test_log_histogram_must_return_percentiles_within_relative_error():
+    histogram = LogHistogram(growth=1.01)
+    for value in range(1, 1001):
+        histogram.record(value / 1000)
+
+    assert histogram.count == 1000
+    assert histogram.max == 1.0
+    assert histogram.percentile(50) == pytest.approx(0.5, rel=0.01)
+    assert histogram.percentile(99) == pytest.approx(0.99, rel=0.01)
+    assert histogram.percentile(100) == 1.0
+
+
+def test_log_histogram_must_return_zero_if_empty():
+    assert LogHistogram().percentile(99) == 0.0
+
+
+def test_log_histogram_merge_must_combine_counts():
+    first, second = LogHistogram(), LogHistogram()
+    first.record(0.001)
+    second.record(0.1)
+    first.merge(second)
+
+    assert first.count == 2
+    assert first.max == 0.1
+    assert first.sum == pytest.approx(0.101)
+
+
+def test_log_histogram_merge_must_raise_ValueError_on_different_buckets():
+    with pytest.raises(ValueError):
+        LogHistogram(growth=1.05).merge(LogHistogram(growth=1.1))
+
+
+def test_request_metrics_must_survive_dict_roundtrip():
+    metrics = RequestMetrics()
+    metrics.record(serialization=0.001, network=0.01, parsing=0.0001, rows=10, request_bytes=2000, response_bytes=50)
+    metrics.record_error()
+
+    restored = RequestMetrics.from_dict(json.loads(json.dumps(metrics.to_dict())))
+
+    assert restored.requests == 1
+    assert restored.errors == 1
+    assert restored.rows == 10
+    assert restored.durations['total'].percentile(50) == metrics.durations['total'].percentile(50)
+
+
+def test_request_metrics_to_prometheus_must_contain_histograms_and_counters():
+    metrics = RequestMetrics()
+    metrics.record(serialization=0.001, network=0.01, parsing=0.0001, rows=10, request_bytes=2000, response_bytes=50)
+
+    content = metrics.to_prometheus()
+
+    assert 'ml_ids_client_request_duration_seconds_bucket{phase="network",le="+Inf"} 1' in content
+    assert 'ml_ids_client_request_duration_seconds_count{phase="total"} 1' in content
+    assert 'ml_ids_client_rows_total 10' in content
+
+
+def test_write_metrics_must_raise_ValueError_on_invalid_format():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with pytest.raises(ValueError):
+            write_metrics(RequestMetrics(), os.path.join(tmp_dir, 'metrics.txt'), 'XML')
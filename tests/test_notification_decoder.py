@@ -0,0 +1,73 @@
+import pytest
+import io
+import os
+import json
+import pandas as pd
+from pandas.testing import assert_frame_equal
+from tests.conf import TEST_DATA_DIR
+from ml_ids_api_client.consumer.notification_decoder import NotificationDecoder
+
+
+@pytest.fixture
+def test_data():
+    return pd.read_hdf(os.path.join(TEST_DATA_DIR, 'dataset.h5')).reset_index(drop=True)
+
+
+def create_message(msg_id, network_flow):
+    return {'MessageId': msg_id,
+            'Body': json.dumps({'Message': network_flow.to_json(orient='split', index=False)})}
+
+
+def test_decode_must_return_notification_per_message(test_data):
+    messages = [create_message('msg-{}'.format(idx), test_data.iloc[idx:idx + 1]) for idx in range(20)]
+
+    notifications = NotificationDecoder().decode(messages)
+
+    assert [notification.msg_id for notification in notifications] == ['msg-{}'.format(idx) for idx in range(20)]
+    for message, notification in zip(messages, notifications):
+        expected = pd.read_json(io.StringIO(json.loads(message['Body'])['Message']), orient='split')
+        assert_frame_equal(notification.network_flow, expected, check_dtype=False)
+
+
+def test_decode_must_keep_rows_of_multi_row_messages(test_data):
+    messages = [create_message('a', test_data.iloc[0:3]), create_message('b', test_data.iloc[3:4])]
+
+    notifications = NotificationDecoder().decode(messages)
+
+    assert len(notifications[0].network_flow) == 3
+    assert list(notifications[0].network_flow.index) == [0, 1, 2]
+    assert notifications[1].network_flow.iloc[0]['dst_port'] == test_data.iloc[3]['dst_port']
+
+
+def test_decode_must_convert_date_columns(test_data):
+    notifications = NotificationDecoder().decode([create_message('a', test_data.iloc[0:2])])
+
+    assert notifications[0].network_flow['timestamp'].dtype.kind == 'M'
+
+
+def test_decode_must_return_none_for_invalid_messages(test_data):
+    messages = [create_message('a', test_data.iloc[0:1]),
+                {'MessageId': 'b', 'Body': json.dumps({'Message': 'invalid'})},
+                {'Body': '{}'},
+                {'MessageId': 'd', 'Body': json.dumps({'Message': json.dumps({'columns': ['a', 'b'],
+                                                                               'data': [[1]]})})},
+                create_message('e', test_data.iloc[1:2])]
+
+    notifications = NotificationDecoder().decode(messages)
+
+    assert [notification is not None for notification in notifications] == [True, False, False, False, True]
+    assert notifications[4].msg_id == 'e'
+
+
+def test_decode_must_separate_messages_of_different_schemas(test_data):
+    decoder = NotificationDecoder()
+    messages = [create_message('a', test_data.iloc[0:1]),
+                create_message('b', test_data.iloc[1:2, :5]),
+                create_message('c', test_data.iloc[2:3])]
+
+    notifications = decoder.decode(messages)
+    decoder.decode(messages)
+
+    assert list(notifications[1].network_flow.columns) == list(test_data.columns[:5])
+    assert list(notifications[2].network_flow.columns) == list(test_data.columns)
+    assert len(decoder._schemas) == 2
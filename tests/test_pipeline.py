@@ -0,0 +1,211 @@
+import threading
+import time
+from ml_ids_api_client.consumer.pipeline import ConsumerPipeline
+from ml_ids_api_client.consumer.polling import AdaptivePolling
+
+
+class FakeConsumer:
+    def __init__(self, nr_messages):
+        self.messages = [{'MessageId': str(idx), 'ReceiptHandle': str(idx)} for idx in range(nr_messages)]
+        self.requested = []
+        self.deleted = []
+        self.delete_batches = 0
+        self.extended = []
+        self.lock = threading.Lock()
+
+    def receive_messages(self, queue_url, num_messages, wait_time_seconds, visibility_timeout):
+        with self.lock:
+            self.requested.append(num_messages)
+            batch, self.messages = self.messages[:num_messages], self.messages[num_messages:]
+        if not batch:
+            time.sleep(0.01)
+        return batch
+
+    def change_visibility(self, queue_url, messages, visibility_timeout):
+        with self.lock:
+            self.extended.extend(messages)
+        return []
+
+    def delete_messages(self, queue_url, messages):
+        with self.lock:
+            self.delete_batches += 1
+            self.deleted.extend(messages)
+        return []
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_pipeline_must_process_and_delete_all_messages():
+    consumer = FakeConsumer(95)
+    handled = []
+    pipeline = ConsumerPipeline(consumer, 'url', lambda msgs: [handled.append(msg) is None for msg in msgs],
+                                num_pollers=3, num_workers=4, delete_messages=True)
+
+    pipeline.start()
+    assert wait_until(lambda: len(handled) == 95)
+    pipeline.stop()
+
+    assert sorted(msg['MessageId'] for msg in consumer.deleted) == sorted(str(idx) for idx in range(95))
+    assert consumer.delete_batches <= 20
+    assert (pipeline.received, pipeline.processed, pipeline.failed, pipeline.deleted) == (95, 95, 0, 95)
+
+
+def test_pipeline_must_continue_polling_after_failed_receive(monkeypatch):
+    monkeypatch.setattr('ml_ids_api_client.consumer.pipeline.ERROR_BACKOFF', 0.01)
+
+    class FailingOnceConsumer(FakeConsumer):
+        def __init__(self, nr_messages):
+            super().__init__(nr_messages)
+            self.failures = 0
+
+        def receive_messages(self, queue_url, num_messages, wait_time_seconds, visibility_timeout):
+            if self.failures == 0:
+                self.failures += 1
+                raise IOError('connection reset')
+            return super().receive_messages(queue_url, num_messages, wait_time_seconds, visibility_timeout)
+
+    consumer = FailingOnceConsumer(20)
+    pipeline = ConsumerPipeline(consumer, 'url', lambda msgs: [True] * len(msgs), num_pollers=1, queue_size=10)
+
+    pipeline.start()
+    assert wait_until(lambda: pipeline.processed == 20)
+    pipeline.stop()
+
+    assert consumer.failures == 1
+    assert pipeline.received == 20
+
+
+def test_pipeline_must_not_delete_failed_messages():
+    consumer = FakeConsumer(20)
+
+    def handler(msgs):
+        if any(msg['MessageId'] == '3' for msg in msgs):
+            raise ValueError('invalid message')
+        return [int(msg['MessageId']) % 2 == 0 for msg in msgs]
+
+    pipeline = ConsumerPipeline(consumer, 'url', handler, num_workers=2, num_messages=1, delete_messages=True)
+    pipeline.start()
+    assert wait_until(lambda: pipeline.processed + pipeline.failed == 20)
+    pipeline.stop()
+
+    assert sorted(int(msg['MessageId']) for msg in consumer.deleted) == [0, 2, 4, 6, 8, 10, 12, 14, 16, 18]
+    assert pipeline.failed == 10
+
+
+def test_pipeline_must_pause_polling_while_queue_is_full():
+    consumer = FakeConsumer(50)
+    release = threading.Event()
+    pipeline = ConsumerPipeline(consumer, 'url', lambda msgs: [release.wait(5)] * len(msgs), num_pollers=2, num_workers=1,
+                                queue_size=5)
+
+    pipeline.start()
+    time.sleep(0.3)
+    received = pipeline.received
+    release.set()
+    assert wait_until(lambda: pipeline.processed == 50)
+    pipeline.stop()
+
+    assert received <= 5
+    assert max(consumer.requested) <= 5
+
+
+def test_pipeline_must_drain_received_messages_on_stop():
+    consumer = FakeConsumer(10)
+    handled = []
+
+    def handler(msgs):
+        time.sleep(0.02)
+        handled.extend(msgs)
+        return [True] * len(msgs)
+
+    pipeline = ConsumerPipeline(consumer, 'url', handler, num_workers=1, num_messages=1, queue_size=10,
+                                delete_messages=True)
+    pipeline.start()
+    assert wait_until(lambda: pipeline.received == 10)
+    pipeline.stop()
+
+    assert len(handled) == 10
+    assert len(consumer.deleted) == 10
+
+
+def test_pipeline_must_only_delete_explicitly_acked_messages_without_auto_ack():
+    consumer = FakeConsumer(10)
+    pending = []
+    pipeline = ConsumerPipeline(consumer, 'url', lambda msgs: pending.extend(msgs) or [True] * len(msgs),
+                                delete_messages=True, auto_ack=False)
+
+    pipeline.start()
+    assert wait_until(lambda: pipeline.processed == 10)
+    pipeline.drain()
+    assert consumer.deleted == []
+
+    pipeline.ack(pending[:4])
+    pipeline.stop()
+
+    assert consumer.deleted == pending[:4]
+
+
+def test_pipeline_must_not_extend_visibility_of_rejected_messages():
+    consumer = FakeConsumer(5)
+    pending = []
+    pipeline = ConsumerPipeline(consumer, 'url', lambda msgs: pending.extend(msgs) or [True] * len(msgs),
+                                visibility_timeout=1, delete_messages=True, auto_ack=False, heartbeat=True)
+
+    pipeline.start()
+    assert wait_until(lambda: len(pending) == 5)
+    pipeline.reject(pending)
+    time.sleep(0.8)
+    pipeline.stop()
+
+    assert consumer.extended == []
+    assert consumer.deleted == []
+    assert (pipeline.processed, pipeline.failed) == (0, 5)
+
+
+def test_pipeline_must_extend_visibility_of_slow_messages():
+    consumer = FakeConsumer(2)
+
+    def handler(msgs):
+        time.sleep(1.0)
+        return [True] * len(msgs)
+
+    pipeline = ConsumerPipeline(consumer, 'url', handler, visibility_timeout=1, delete_messages=True, heartbeat=True)
+    pipeline.start()
+    assert wait_until(lambda: pipeline.deleted == 2)
+    pipeline.stop()
+
+    assert {msg['MessageId'] for msg in consumer.extended} == {'0', '1'}
+    assert pipeline.redeliveries_avoided == 2
+
+
+def test_pipeline_must_not_extend_visibility_of_completed_messages():
+    consumer = FakeConsumer(5)
+    pipeline = ConsumerPipeline(consumer, 'url', lambda msgs: [True] * len(msgs), visibility_timeout=1,
+                                heartbeat=True)
+
+    pipeline.start()
+    assert wait_until(lambda: pipeline.processed == 5)
+    time.sleep(0.8)
+    pipeline.stop()
+
+    assert consumer.extended == []
+    assert pipeline.redeliveries_avoided == 0
+
+
+def test_pipeline_must_count_empty_receives_and_use_polling_policy():
+    consumer = FakeConsumer(3)
+    polling = AdaptivePolling(max_messages=2, max_wait_time=0)
+    pipeline = ConsumerPipeline(consumer, 'url', lambda msgs: [True] * len(msgs), polling=polling)
+
+    pipeline.start()
+    assert wait_until(lambda: pipeline.processed == 3 and pipeline.empty_receives > 0)
+    pipeline.stop()
+
+    assert max(consumer.requested) == 2
+    assert pipeline.receives > pipeline.empty_receives
+    assert pipeline.messages_per_second() > 0
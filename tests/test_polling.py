@@ -0,0 +1,48 @@
+from ml_ids_api_client.consumer.polling import AdaptivePolling
+
+
+def test_next_request_must_return_full_batches_without_waiting_for_backlog():
+    polling = AdaptivePolling(lambda: 1000, num_pollers=2)
+
+    assert polling.next_request() == (10, 0)
+
+
+def test_next_request_must_long_poll_idle_queue():
+    polling = AdaptivePolling(lambda: 0)
+
+    assert polling.next_request() == (10, 20)
+
+
+def test_next_request_must_long_poll_after_empty_receives():
+    polling = AdaptivePolling(max_wait_time=20)
+    assert polling.next_request() == (10, 0)
+
+    for _ in range(10):
+        polling.record(0)
+
+    assert polling.next_request() == (10, 20)
+    assert polling.empty_ratio() == 1.0
+
+
+def test_next_request_must_scale_wait_time_with_share_of_empty_receives():
+    polling = AdaptivePolling(max_wait_time=20, history=10)
+    for nr_messages in [0, 0, 0, 5, 5, 5, 5, 5, 5, 5]:
+        polling.record(nr_messages)
+
+    assert polling.next_request() == (10, 6)
+
+
+def test_next_request_must_split_small_backlog_among_pollers():
+    polling = AdaptivePolling(lambda: 6, num_pollers=3)
+
+    assert polling.next_request() == (2, 0)
+
+
+def test_next_request_must_refresh_queue_depth_periodically():
+    calls = []
+    polling = AdaptivePolling(lambda: calls.append(1) or 100, depth_interval=60)
+
+    polling.next_request()
+    polling.next_request()
+
+    assert len(calls) == 1
@@ -0,0 +1,55 @@
+import os
+import tempfile
+import time
+import pandas as pd
+from ml_ids_api_client.http.prediction_cache import PredictionCache
+
+
+def create_flows():
+    return pd.DataFrame({'label': ['DoS', 'Benign', 'DoS', 'DDoS', 'Benign'],
+                         'feature_1': [1.0, 2.0, 1.0, 3.0, 1.0],
+                         'feature_2': [10, 20, 10, 30, 10]})
+
+
+def test_hash_rows_must_ignore_label():
+    cache = PredictionCache()
+    keys = cache.hash_rows(create_flows())
+
+    assert keys[0] == keys[2] == keys[4]
+    assert len(set(keys.tolist())) == 3
+
+
+def test_hash_rows_must_depend_on_columns():
+    cache = PredictionCache()
+    flows = create_flows()
+
+    assert cache.hash_rows(flows)[0] != cache.hash_rows(flows.rename(columns={'feature_1': 'other'}))[0]
+
+
+def test_cache_must_evict_least_recently_used_entries():
+    cache = PredictionCache(max_entries=2)
+    cache.put_many([1, 2], [0.1, 0.2])
+    cache.get_many([1])
+    cache.put_many([3], [0.3])
+
+    assert cache.get_many([1, 2, 3]) == [0.1, None, 0.3]
+
+
+def test_cache_must_expire_entries():
+    cache = PredictionCache(ttl=0.05)
+    cache.put_many([1], [0.1])
+    time.sleep(0.1)
+
+    assert cache.get_many([1]) == [None]
+    assert len(cache) == 0
+
+
+def test_cache_must_be_persisted():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'cache', 'predictions.npz')
+        cache = PredictionCache(path=path)
+        cache.put_many([2 ** 63 + 1, 2], [0.1, 0.2])
+        cache.save()
+
+        assert PredictionCache(path=path).get_many([2 ** 63 + 1, 2]) == [0.1, 0.2]
+        assert PredictionCache(max_entries=1, path=path).get_many([2 ** 63 + 1, 2]) == [None, 0.2]
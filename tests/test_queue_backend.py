@@ -0,0 +1,133 @@
+import pytest
+import os
+import json
+import tempfile
+import time
+import pandas as pd
+from click.testing import CliRunner
+from tests.conf import TEST_DATA_DIR
+from ml_ids_api_client.consumer.attack_notification_consumer import run_cli
+from ml_ids_api_client.consumer.pipeline import ConsumerPipeline
+from ml_ids_api_client.queue_backend import FileReplayQueue, InMemoryQueue
+from ml_ids_api_client.consumer.backends import create_backend
+
+
+@pytest.fixture
+def tmp_dir():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        yield tmp_dir
+
+
+@pytest.fixture
+def recorded_messages(tmp_dir):
+    df = pd.read_hdf(os.path.join(TEST_DATA_DIR, 'dataset.h5')).reset_index(drop=True)
+    path = os.path.join(tmp_dir, 'dump.jsonl')
+    with open(path, 'w') as file:
+        for idx in range(50):
+            body = json.dumps({'Message': df.iloc[idx:idx + 1].to_json(orient='split', index=False)})
+            if idx % 2 == 0:
+                file.write(json.dumps({'MessageId': 'msg-{}'.format(idx), 'Body': body}) + '\n')
+            else:
+                file.write(body + '\n')
+    return path
+
+
+def test_in_memory_queue_must_hide_received_messages_until_visibility_timeout():
+    backend = InMemoryQueue()
+    backend.send_message('a', 'msg-a')
+    backend.send_message('b', 'msg-b')
+
+    received = backend.receive_messages('url', 10, 0, 0.2)
+    assert [msg['Body'] for msg in received] == ['a', 'b']
+    assert backend.receive_messages('url', 10, 0, 0.2) == []
+
+    assert backend.delete_messages('url', received[:1]) == []
+    time.sleep(0.25)
+
+    redelivered = backend.receive_messages('url', 10, 0, 10)
+    assert [msg['MessageId'] for msg in redelivered] == ['msg-b']
+    assert redelivered[0]['ReceiptHandle'] != received[1]['ReceiptHandle']
+
+
+def test_in_memory_queue_must_extend_visibility():
+    backend = InMemoryQueue()
+    backend.send_message('a')
+    received = backend.receive_messages('url', 1, 0, 0.1)
+
+    assert backend.change_visibility('url', received, 10) == []
+    time.sleep(0.15)
+
+    assert backend.queue_depth('url') == 0
+    assert backend.delete_messages('url', received) == []
+    assert backend.delete_messages('url', received) == received
+
+
+def test_in_memory_queue_must_wait_for_messages():
+    backend = InMemoryQueue()
+    start = time.monotonic()
+
+    assert backend.receive_messages('url', 1, 0.2, 10) == []
+    assert time.monotonic() - start >= 0.2
+
+
+def test_file_replay_queue_must_deliver_recorded_messages_once(recorded_messages):
+    backend = FileReplayQueue(recorded_messages)
+    received = []
+    while not backend.exhausted:
+        received.extend(backend.receive_messages('url', 10, 0, 60))
+
+    assert len(received) == 50
+    assert received[0]['MessageId'] == 'msg-0'
+    assert received[1]['MessageId'] == 'replay-1'
+    assert all('ReceiptHandle' in msg and 'Body' in msg for msg in received)
+
+
+def test_pipeline_must_consume_in_memory_queue():
+    backend = InMemoryQueue()
+    for idx in range(30):
+        backend.send_message(str(idx))
+    pipeline = ConsumerPipeline(backend, 'url', lambda msgs: [True] * len(msgs), num_pollers=2, num_workers=2,
+                                wait_time_seconds=0, delete_messages=True)
+
+    pipeline.start()
+    deadline = time.monotonic() + 5
+    while pipeline.deleted < 30 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    pipeline.stop()
+
+    assert pipeline.deleted == 30
+    assert backend.queue_depth('url') == 0
+
+
+def test_create_backend_must_reject_unknown_backend():
+    with pytest.raises(ValueError):
+        create_backend('kafka://topic', None, None, None)
+
+
+def test_create_backend_must_require_credentials_for_sqs_backend():
+    with pytest.raises(ValueError):
+        create_backend('sqs', 'access-key', None, 'eu-west-1')
+
+
+def test_run_cli_must_replay_recorded_messages(recorded_messages, tmp_dir):
+    output_dir = os.path.join(tmp_dir, 'out')
+
+    result = CliRunner().invoke(run_cli, ['--backend', 'file://' + recorded_messages,
+                                          '--sink', 'JSONL',
+                                          '--sink-dir', output_dir,
+                                          '--delete-messages', 'True',
+                                          '--workers', '2'])
+
+    assert result.exit_code == 0, result.output
+    lines = []
+    for name in os.listdir(output_dir):
+        with open(os.path.join(output_dir, name)) as file:
+            lines.extend(json.loads(line) for line in file)
+    assert len(lines) == 50
+
+
+def test_run_cli_must_require_credentials_for_sqs_backend():
+    result = CliRunner().invoke(run_cli, ['--backend', 'sqs'])
+
+    assert result.exit_code != 0
+    assert '--access-key' in result.output
@@ -0,0 +1,232 @@
+import pytest
+import os
+import hashlib
+import tempfile
+from unittest import mock
+import boto3
+from boto3.s3.transfer import TransferConfig
+from ml_ids_api_client.aws.s3_transfer import AwsS3Downloader, is_up_to_date
+from ml_ids_api_client.dataset import transfer_file_from_s3, DatasetCache
+
+moto = pytest.importorskip('moto')
+mock_s3 = getattr(moto, 'mock_aws', None) or getattr(moto, 'mock_s3')
+
+BUCKET = 'ml-ids-test'
+KEY = 'testing/test.h5'
+REGION = 'eu-west-1'
+KB = 1024
+MB = 1024 * KB
+
+
+@pytest.fixture
+def s3_client():
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+    # Uploaded parts are sent without aws-chunked encoding, which is not decoded by every moto version.
+    os.environ.setdefault('AWS_REQUEST_CHECKSUM_CALCULATION', 'when_required')
+
+    with mock_s3():
+        client = boto3.client('s3', region_name=REGION)
+        client.create_bucket(Bucket=BUCKET, CreateBucketConfiguration={'LocationConstraint': REGION})
+        yield client
+
+
+@pytest.fixture
+def tmp_dir():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        yield tmp_dir
+
+
+@pytest.fixture
+def small_parts():
+    return TransferConfig(multipart_threshold=4 * KB, multipart_chunksize=4 * KB, max_concurrency=4)
+
+
+def test_download_must_store_file_and_meta_data(s3_client, tmp_dir, small_parts):
+    content = os.urandom(10 * KB + 17)
+    s3_client.put_object(Bucket=BUCKET, Key=KEY, Body=content)
+    path = os.path.join(tmp_dir, 'dataset.h5')
+
+    downloaded = AwsS3Downloader(s3_client, small_parts).download(BUCKET, KEY, path)
+
+    assert downloaded
+    with open(path, 'rb') as file:
+        assert file.read() == content
+    assert not os.path.exists(path + '.part')
+    assert is_up_to_date(path, AwsS3Downloader(s3_client).head(BUCKET, KEY))
+
+
+def test_download_must_skip_up_to_date_file(s3_client, tmp_dir, small_parts):
+    s3_client.put_object(Bucket=BUCKET, Key=KEY, Body=os.urandom(KB))
+    path = os.path.join(tmp_dir, 'dataset.h5')
+    downloader = AwsS3Downloader(s3_client, small_parts)
+
+    assert downloader.download(BUCKET, KEY, path)
+    assert not downloader.download(BUCKET, KEY, path)
+
+
+def test_download_must_refresh_changed_file(s3_client, tmp_dir, small_parts):
+    path = os.path.join(tmp_dir, 'dataset.h5')
+    downloader = AwsS3Downloader(s3_client, small_parts)
+    s3_client.put_object(Bucket=BUCKET, Key=KEY, Body=b'a' * KB)
+    downloader.download(BUCKET, KEY, path)
+
+    s3_client.put_object(Bucket=BUCKET, Key=KEY, Body=b'b' * KB)
+
+    assert downloader.download(BUCKET, KEY, path)
+    with open(path, 'rb') as file:
+        assert file.read() == b'b' * KB
+
+
+def test_download_must_redownload_truncated_file(s3_client, tmp_dir, small_parts):
+    content = os.urandom(8 * KB)
+    s3_client.put_object(Bucket=BUCKET, Key=KEY, Body=content)
+    path = os.path.join(tmp_dir, 'dataset.h5')
+    downloader = AwsS3Downloader(s3_client, small_parts)
+    downloader.download(BUCKET, KEY, path)
+
+    with open(path, 'r+b') as file:
+        file.truncate(KB)
+
+    assert downloader.download(BUCKET, KEY, path)
+    with open(path, 'rb') as file:
+        assert file.read() == content
+
+
+def upload_in_parts(s3_client, parts):
+    upload_id = s3_client.create_multipart_upload(Bucket=BUCKET, Key=KEY)['UploadId']
+    uploaded = []
+    for number, content in enumerate(parts, 1):
+        response = s3_client.upload_part(Bucket=BUCKET, Key=KEY, PartNumber=number, UploadId=upload_id, Body=content)
+        uploaded.append({'PartNumber': number, 'ETag': response['ETag']})
+    s3_client.complete_multipart_upload(Bucket=BUCKET, Key=KEY, UploadId=upload_id,
+                                        MultipartUpload={'Parts': uploaded})
+
+
+def test_download_must_verify_multipart_object_downloaded_with_different_part_size(s3_client, tmp_dir):
+    parts = [os.urandom(6 * MB), os.urandom(6 * MB)]
+    upload_in_parts(s3_client, parts)
+    path = os.path.join(tmp_dir, 'dataset.h5')
+    config = TransferConfig(multipart_threshold=8 * MB, multipart_chunksize=8 * MB, max_concurrency=4)
+
+    client = RecordingClient(s3_client)
+
+    assert AwsS3Downloader(client, config).download(BUCKET, KEY, path)
+    assert sorted(client.ranges) == ['bytes=0-6291455', 'bytes=6291456-12582911']
+    with open(path, 'rb') as file:
+        assert file.read() == b''.join(parts)
+
+
+class RecordingClient:
+    def __init__(self, client, failing_range=None):
+        self.client = client
+        self.failing_range = failing_range
+        self.ranges = []
+
+    def head_object(self, **kwargs):
+        return self.client.head_object(**kwargs)
+
+    def get_object(self, **kwargs):
+        self.ranges.append(kwargs['Range'])
+        if kwargs['Range'] == self.failing_range:
+            raise IOError('connection reset')
+        return self.client.get_object(**kwargs)
+
+
+def test_download_must_resume_from_completed_parts(s3_client, tmp_dir, small_parts):
+    content = os.urandom(12 * KB)
+    s3_client.put_object(Bucket=BUCKET, Key=KEY, Body=content)
+    path = os.path.join(tmp_dir, 'dataset.h5')
+
+    with pytest.raises(IOError):
+        AwsS3Downloader(RecordingClient(s3_client, 'bytes=8192-12287'), small_parts).download(BUCKET, KEY, path)
+    assert not os.path.exists(path)
+
+    resuming_client = RecordingClient(s3_client)
+    AwsS3Downloader(resuming_client, small_parts).download(BUCKET, KEY, path)
+
+    assert resuming_client.ranges == ['bytes=8192-12287']
+    with open(path, 'rb') as file:
+        assert hashlib.md5(file.read()).digest() == hashlib.md5(content).digest()
+
+
+def test_transfer_file_from_s3_must_raise_FileNotFoundError_if_file_does_not_exist(s3_client, tmp_dir):
+    with pytest.raises(FileNotFoundError):
+        transfer_file_from_s3(BUCKET + '/non_existent.h5', REGION, os.path.join(tmp_dir, 'dataset.h5'))
+
+
+def test_transfer_file_from_s3_must_download_file(s3_client, tmp_dir):
+    s3_client.put_object(Bucket=BUCKET, Key=KEY, Body=b'content', ACL='public-read')
+    path = os.path.join(tmp_dir, 'output', 'dataset.h5')
+
+    assert transfer_file_from_s3(BUCKET + '/' + KEY, REGION, path)
+    assert not transfer_file_from_s3(BUCKET + '/' + KEY, REGION, path)
+
+
+def put_public_object(s3_client, key, content):
+    s3_client.put_object(Bucket=BUCKET, Key=key, Body=content, ACL='public-read')
+
+
+def test_dataset_cache_must_keep_datasets_side_by_side(s3_client, tmp_dir):
+    put_public_object(s3_client, 'a.h5', b'a' * KB)
+    put_public_object(s3_client, 'b.h5', b'b' * KB)
+    cache = DatasetCache(tmp_dir)
+
+    path_a = cache.fetch('s3://{}/a.h5'.format(BUCKET), REGION)
+    path_b = cache.fetch('s3://{}/b.h5'.format(BUCKET), REGION)
+
+    assert path_a != path_b
+    with open(path_a, 'rb') as file:
+        assert file.read() == b'a' * KB
+    with open(path_b, 'rb') as file:
+        assert file.read() == b'b' * KB
+    assert len(cache.entries()) == 2
+
+
+def test_dataset_cache_must_not_contact_s3_for_fresh_entries(s3_client, tmp_dir):
+    uri = 's3://{}/{}'.format(BUCKET, KEY)
+    put_public_object(s3_client, KEY, b'a' * KB)
+    cache = DatasetCache(tmp_dir)
+    path = cache.fetch(uri, REGION)
+
+    with mock.patch('ml_ids_api_client.dataset._create_s3_client') as create_client:
+        assert cache.fetch(uri, REGION) == path
+        assert not create_client.called
+
+
+def test_dataset_cache_must_replace_changed_dataset(s3_client, tmp_dir):
+    uri = 's3://{}/{}'.format(BUCKET, KEY)
+    put_public_object(s3_client, KEY, b'a' * KB)
+    cache = DatasetCache(tmp_dir, max_age=0)
+    old_path = cache.fetch(uri, REGION)
+
+    put_public_object(s3_client, KEY, b'b' * KB)
+    new_path = cache.fetch(uri, REGION)
+
+    assert new_path != old_path
+    assert not os.path.exists(old_path)
+    assert not os.path.exists(old_path + '.lock')
+    with open(new_path, 'rb') as file:
+        assert file.read() == b'b' * KB
+
+
+def test_dataset_cache_must_evict_least_recently_used_datasets(s3_client, tmp_dir):
+    for name in ['a.h5', 'b.h5', 'c.h5']:
+        put_public_object(s3_client, name, os.urandom(KB))
+    cache = DatasetCache(tmp_dir, max_size=2 * KB)
+    uris = ['s3://{}/{}'.format(BUCKET, name) for name in ['a.h5', 'b.h5', 'c.h5']]
+
+    cache.fetch(uris[0], REGION)
+    path_b = cache.fetch(uris[1], REGION)
+    cache.fetch(uris[0], REGION)
+    cache.fetch(uris[2], REGION)
+
+    assert set(cache.entries()) == {uris[0], uris[2]}
+    assert not os.path.exists(path_b)
+    assert not os.path.exists(path_b + '.lock')
+    assert not os.path.exists(path_b + '.meta.json')
+
+
+def test_dataset_cache_must_raise_FileNotFoundError_if_file_does_not_exist(s3_client, tmp_dir):
+    with pytest.raises(FileNotFoundError):
+        DatasetCache(tmp_dir).fetch('s3://{}/missing.h5'.format(BUCKET), REGION)
@@ -0,0 +1,74 @@
+import pytest
+import os
+import json
+import numpy as np
+import pandas as pd
+from tests.conf import TEST_DATA_DIR
+from ml_ids_api_client.http.serialization import encode_pandas_split, is_orjson_available, encode_msgpack, \
+    decode_msgpack
+
+
+@pytest.fixture
+def test_data():
+    validation_data_path = os.path.join(TEST_DATA_DIR, 'dataset.h5')
+    return pd.read_hdf(validation_data_path)
+
+
+def test_encode_pandas_split_must_match_pandas_output(test_data):
+    expected = test_data.drop(columns=['label']).to_json(orient='split', index=False)
+
+    assert encode_pandas_split(test_data) == expected
+
+
+def test_encode_pandas_split_must_match_pandas_output_for_row_slices(test_data):
+    sample = test_data.iloc[10:11]
+    expected = sample.drop(columns=['label']).to_json(orient='split', index=False)
+
+    assert encode_pandas_split(sample) == expected
+
+
+def test_encode_pandas_split_must_match_pandas_output_for_missing_values():
+    df = pd.DataFrame({'a': [1.5, np.nan, np.inf],
+                       'b': [True, False, True],
+                       'c': ['x', None, 'y/z'],
+                       'd': np.array([1, 2, 3], dtype='uint64'),
+                       'label': ['Benign', 'Benign', 'Bot']})
+    expected = df.drop(columns=['label']).to_json(orient='split', index=False)
+
+    assert encode_pandas_split(df) == expected
+
+
+def test_encode_pandas_split_must_encode_empty_dataframe(test_data):
+    body = json.loads(encode_pandas_split(test_data[:0]))
+
+    assert body['data'] == []
+    assert 'label' not in body['columns']
+
+
+def test_encode_pandas_split_must_fall_back_to_pandas_for_unsupported_dtypes():
+    df = pd.DataFrame({'a': pd.to_datetime(['2018-02-21', '2018-02-22']), 'label': ['Benign', 'Bot']})
+    expected = df.drop(columns=['label']).to_json(orient='split', index=False)
+
+    assert encode_pandas_split(df) == expected
+
+
+def test_encode_pandas_split_must_fall_back_to_pandas_if_label_column_is_absent():
+    df = pd.DataFrame({'a': pd.to_datetime(['2018-02-21', '2018-02-22'])})
+
+    assert encode_pandas_split(df) == df.to_json(orient='split', index=False)
+
+
+@pytest.mark.skipif(not is_orjson_available(), reason='orjson is not installed')
+def test_encode_pandas_split_with_orjson_must_encode_same_values(test_data):
+    expected = pd.read_json(encode_pandas_split(test_data), orient='split', convert_dates=False)
+    actual = pd.read_json(encode_pandas_split(test_data, use_orjson=True), orient='split', convert_dates=False)
+
+    pd.testing.assert_frame_equal(expected, actual, check_dtype=False)
+
+
+def test_encode_msgpack_must_restore_columns_and_types(test_data):
+    pytest.importorskip('msgpack')
+    decoded = decode_msgpack(encode_msgpack(test_data))
+
+    expected = test_data.drop(columns=['label']).replace([np.inf, -np.inf], np.nan).reset_index(drop=True)
+    pd.testing.assert_frame_equal(decoded, expected)
@@ -0,0 +1,207 @@
+import pytest
+import os
+import json
+import tempfile
+import threading
+import time
+import pandas as pd
+from ml_ids_api_client.consumer.notification_decoder import AttackNotification
+from ml_ids_api_client.consumer.sinks import BufferedSink, JsonlSink, NotificationSink, ParquetSink, to_frame
+
+
+@pytest.fixture
+def tmp_dir():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        yield tmp_dir
+
+
+def notifications(nr_notifications, start=0):
+    return [AttackNotification('msg-{}'.format(idx), pd.DataFrame({'dst_port': [idx], 'protocol': [6]}))
+            for idx in range(start, start + nr_notifications)]
+
+
+def read_jsonl(output_dir):
+    lines = []
+    for name in sorted(os.listdir(output_dir)):
+        with open(os.path.join(output_dir, name)) as file:
+            lines.extend(json.loads(line) for line in file)
+    return lines
+
+
+class RecordingSink(NotificationSink):
+    def __init__(self, durable_after=1):
+        self.written = []
+        self.commits = 0
+        self.durable_after = durable_after
+        self.closed = False
+
+    def write(self, notifications):
+        self.written.extend(notifications)
+
+    def commit(self):
+        self.commits += 1
+        return self.commits % self.durable_after == 0
+
+    def close(self):
+        self.closed = True
+
+
+def test_to_frame_must_add_msg_id_per_network_flow():
+    flows = [AttackNotification('a', pd.DataFrame({'x': [1, 2]})), AttackNotification('b', pd.DataFrame({'x': [3]}))]
+
+    df = to_frame(flows)
+
+    assert df['msg_id'].tolist() == ['a', 'a', 'b']
+    assert df['x'].tolist() == [1, 2, 3]
+
+
+def test_jsonl_sink_must_write_one_line_per_network_flow(tmp_dir):
+    sink = JsonlSink(tmp_dir)
+    sink.write(notifications(3))
+    assert sink.commit()
+    sink.close()
+
+    assert read_jsonl(tmp_dir) == [{'msg_id': 'msg-{}'.format(idx), 'dst_port': idx, 'protocol': 6}
+                                   for idx in range(3)]
+
+
+def test_jsonl_sink_must_rotate_files_by_size(tmp_dir):
+    sink = JsonlSink(tmp_dir, max_bytes=100)
+    for idx in range(5):
+        sink.write(notifications(2, start=idx * 2))
+        sink.commit()
+    sink.close()
+
+    assert len(os.listdir(tmp_dir)) > 1
+    assert [line['dst_port'] for line in read_jsonl(tmp_dir)] == list(range(10))
+
+
+def test_jsonl_sink_must_rotate_files_by_age(tmp_dir):
+    sink = JsonlSink(tmp_dir, max_age=0)
+    sink.write(notifications(1))
+    sink.write(notifications(1, start=1))
+    sink.close()
+
+    assert len(os.listdir(tmp_dir)) == 2
+
+
+def test_parquet_sink_must_raise_ImportError_without_pyarrow(tmp_dir):
+    try:
+        import pyarrow  # noqa: F401 pylint: disable=unused-import,import-outside-toplevel
+    except ImportError:
+        with pytest.raises(ImportError):
+            ParquetSink(tmp_dir)
+        return
+
+    sink = ParquetSink(tmp_dir, max_age=0)
+    sink.write(notifications(3))
+    assert sink.commit()
+    sink.close()
+
+    df = pd.read_parquet(tmp_dir)
+    assert df['msg_id'].tolist() == ['msg-0', 'msg-1', 'msg-2']
+
+
+def test_buffered_sink_must_ack_messages_after_commit():
+    sink = RecordingSink()
+    acked = []
+    buffered = BufferedSink(sink, acked.extend, flush_size=5, flush_interval=10)
+
+    buffered.submit(notifications(5), [{'MessageId': str(idx)} for idx in range(5)])
+    deadline = time.monotonic() + 5
+    while len(acked) < 5 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    buffered.close()
+
+    assert len(sink.written) == 5
+    assert [msg['MessageId'] for msg in acked] == [str(idx) for idx in range(5)]
+
+
+def test_buffered_sink_must_hold_acks_until_sink_is_durable():
+    sink = RecordingSink(durable_after=1000)
+    acked = []
+    buffered = BufferedSink(sink, acked.extend, flush_size=1, flush_interval=0.01)
+
+    buffered.submit(notifications(3), [{'MessageId': str(idx)} for idx in range(3)])
+    time.sleep(0.1)
+    acked_before_close = len(acked)
+    buffered.close()
+
+    assert acked_before_close == 0
+    assert sink.closed
+    assert len(acked) == 3
+
+
+def test_buffered_sink_must_not_ack_messages_if_write_fails():
+    class FailingSink(RecordingSink):
+        def write(self, notifications):
+            raise IOError('disk full')
+
+    acked = []
+    buffered = BufferedSink(FailingSink(), acked.extend, flush_size=1, flush_interval=0.01)
+    buffered.submit(notifications(2), [{'MessageId': '0'}, {'MessageId': '1'}])
+    buffered.close()
+
+    assert acked == []
+
+
+def test_buffered_sink_must_pass_uncommitted_messages_of_failed_writes_to_on_failed():
+    class FailingSink(RecordingSink):
+        def write(self, notifications):
+            super().write(notifications)
+            if len(self.written) > 2:
+                raise IOError('disk full')
+
+    acked = []
+    failed = []
+    buffered = BufferedSink(FailingSink(durable_after=1000), acked.extend, flush_size=2, flush_interval=10,
+                            on_failed=failed.extend)
+    buffered.submit(notifications(2), [{'MessageId': '0'}, {'MessageId': '1'}])
+    buffered.submit(notifications(2, start=2), [{'MessageId': '2'}, {'MessageId': '3'}])
+    buffered.close()
+
+    assert acked == []
+    assert [msg['MessageId'] for msg in failed] == ['0', '1', '2', '3']
+
+
+def test_buffered_sink_must_block_submit_while_buffer_is_full():
+    released = threading.Event()
+
+    class BlockingSink(RecordingSink):
+        def write(self, notifications):
+            released.wait()
+            super().write(notifications)
+
+    sink = BlockingSink()
+    buffered = BufferedSink(sink, lambda messages: None, flush_size=2, flush_interval=10, max_buffered=4)
+    buffered.submit(notifications(2), [{'MessageId': '0'}, {'MessageId': '1'}])
+    time.sleep(0.1)
+    buffered.submit(notifications(4, start=2), [{'MessageId': str(idx)} for idx in range(2, 6)])
+
+    submitted = threading.Event()
+    thread = threading.Thread(target=lambda: buffered.submit(notifications(1, start=6), [{'MessageId': '6'}])
+                              or submitted.set())
+    thread.start()
+    time.sleep(0.1)
+    blocked = not submitted.is_set()
+    released.set()
+    thread.join(timeout=5)
+    buffered.close()
+
+    assert blocked
+    assert submitted.is_set()
+    assert len(sink.written) == 7
+
+
+def test_buffered_sink_must_write_from_background_thread():
+    threads = []
+
+    class ThreadRecordingSink(RecordingSink):
+        def write(self, notifications):
+            threads.append(threading.current_thread())
+
+    buffered = BufferedSink(ThreadRecordingSink(), lambda messages: None, flush_interval=0.01)
+    buffered.submit(notifications(1), [{'MessageId': '0'}])
+    buffered.close()
+
+    assert threads and all(thread is not threading.current_thread() for thread in threads)
@@ -0,0 +1,142 @@
+import pytest
+import os
+import boto3
+from ml_ids_api_client.aws import sqs_consumer
+from ml_ids_api_client.aws.sqs_consumer import AwsSQSConsumer
+
+moto = pytest.importorskip('moto')
+mock_sqs = getattr(moto, 'mock_aws', None) or getattr(moto, 'mock_sqs')
+
+REGION = 'eu-west-1'
+
+
+@pytest.fixture
+def queue_url():
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+    with mock_sqs():
+        client = boto3.client('sqs', region_name=REGION)
+        url = client.create_queue(QueueName='ml-ids-test')['QueueUrl']
+        for idx in range(25):
+            client.send_message(QueueUrl=url, MessageBody='message-{}'.format(idx))
+        yield url
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(sqs_consumer, 'RETRY_BACKOFF', 0)
+
+
+class RecordingClient:
+    def __init__(self, failures=None):
+        self.failures = failures or []
+        self.batches = []
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        self.batches.append([entry['ReceiptHandle'] for entry in Entries])
+        failed = self.failures.pop(0) if self.failures else {}
+        return {'Successful': [{'Id': entry['Id']} for entry in Entries if entry['ReceiptHandle'] not in failed],
+                'Failed': [{'Id': entry['Id'], 'Code': 'InternalError', 'SenderFault': failed[entry['ReceiptHandle']]}
+                           for entry in Entries if entry['ReceiptHandle'] in failed]}
+
+
+def create_consumer(client):
+    consumer = AwsSQSConsumer.__new__(AwsSQSConsumer)
+    consumer.client = client
+    return consumer
+
+
+def messages(nr_messages):
+    return [{'MessageId': str(idx), 'ReceiptHandle': 'handle-{}'.format(idx)} for idx in range(nr_messages)]
+
+
+def receive_all(consumer, url):
+    received = []
+    while True:
+        batch = consumer.receive_messages(url, 10, 0, 60)
+        if not batch:
+            return received
+        received.extend(batch)
+
+
+def test_delete_messages_must_delete_messages_from_queue(queue_url):
+    consumer = AwsSQSConsumer('testing', 'testing', REGION)
+    received = receive_all(consumer, queue_url)
+
+    failed = consumer.delete_messages(queue_url, received)
+
+    attributes = consumer.client.get_queue_attributes(QueueUrl=queue_url, AttributeNames=['All'])['Attributes']
+    assert len(received) == 25
+    assert failed == []
+    assert attributes['ApproximateNumberOfMessages'] == '0'
+    assert attributes['ApproximateNumberOfMessagesNotVisible'] == '0'
+
+
+def test_delete_messages_must_send_batches_of_ten_entries():
+    client = RecordingClient()
+
+    create_consumer(client).delete_messages('url', messages(25))
+
+    assert [len(batch) for batch in client.batches] == [10, 10, 5]
+
+
+def test_delete_messages_must_retry_failed_entries():
+    client = RecordingClient(failures=[{'handle-3': False, 'handle-5': False}, {'handle-5': False}])
+
+    failed = create_consumer(client).delete_messages('url', messages(10))
+
+    assert failed == []
+    assert client.batches[1:] == [['handle-3', 'handle-5'], ['handle-5']]
+
+
+def test_delete_messages_must_not_retry_entries_failing_due_to_sender_fault():
+    client = RecordingClient(failures=[{'handle-3': True}])
+
+    failed = create_consumer(client).delete_messages('url', messages(10))
+
+    assert failed == [messages(10)[3]]
+    assert len(client.batches) == 1
+
+
+def test_delete_messages_must_return_entries_failing_after_max_retries():
+    client = RecordingClient(failures=[{'handle-1': False}] * 3)
+
+    failed = create_consumer(client).delete_messages('url', messages(2), max_retries=2)
+
+    assert failed == [messages(2)[1]]
+    assert len(client.batches) == 3
+
+
+def test_delete_messages_must_skip_messages_without_receipt_handle():
+    client = RecordingClient()
+
+    failed = create_consumer(client).delete_messages('url', [{'MessageId': '1'}] + messages(1))
+
+    assert failed == [{'MessageId': '1'}]
+    assert client.batches == [['handle-0']]
+
+
+def test_change_visibility_must_extend_visibility_of_received_messages(queue_url):
+    consumer = AwsSQSConsumer('testing', 'testing', REGION)
+    received = consumer.receive_messages(queue_url, 10, 0, 60)
+
+    failed = consumer.change_visibility(queue_url, received, 120)
+
+    assert len(received) == 10
+    assert failed == []
+
+
+def test_change_visibility_must_send_batches_of_ten_entries():
+    client = RecordingClient()
+    client.change_message_visibility_batch = client.delete_message_batch
+
+    create_consumer(client).change_visibility('url', messages(12), 30)
+
+    assert [len(batch) for batch in client.batches] == [10, 2]
+
+
+def test_queue_depth_must_return_number_of_visible_messages(queue_url):
+    consumer = AwsSQSConsumer('testing', 'testing', REGION)
+
+    assert consumer.queue_depth(queue_url) == 25
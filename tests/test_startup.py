@@ -0,0 +1,52 @@
+import pytest
+import os
+import subprocess
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Packages which must only be imported once a command is run.
+DEFERRED_PACKAGES = ['pandas', 'numpy', 'boto3', 'botocore', 'requests', 'tabulate']
+
+ENTRY_POINTS = ['ml_ids_api_client.producer.rest_client',
+                'ml_ids_api_client.consumer.attack_notification_consumer']
+
+
+def import_times(args):
+    """
+    Runs Python with `-X importtime` and returns the cumulative import time in microseconds per imported module.
+    """
+    process = subprocess.run([sys.executable, '-X', 'importtime'] + args,
+                             cwd=PROJECT_DIR,
+                             stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE,
+                             universal_newlines=True,
+                             check=True)
+    times = {}
+    for line in process.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, module = line[len('import time:'):].split('|')
+            if cumulative.strip().isdigit():
+                times[module.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize('entry_point', ENTRY_POINTS)
+def test_entry_point_must_not_import_deferred_packages(entry_point):
+    times = import_times(['-c', 'import {}'.format(entry_point)])
+
+    assert [package for package in DEFERRED_PACKAGES if package in times] == []
+
+
+@pytest.mark.parametrize('entry_point', ENTRY_POINTS)
+def test_entry_point_help_must_not_import_deferred_packages(entry_point):
+    times = import_times(['-m', entry_point, '--help'])
+
+    assert [package for package in DEFERRED_PACKAGES if package in times] == []
+
+
+def test_dataset_must_not_import_boto3():
+    times = import_times(['-c', 'import ml_ids_api_client.dataset'])
+
+    assert 'boto3' not in times
+    assert 'botocore' not in times
@@ -0,0 +1,58 @@
+import pandas as pd
+from ml_ids_api_client.user_interaction import DisplayOptions, show_prediction_results, print_dataframe_truncated, \
+    render_pages
+from ml_ids_api_client.data import merge_predictions
+
+
+def create_results(nr_rows):
+    samples = pd.DataFrame({'label': ['Benign'] * nr_rows, 'label_is_attack': [0] * nr_rows,
+                            'feature': range(nr_rows)})
+    return merge_predictions(samples, [0.1] * nr_rows, 0.5)
+
+
+def test_render_pages_must_render_pages_lazily():
+    df = pd.DataFrame({'value': range(25)})
+    pages = render_pages(df, 'NOWRAP', 10)
+
+    assert next(pages) == 'Rows 1 - 10 of 25\n'
+    assert [line.strip() for line in next(pages).strip().splitlines()][-1] == '9'
+    assert list(pages)[-2] == 'Rows 21 - 25 of 25\n'
+
+
+def test_render_pages_must_label_rows_by_position_if_wrapped():
+    df = pd.DataFrame({'value': range(15)}, index=range(100, 115))
+    pages = list(render_pages(df, 'WRAP', 10))
+
+    assert pages[3].splitlines()[1].split() == ['10', '10']
+
+
+def test_print_dataframe_truncated_must_print_head_and_tail(capsys):
+    df = pd.DataFrame({'value': range(100)})
+    print_dataframe_truncated(df, 'NOWRAP', 5)
+
+    lines = capsys.readouterr().out.splitlines()
+    assert '... 95 rows omitted ...' in lines
+    assert [line.strip() for line in lines if line.strip().isdigit()] == ['0', '1', '2', '98', '99']
+
+
+def test_print_dataframe_truncated_must_print_all_rows_if_within_limit(capsys):
+    print_dataframe_truncated(pd.DataFrame({'value': range(3)}), 'NOWRAP', 5)
+
+    assert 'omitted' not in capsys.readouterr().out
+
+
+def test_show_prediction_results_must_omit_details_in_summary_mode(capsys):
+    results, stats = create_results(10)
+    show_prediction_results(results, stats, 'NOWRAP', display_options=DisplayOptions('SUMMARY', 50, 20))
+
+    out = capsys.readouterr().out
+    assert 'Accuracy' in out
+    assert 'Details:' not in out
+
+
+def test_show_prediction_results_must_page_details_in_paged_mode(capsys):
+    results, stats = create_results(120)
+    show_prediction_results(results, stats, 'NOWRAP', display_options=DisplayOptions('PAGED', 50, 20))
+
+    out = capsys.readouterr().out
+    assert 'Rows 101 - 120 of 120' in out